@@ -0,0 +1,372 @@
+"""Version 1 of the JSON API, for pipelines rather than people.
+
+Runs are submitted with a JSON body, or a multipart form when a file is
+sent with the request, and answered with the job that runs them. Files too
+big for one request are sent through /uploads first and given by their
+upload id. Results are returned as JSON, and the rows of a table or
+collection as newline delimited JSON, streamed a page at a time, or as a
+JSON page with format=json. Rows can be narrowed with fields, a comma
+separated list of columns, and paged with offset and limit. Times are
+given in ISO 8601.
+"""
+
+import json
+from pathlib import Path
+
+from flask import Blueprint, current_app, jsonify, request, url_for
+from sqlalchemy import select
+
+from application import extract_cache
+from application.columnar import ColumnarTable
+from application.extensions import db
+from application.http_cache import cached_result, created_at
+from application.jobs import COMPLETE, jobs
+from application.models import (
+    ClusterAnalysis,
+    Extract,
+    ExtractItem,
+    Job,
+    PlanDataCollection,
+)
+from application.reference_data import DOCUMENT_TYPES
+from application.scratch import ScratchSpaceFull, scratch
+from application.streaming import compress_response, send_stream
+from application.tables import CsvTable
+from application.uploads import UploadError, uploads
+from application.utils import allowed_file
+
+api = Blueprint("api", __name__, url_prefix="/api/v1")
+api.after_request(compress_response)
+
+# job kind -> (result endpoint, result id argument)
+RESULT_VIEWS = {
+    "extract": ("api.extract", "extract_id"),
+    "cluster": ("api.cluster", "analysis_id"),
+    "collect": ("api.collection", "collection_id"),
+}
+
+CLUSTER_MODES = ("standard", "fast")
+
+
+class ApiError(Exception):
+    status = 400
+
+
+@api.errorhandler(ApiError)
+@api.errorhandler(UploadError)
+def api_error(e):
+    return jsonify({"error": str(e)}), e.status
+
+
+@api.errorhandler(ScratchSpaceFull)
+def scratch_space_full(e):
+    return jsonify({"error": str(e)}), 503
+
+
+@api.route("/extracts", methods=["POST"])
+def submit_extract():
+    details = _details()
+    index = _optional_int(details, "index")
+    keywords = details.get("keywords") or None
+    if details.get("url"):
+        if _has_file(details):
+            raise ApiError("Give either a url or a file, but not both")
+        source = details["url"]
+        params = {"file_or_url": "url"}
+        key_source = {"url": source}
+        scratch_dir = None
+    else:
+        if not allowed_file(
+            _filename(details), current_app.config["ALLOWED_EXTENSIONS"]
+        ):
+            raise ApiError("Only PDF files can be uploaded")
+        source, scratch_dir, path = _receive(details)
+        params = {"file_or_url": "file", "path": path, "scratch_dir": scratch_dir}
+        key_source = {"path": path}
+
+    try:
+        cache_key = None
+        if extract_cache.enabled():
+            cache_key = extract_cache.make_key(index, keywords, **key_source)
+            extract_id = extract_cache.lookup(cache_key)
+            if extract_id:
+                scratch.release(scratch_dir)
+                return jsonify(
+                    {
+                        "status": COMPLETE,
+                        "result_url": url_for("api.extract", extract_id=extract_id),
+                    }
+                )
+        job = jobs.submit(
+            "extract",
+            source=source,
+            index=index,
+            keywords=keywords,
+            cache_key=cache_key,
+            **params,
+        )
+    except Exception:
+        scratch.release(scratch_dir)
+        raise
+    return _submitted(job)
+
+
+@api.route("/clusters", methods=["POST"])
+def submit_cluster():
+    details = _details()
+    mode = details.get("mode") or "standard"
+    if mode not in CLUSTER_MODES:
+        raise ApiError(f"mode must be one of {', '.join(CLUSTER_MODES)}")
+    _, scratch_dir, input_path = _receive(details)
+    try:
+        output_dir = Path(scratch_dir) / "output"
+        output_dir.mkdir()
+        job = jobs.submit(
+            "cluster",
+            input_path=input_path,
+            filename=Path(input_path).name,
+            output_dir=str(output_dir),
+            mode=mode,
+            scratch_dir=scratch_dir,
+        )
+    except Exception:
+        scratch.release(scratch_dir)
+        raise
+    return _submitted(job)
+
+
+@api.route("/collections", methods=["POST"])
+def submit_collection():
+    _, scratch_dir, input_path = _receive(_details())
+    try:
+        output_dir = Path(scratch_dir) / "output"
+        output_dir.mkdir()
+        job = jobs.submit(
+            "collect",
+            input_path=input_path,
+            input_filename=Path(input_path).name,
+            reference=DOCUMENT_TYPES,
+            output_dir=str(output_dir),
+            scratch_dir=scratch_dir,
+        )
+    except Exception:
+        scratch.release(scratch_dir)
+        raise
+    return _submitted(job)
+
+
+@api.route("/jobs/<uuid:job_id>")
+def job(job_id):
+    return jsonify(_job_state(db.get_or_404(Job, job_id)))
+
+
+@api.route("/extracts/<uuid:extract_id>")
+@cached_result(lambda extract_id: created_at(Extract, extract_id))
+def extract(extract_id):
+    extract = db.get_or_404(Extract, extract_id)
+    return jsonify(
+        {
+            "id": extract.id,
+            "source": extract.source,
+            "created_at": _timestamp(extract.created_at),
+            "tables": [
+                {
+                    "id": item.id,
+                    "index": item.index,
+                    "headers": item.headers,
+                    "row_count": item.row_count,
+                    "rows_url": url_for(
+                        "api.extract_rows", extract_id=extract_id, item_id=item.id
+                    ),
+                }
+                for item in extract.items
+            ],
+        }
+    )
+
+
+@api.route("/extracts/<uuid:extract_id>/tables/<uuid:item_id>/rows")
+@cached_result(
+    lambda extract_id, item_id: created_at(Extract, extract_id), artifact=True
+)
+def extract_rows(extract_id, item_id):
+    item = db.first_or_404(
+        select(ExtractItem).where(
+            ExtractItem.id == item_id, ExtractItem.extract_id == extract_id
+        )
+    )
+    return _rows(ColumnarTable(item))
+
+
+@api.route("/collections/<uuid:collection_id>")
+@cached_result(lambda collection_id: created_at(PlanDataCollection, collection_id))
+def collection(collection_id):
+    collection = db.get_or_404(PlanDataCollection, collection_id)
+    table = CsvTable(
+        collection, PlanDataCollection.data, PlanDataCollection.id == collection_id
+    )
+    return jsonify(
+        {
+            "id": collection.id,
+            "source_file": collection.source_file,
+            "reference_file": collection.reference_file,
+            "created_at": _timestamp(collection.created_at),
+            "headers": table.headers,
+            "row_count": table.row_count,
+            "url_summary": collection.url_summary,
+            "rows_url": url_for("api.collection_rows", collection_id=collection_id),
+        }
+    )
+
+
+@api.route("/collections/<uuid:collection_id>/rows")
+@cached_result(
+    lambda collection_id: created_at(PlanDataCollection, collection_id),
+    artifact=True,
+)
+def collection_rows(collection_id):
+    collection = db.get_or_404(PlanDataCollection, collection_id)
+    return _rows(
+        CsvTable(
+            collection, PlanDataCollection.data, PlanDataCollection.id == collection_id
+        )
+    )
+
+
+@api.route("/clusters/<uuid:analysis_id>")
+@cached_result(lambda analysis_id: created_at(ClusterAnalysis, analysis_id))
+def cluster(analysis_id):
+    analysis = db.get_or_404(ClusterAnalysis, analysis_id)
+    return jsonify(
+        {
+            "id": analysis.id,
+            "source_file": analysis.source_file,
+            "created_at": _timestamp(analysis.created_at),
+            "mode": analysis.mode,
+            "group_count": analysis.group_count,
+            "grouped_reasons": analysis.grouped_reasons,
+            "visualization_url": url_for(
+                "main.cluster_visualization", analysis_id=analysis_id
+            ),
+            "report_url": url_for("main.cluster_report", analysis_id=analysis_id),
+        }
+    )
+
+
+def _rows(table):
+    """Respond with the rows of a CsvTable or ColumnarTable the request asks for."""
+    fields = table.headers
+    if request.args.get("fields"):
+        fields = [field.strip() for field in request.args["fields"].split(",")]
+        unknown = [field for field in fields if field not in table.headers]
+        if unknown:
+            raise ApiError(f"Unknown fields: {', '.join(unknown)}")
+    offset = max(request.args.get("offset", 0, type=int), 0)
+    limit = request.args.get("limit", type=int)
+    page_size = current_app.config["API_PAGE_SIZE"]
+    as_json = request.args.get("format", "ndjson") == "json"
+    if as_json:
+        limit = min(limit or page_size, current_app.config["API_MAX_PAGE_SIZE"])
+    stop = (
+        table.row_count
+        if limit is None
+        else min(offset + max(limit, 0), table.row_count)
+    )
+    next_url = None
+    if stop < table.row_count:
+        next_url = url_for(
+            request.endpoint,
+            **request.view_args,
+            **dict(request.args.to_dict(), offset=stop),
+        )
+
+    def select_fields(rows):
+        return [{field: row.get(field) for field in fields} for row in rows]
+
+    if as_json:
+        return jsonify(
+            {
+                "fields": fields,
+                "offset": offset,
+                "row_count": table.row_count,
+                "rows": select_fields(table.rows(offset, stop)),
+                "next": next_url,
+            }
+        )
+
+    def lines():
+        for start in range(offset, stop, page_size):
+            rows = select_fields(table.rows(start, min(start + page_size, stop)))
+            yield "".join(json.dumps(row) + "\n" for row in rows).encode("utf-8")
+
+    response = send_stream(lines(), None, mimetype="application/x-ndjson")
+    response.headers["X-Total-Count"] = str(table.row_count)
+    if next_url:
+        response.headers["Link"] = f'<{next_url}>; rel="next"'
+    return response
+
+
+def _details():
+    """The fields of a submission, from a JSON body or a form."""
+    if request.is_json:
+        details = request.get_json(silent=True)
+        if not isinstance(details, dict):
+            raise ApiError("The body must be a JSON object")
+        return details
+    return request.form.to_dict()
+
+
+def _has_file(details):
+    return bool(details.get("upload") or request.files.get("file"))
+
+
+def _filename(details):
+    if not _has_file(details):
+        raise ApiError("Give a file, or the id of a chunked upload as upload")
+    return uploads.filename(request.files.get("file"), details.get("upload"))
+
+
+def _receive(details):
+    """Put the submitted file in a scratch directory, see Uploads.receive."""
+    if not _has_file(details):
+        raise ApiError("Give a file, or the id of a chunked upload as upload")
+    return uploads.receive(request.files.get("file"), details.get("upload"))
+
+
+def _optional_int(details, name):
+    value = details.get(name)
+    if value in (None, ""):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ApiError(f"{name} must be a whole number")
+
+
+def _submitted(job):
+    response = jsonify(_job_state(job))
+    response.status_code = 202
+    response.headers["Location"] = url_for("api.job", job_id=job.id)
+    return response
+
+
+def _job_state(job):
+    state = {
+        "id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "error": job.error,
+        "created_at": _timestamp(job.created_at),
+        "started_at": _timestamp(job.started_at),
+        "finished_at": _timestamp(job.finished_at),
+        "progress": job.progress,
+        "url": url_for("api.job", job_id=job.id),
+    }
+    if job.status == COMPLETE and job.kind in RESULT_VIEWS:
+        endpoint, argument = RESULT_VIEWS[job.kind]
+        state["result_url"] = url_for(endpoint, **{argument: job.result_id})
+    return state
+
+
+def _timestamp(value):
+    return value.isoformat() if value is not None else None
@@ -0,0 +1,202 @@
+"""Content addressed storage for large binary results.
+
+Rows keep a reference to the blob along with its hash and size, and the
+bytes themselves live in a BlobStore. DatabaseBlobStore, the default,
+keeps them in the blob table, which outlives the app's own disk.
+LocalBlobStore keeps them on the local filesystem, for development or a
+persistent volume. Another backend, such as a bucket, only needs to
+implement the same methods and be added to BACKENDS.
+
+A missing blob raises FileNotFoundError from open, whatever the backend.
+"""
+
+import datetime
+import hashlib
+import io
+import logging
+import os
+import tempfile
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import IntegrityError
+
+from application.extensions import db
+from application.models import Blob
+
+logger = logging.getLogger(__name__)
+
+
+class BlobStore:
+    def put(self, data):
+        """Store data and return a (ref, sha256 hex digest, size) tuple."""
+        raise NotImplementedError
+
+    def open(self, ref):
+        """Open the blob for reading as a binary file object."""
+        raise NotImplementedError
+
+    def read(self, ref):
+        with self.open(ref) as f:
+            return f.read()
+
+    def exists(self, ref):
+        raise NotImplementedError
+
+    def delete(self, ref):
+        raise NotImplementedError
+
+    def sweep(self, keep, before):
+        """Delete blobs not in keep that were stored before the given time.
+
+        Returns a (count, bytes) tuple of what was deleted.
+        """
+        raise NotImplementedError
+
+
+class LocalBlobStore(BlobStore):
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def put(self, data):
+        digest = hashlib.sha256(data).hexdigest()
+        ref = f"{digest[:2]}/{digest}"
+        path = self._path(ref)
+        try:
+            # stored again, so give the new row the sweep's grace period too
+            os.utime(path)
+        except FileNotFoundError:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        return ref, digest, len(data)
+
+    def open(self, ref):
+        return open(self._path(ref), "rb")
+
+    def exists(self, ref):
+        return os.path.exists(self._path(ref))
+
+    def delete(self, ref):
+        try:
+            os.remove(self._path(ref))
+        except FileNotFoundError:
+            pass
+
+    def sweep(self, keep, before):
+        count = size = 0
+        cutoff = before.timestamp()
+        for directory in os.scandir(self.root):
+            if not directory.is_dir():
+                continue
+            for entry in os.scandir(directory.path):
+                ref = f"{directory.name}/{entry.name}"
+                stat = entry.stat()
+                if ref in keep or stat.st_mtime >= cutoff:
+                    continue
+                self.delete(ref)
+                count += 1
+                size += stat.st_size
+        return count, size
+
+    def _path(self, ref):
+        return os.path.join(self.root, ref)
+
+
+class DatabaseBlobStore(BlobStore):
+    """Blobs kept in the blob table.
+
+    A blob is added to the session, so it's committed along with the row
+    that refers to it.
+    """
+
+    def put(self, data):
+        digest = hashlib.sha256(data).hexdigest()
+        ref = f"{digest[:2]}/{digest}"
+        # stored again, so give the new row the sweep's grace period too
+        stored = db.session.execute(
+            update(Blob)
+            .where(Blob.ref == ref)
+            .values(stored_at=datetime.datetime.today())
+        )
+        if stored.rowcount == 0:
+            try:
+                with db.session.begin_nested():
+                    db.session.add(Blob(ref=ref, data=data, size=len(data)))
+            except IntegrityError:
+                # stored by another run since we looked
+                pass
+        return ref, digest, len(data)
+
+    def open(self, ref):
+        data = db.session.execute(select(Blob.data).where(Blob.ref == ref)).scalar()
+        if data is None:
+            raise FileNotFoundError(f"No blob {ref}")
+        return io.BytesIO(data)
+
+    def exists(self, ref):
+        return (
+            db.session.execute(select(Blob.ref).where(Blob.ref == ref)).scalar()
+            is not None
+        )
+
+    def delete(self, ref):
+        db.session.execute(delete(Blob).where(Blob.ref == ref))
+        db.session.commit()
+
+    def sweep(self, keep, before):
+        count = size = 0
+        for ref, blob_size in db.session.execute(
+            select(Blob.ref, Blob.size).where(Blob.stored_at < before)
+        ).all():
+            if ref in keep:
+                continue
+            db.session.execute(delete(Blob).where(Blob.ref == ref))
+            count += 1
+            size += blob_size
+        db.session.commit()
+        return count, size
+
+
+# name -> function making the store from the app config
+BACKENDS = {
+    "database": lambda config: DatabaseBlobStore(),
+    "local": lambda config: LocalBlobStore(config["BLOB_STORE_ROOT"]),
+}
+
+
+class Blobs:
+    """Flask extension giving access to the configured BlobStore."""
+
+    def __init__(self, app=None):
+        self.store = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.store = BACKENDS[app.config["BLOB_STORE"]](app.config)
+        if isinstance(self.store, LocalBlobStore) and "DYNO" in os.environ:
+            logger.warning(
+                "Blobs are stored in %s, which is lost when the dyno restarts",
+                self.store.root,
+            )
+        app.extensions["blobs"] = self
+
+    def __getattr__(self, name):
+        if self.store is None:
+            raise RuntimeError("Blob store has not been initialised")
+        return getattr(self.store, name)
+
+
+blobs = Blobs()
+
+
+def sweep_unreferenced(keep, grace=datetime.timedelta(hours=1)):
+    """Delete blobs no longer referenced, sparing any stored within grace.
+
+    The grace period protects blobs written by jobs that haven't yet
+    committed the row referencing them.
+    """
+    return blobs.sweep(keep, datetime.datetime.now() - grace)
@@ -0,0 +1,215 @@
+"""Sharded runs of collect_plan_data.
+
+The input CSV is split into shards of consecutive rows which are collected
+concurrently. A shard only starts once it holds a slot for every host its
+URLs point at, so a single council website never sees more than
+``host_limit`` shards at a time. Shard outputs are merged back in input
+order.
+
+collect_plan_data_incremental collects only the rows whose documents have
+changed since a previous collection, copying that collection's output for
+the rest.
+
+Both take an on_progress callback, called on the calling thread as rows
+are done with the number of input rows and URLs, the output header, and
+the output and failed URL rows they produced.
+"""
+
+import csv
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlparse
+
+URL_COLUMNS = ["document-url", "documentation-url"]
+
+
+def collect_plan_data_sharded(
+    input_path,
+    ref_path,
+    output_path,
+    failed_urls_path,
+    workers=4,
+    shard_size=10,
+    host_limit=2,
+    on_progress=None,
+):
+    with open(input_path, newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        rows = list(reader)
+    if not rows:
+        # nothing to collect, so an empty collection with the input's columns
+        with open(output_path, "w", newline="") as f:
+            csv.writer(f).writerow(header)
+        open(failed_urls_path, "w").close()
+        return
+
+    shards = [rows[i : i + shard_size] for i in range(0, len(rows), shard_size)]
+    url_indexes = [header.index(col) for col in URL_COLUMNS if col in header]
+    shard_hosts = [
+        sorted({_host(row[i]) for row in shard for i in url_indexes} - {""})
+        for shard in shards
+    ]
+    host_slots = {
+        host: threading.BoundedSemaphore(host_limit)
+        for hosts in shard_hosts
+        for host in hosts
+    }
+
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(output_path)) as shard_dir:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(
+                    _collect_shard,
+                    os.path.join(shard_dir, str(number)),
+                    header,
+                    shard,
+                    ref_path,
+                    [host_slots[host] for host in hosts],
+                ): shard
+                for number, (shard, hosts) in enumerate(zip(shards, shard_hosts))
+            }
+            if on_progress is not None:
+                for future in as_completed(futures):
+                    shard = futures[future]
+                    urls = sum(1 for row in shard for i in url_indexes if row[i])
+                    output_header, output_rows = _read_csv(future.result()[0])
+                    _, failed_rows = _read_csv(future.result()[1])
+                    on_progress(
+                        len(shard), urls, output_header, output_rows, failed_rows
+                    )
+            results = [future.result() for future in futures]
+
+        _concat_csv([output for output, _ in results], output_path)
+        _concat_csv([failed for _, failed in results], failed_urls_path)
+
+
+def collect_plan_data_incremental(
+    input_path, ref_path, output_path, failed_urls_path, reuse, **options
+):
+    """Collect the input rows that have no previous output in reuse.
+
+    reuse is a (header, rows) pair, where rows maps the reference of an
+    input row to the output rows a previous collection produced for it.
+    Those rows are written in place of collecting the input row again.
+    options are passed to collect_plan_data_sharded. Returns the number of
+    input rows reused.
+    """
+    reuse_header, reuse_rows = reuse
+    with open(input_path, newline="") as f:
+        reader = csv.DictReader(f)
+        input_header = reader.fieldnames
+        rows = list(reader)
+    reused = [row.get("reference") in reuse_rows for row in rows]
+    on_progress = options.get("on_progress")
+    if on_progress is not None and any(reused):
+        on_progress(
+            sum(reused),
+            0,
+            reuse_header,
+            [
+                [output.get(column, "") for column in reuse_header]
+                for row, r in zip(rows, reused)
+                if r
+                for output in reuse_rows[row.get("reference")]
+            ],
+            [],
+        )
+    if not any(reused):
+        collect_plan_data_sharded(
+            input_path, ref_path, output_path, failed_urls_path, **options
+        )
+        return 0
+
+    output_dir = os.path.dirname(output_path)
+    header, collected = reuse_header, {}
+    if not all(reused):
+        with tempfile.TemporaryDirectory(dir=output_dir) as collect_dir:
+            changed_path = os.path.join(collect_dir, "input.csv")
+            collected_path = os.path.join(collect_dir, "plan_documents.csv")
+            with open(changed_path, "w", newline="") as f:
+                writer = csv.DictWriter(f, input_header)
+                writer.writeheader()
+                writer.writerows(row for row, r in zip(rows, reused) if not r)
+            collect_plan_data_sharded(
+                changed_path, ref_path, collected_path, failed_urls_path, **options
+            )
+            if os.path.exists(collected_path):
+                with open(collected_path, newline="") as f:
+                    reader = csv.DictReader(f)
+                    header = reader.fieldnames or reuse_header
+                    for row in reader:
+                        collected.setdefault(row.get("reference"), []).append(row)
+
+    # merge back in input order; collected rows the input can't be matched
+    # to are kept at the end
+    with open(output_path, "w", newline="") as f:
+        writer = csv.DictWriter(f, header, restval="", extrasaction="ignore")
+        writer.writeheader()
+        for row, r in zip(rows, reused):
+            reference = row.get("reference")
+            if r:
+                writer.writerows(reuse_rows[reference])
+            else:
+                writer.writerows(collected.pop(reference, []))
+        for remaining in collected.values():
+            writer.writerows(remaining)
+    return sum(reused)
+
+
+def _read_csv(path):
+    """The header and rows of a CSV file, or nothing if it wasn't written."""
+    if not os.path.exists(path):
+        return None, []
+    with open(path, newline="") as f:
+        reader = csv.reader(f)
+        return next(reader, None), list(reader)
+
+
+def _host(url):
+    return urlparse(url.strip()).netloc.lower()
+
+
+def _collect_shard(shard_dir, header, rows, ref_path, slots):
+    os.makedirs(shard_dir)
+    input_path = os.path.join(shard_dir, "input.csv")
+    output_path = os.path.join(shard_dir, "plan_documents.csv")
+    failed_urls_path = os.path.join(shard_dir, "failed_urls.csv")
+
+    with open(input_path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(rows)
+
+    # slots are acquired in host order so shards can't deadlock each other
+    for slot in slots:
+        slot.acquire()
+    try:
+        from planning_data_analysis.collect_plan_data import collect_plan_data
+
+        collect_plan_data(input_path, ref_path, output_path, failed_urls_path)
+    finally:
+        for slot in reversed(slots):
+            slot.release()
+
+    return output_path, failed_urls_path
+
+
+def _concat_csv(paths, output_path):
+    """Join CSV files sharing a header, skipping any that weren't written."""
+    paths = [path for path in paths if os.path.exists(path)]
+    if not paths:
+        return
+    with open(output_path, "w", newline="") as out:
+        for number, path in enumerate(paths):
+            with open(path, newline="") as f:
+                header = f.readline()
+                if number == 0:
+                    out.write(header if header.endswith("\n") else header + "\n")
+                line = ""
+                for line in f:
+                    out.write(line)
+                if line and not line.endswith("\n"):
+                    out.write("\n")
@@ -0,0 +1,310 @@
+"""Columnar storage for extracted tables.
+
+Tables are stored as typed column values in chunks of ``CHUNK_ROWS`` rows,
+one table_content_chunk row per chunk, each holding a list of value lists,
+one per column. The item keeps the column names, types and summary
+statistics, so a page of rows is read from just the chunks that hold it
+and CSV downloads are written straight from the stored values without
+parsing any text.
+
+The same tables, such as fee schedules, are extracted again and again, so
+chunks are stored once per distinct table under the sha256 of its columns
+and values. Items refer to their table's content by that hash, and
+table_content counts the items referring to it. Storing a table that's
+already there only adds one to its count, and retention frees content
+only once its count is back to zero. Items saved before this kept their
+own chunks in extract_item_chunk, until deduplicate_legacy moves them.
+"""
+
+import csv
+import hashlib
+import json
+import math
+from io import StringIO
+
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.exc import IntegrityError
+
+from application.extensions import db
+from application.models import (
+    ExtractItem,
+    ExtractItemChunk,
+    TableContent,
+    TableContentChunk,
+)
+from application.tables import sort_key
+
+CHUNK_ROWS = 1000
+
+
+def encode_frame(frame, chunk_rows=CHUNK_ROWS):
+    """Split a DataFrame into column metadata and chunks of typed values.
+
+    Returns a dict of headers, columns, row_count and chunk_rows suitable
+    for passing straight to the ExtractItem constructor, and the list of
+    chunks, each a list of value lists with one list per column.
+    """
+    headers = [str(name) for name in frame.columns]
+    columns = []
+    values = []
+    for position, name in enumerate(headers):
+        series = frame.iloc[:, position]
+        kind = _column_type(series)
+        columns.append({"name": name, "type": kind, "stats": _stats(series, kind)})
+        values.append(_values(series, kind))
+
+    row_count = len(frame)
+    chunks = [
+        [column[start : start + chunk_rows] for column in values]
+        for start in range(0, row_count, chunk_rows)
+    ]
+    return {
+        "headers": headers,
+        "columns": columns,
+        "row_count": row_count,
+        "chunk_rows": chunk_rows,
+    }, chunks
+
+
+def store_table(metadata, chunks):
+    """Add a reference to the stored content of a table, storing it if it's new.
+
+    metadata and chunks are as returned by encode_frame. Returns the hash
+    of the content, for the item's content_hash. The caller commits.
+    """
+    content_hash, size = _content_hash(metadata, chunks)
+    if _add_reference(content_hash):
+        return content_hash
+    content = TableContent(
+        hash=content_hash,
+        size=size,
+        ref_count=1,
+        chunks=[
+            TableContentChunk(number=number, data=data)
+            for number, data in enumerate(chunks)
+        ],
+    )
+    try:
+        with db.session.begin_nested():
+            db.session.add(content)
+    except IntegrityError:
+        # stored by another run since we looked
+        _add_reference(content_hash)
+    return content_hash
+
+
+def storage_stats():
+    """How much storing each distinct table once saves."""
+    distinct, stored, referenced, references = db.session.execute(
+        select(
+            func.count(),
+            func.coalesce(func.sum(TableContent.size), 0),
+            func.coalesce(func.sum(TableContent.size * TableContent.ref_count), 0),
+            func.coalesce(func.sum(TableContent.ref_count), 0),
+        )
+    ).one()
+    legacy = db.session.execute(
+        select(func.count()).where(ExtractItem.content_hash.is_(None))
+    ).scalar()
+    return {
+        "tables": references,
+        "distinct_tables": distinct,
+        "stored_bytes": stored,
+        "referenced_bytes": referenced,
+        "bytes_saved": referenced - stored,
+        "dedup_ratio": round(referenced / stored, 2) if stored else None,
+        "legacy_tables": legacy,
+    }
+
+
+def deduplicate_legacy(batch_size=100):
+    """Move the chunks of items saved before deduplication to shared content.
+
+    Works through batch_size items per transaction, returning the number of
+    items moved.
+    """
+    moved = 0
+    while True:
+        items = (
+            db.session.execute(
+                select(ExtractItem)
+                .where(ExtractItem.content_hash.is_(None))
+                .limit(batch_size)
+            )
+            .scalars()
+            .all()
+        )
+        if not items:
+            return moved
+        for item in items:
+            chunks = [
+                data
+                for data, in db.session.execute(
+                    select(ExtractItemChunk.data)
+                    .where(ExtractItemChunk.extract_item_id == item.id)
+                    .order_by(ExtractItemChunk.number)
+                )
+            ]
+            metadata = {
+                "headers": item.headers,
+                "columns": item.columns,
+                "row_count": item.row_count,
+                "chunk_rows": item.chunk_rows,
+            }
+            item.content_hash = store_table(metadata, chunks)
+            db.session.execute(
+                delete(ExtractItemChunk).where(
+                    ExtractItemChunk.extract_item_id == item.id
+                )
+            )
+        db.session.commit()
+        moved += len(items)
+
+
+def _content_hash(metadata, chunks):
+    """The sha256 hex digest of a table's content, and its size in bytes."""
+    digest = hashlib.sha256()
+    size = 0
+    for part in [
+        [metadata["headers"], metadata["columns"], metadata["chunk_rows"]],
+        *chunks,
+    ]:
+        encoded = json.dumps(part, separators=(",", ":"), default=str).encode("utf-8")
+        digest.update(encoded)
+        digest.update(b"\n")
+        size += len(encoded)
+    return digest.hexdigest(), size
+
+
+def _add_reference(content_hash):
+    result = db.session.execute(
+        update(TableContent)
+        .where(TableContent.hash == content_hash)
+        .values(ref_count=TableContent.ref_count + 1)
+    )
+    return result.rowcount > 0
+
+
+class ColumnarTable:
+    """Read access to a stored table for the result and download views."""
+
+    def __init__(self, item):
+        self.item = item
+        self.headers = item.headers
+        self.row_count = item.row_count
+
+    def rows(self, start, stop):
+        """Rows start to stop (zero based, exclusive) as dicts of display text."""
+        chunk_rows = self.item.chunk_rows
+        first = start // chunk_rows
+        last = max(math.ceil(stop / chunk_rows) - 1, first)
+        rows = []
+        for number, data in self._chunks(first, last):
+            offset = number * chunk_rows
+            for position, row in enumerate(zip(*data), start=offset):
+                if start <= position < stop:
+                    rows.append(self._display(row))
+        return rows
+
+    def sorted_rows(self, sort, reverse, start, stop):
+        """A page of rows ordered by the sort column.
+
+        Sorting needs every chunk, so callers should only offer it for
+        tables up to RESULTS_SORT_MAX_ROWS rows.
+        """
+        position = self.headers.index(sort)
+        rows = [row for _, data in self._chunks() for row in zip(*data)]
+        rows.sort(key=lambda row: sort_key(row[position]), reverse=reverse)
+        return [self._display(row) for row in rows[start:stop]]
+
+    def iter_csv(self):
+        """Yield the table as UTF-8 encoded CSV, one chunk at a time."""
+        buffer = StringIO()
+        writer = csv.writer(buffer, quoting=csv.QUOTE_MINIMAL, lineterminator="\n")
+        writer.writerow(self.headers)
+        yield _drain(buffer)
+        for number in range(math.ceil(self.row_count / self.item.chunk_rows)):
+            for _, data in self._chunks(number, number):
+                writer.writerows([_text(value) for value in row] for row in zip(*data))
+            yield _drain(buffer)
+
+    def _chunks(self, first=None, last=None):
+        if self.item.content_hash is not None:
+            model = TableContentChunk
+            statement = select(model.number, model.data).where(
+                model.content_hash == self.item.content_hash
+            )
+        else:
+            model = ExtractItemChunk
+            statement = select(model.number, model.data).where(
+                model.extract_item_id == self.item.id
+            )
+        if first is not None:
+            statement = statement.where(model.number.between(first, last))
+        return db.session.execute(statement.order_by(model.number)).all()
+
+    def _display(self, row):
+        return {header: _text(value) for header, value in zip(self.headers, row)}
+
+
+def _column_type(series):
+    # imported here so pages that only read tables don't load pandas
+    from pandas.api import types
+
+    if types.is_bool_dtype(series):
+        return "boolean"
+    if types.is_integer_dtype(series):
+        return "integer"
+    if types.is_float_dtype(series):
+        return "number"
+    if types.is_datetime64_any_dtype(series):
+        return "datetime"
+    return "text"
+
+
+def _values(series, kind):
+    present = series.notna()
+    if kind == "number":
+        # JSON has no NaN or infinity
+        present &= series.abs() != math.inf
+    if kind in ("datetime", "text"):
+        series = series.map(str, na_action="ignore")
+    return series.astype(object).where(present, None).tolist()
+
+
+def _stats(series, kind):
+    stats = {
+        "count": int(series.count()),
+        "nulls": int(series.isna().sum()),
+        "distinct": int(series.nunique()),
+    }
+    if kind in ("integer", "number") and stats["count"]:
+        stats.update(
+            {
+                "min": _scalar(series.min()),
+                "max": _scalar(series.max()),
+                "mean": _scalar(float(series.mean())),
+            }
+        )
+    elif kind == "datetime" and stats["count"]:
+        stats.update({"min": str(series.min()), "max": str(series.max())})
+    return stats
+
+
+def _scalar(value):
+    value = value.item() if hasattr(value, "item") else value
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+
+def _text(value):
+    # matches what DataFrame.to_csv writes for the same value
+    return "" if value is None else str(value)
+
+
+def _drain(buffer):
+    text = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    return text.encode("utf-8")
@@ -1,56 +1,162 @@
+import os
 from datetime import datetime, timedelta
 
 import click
 from flask.cli import AppGroup
+from sqlalchemy import select
 
+from application import extract_cache
+from application.blobstore import sweep_unreferenced
+from application.columnar import deduplicate_legacy, storage_stats
 from application.extensions import db
-from application.models import ClusterAnalysis, Extract, PlanDataCollection
+from application.models import ClusterAnalysis, Upload
+from application.reference_data import DOCUMENT_TYPES, reference_data
+from application.retention import purge
+from application.scratch import scratch
+from application.warmup import import_report
 
 cli = AppGroup("cli")
 
 
 @cli.command("delete-all-results")
-def delete_all_results():
+@click.option("--batch-size", default=1000, help="Rows to delete per transaction")
+@click.option("--dry-run", is_flag=True, help="Count what would be deleted")
+def delete_all_results(batch_size, dry_run):
     """Delete all results from the database."""
-    Extract.query.delete()
-    ClusterAnalysis.query.delete()
-    PlanDataCollection.query.delete()
-    db.session.commit()
+    report = purge(batch_size=batch_size, dry_run=dry_run)
+    _echo_report(report, dry_run)
+    if not dry_run:
+        _sweep_blobs()
 
 
 @cli.command("delete-old-results")
 @click.option("--days", default=5, help="Delete data older than this many days")
-def delete_old_results(days):
+@click.option("--batch-size", default=1000, help="Rows to delete per transaction")
+@click.option("--dry-run", is_flag=True, help="Count what would be deleted")
+def delete_old_results(days, batch_size, dry_run):
     """Delete results older than specified days."""
     cutoff_date = datetime.now() - timedelta(days=days)
+    report = purge(cutoff_date, batch_size=batch_size, dry_run=dry_run)
+    _echo_report(report, dry_run)
+    if not dry_run:
+        _sweep_blobs()
+
+
+def _echo_report(report, dry_run):
+    action = "Would delete" if dry_run else "Deleted"
+    for table, entry in report.items():
+        click.echo(
+            f"{action} {entry['rows']} {table} rows, {entry['bytes']} bytes "
+            f"in {entry['seconds']:.2f}s"
+        )
+    rows = sum(entry["rows"] for entry in report.values())
+    size = sum(entry["bytes"] for entry in report.values())
+    click.echo(f"Total: {rows} rows, {size} bytes")
+
+
+@cli.command("sweep-blobs")
+def sweep_blobs():
+    """Delete stored blobs that no cluster analysis refers to."""
+    _sweep_blobs()
+
+
+def _sweep_blobs():
+    keep = set()
+    for visualization_ref, report_ref in db.session.execute(
+        select(ClusterAnalysis.visualization_ref, ClusterAnalysis.report_ref)
+    ):
+        keep.update([visualization_ref, report_ref])
+    count, size = sweep_unreferenced(keep)
+    click.echo(f"Deleted {count} unreferenced blobs ({size} bytes)")
+
+
+@cli.command("extract-cache-stats")
+def extract_cache_stats():
+    """Show the size and hit counts of the extraction cache."""
+    for name, value in extract_cache.stats().items():
+        click.echo(f"{name}: {value}")
+
 
-    # Delete old extracts
-    old_extracts = Extract.query.filter(Extract.created_at < cutoff_date).all()
-    for extract in old_extracts:
-        db.session.delete(extract)
-    extracts_count = len(old_extracts)
-
-    # Delete old cluster analyses
-    old_analyses = ClusterAnalysis.query.filter(
-        ClusterAnalysis.created_at < cutoff_date
-    ).all()
-    for analysis in old_analyses:
-        db.session.delete(analysis)
-    analyses_count = len(old_analyses)
-
-    # Delete old plan data collections
-    old_collections = PlanDataCollection.query.filter(
-        PlanDataCollection.created_at < cutoff_date
-    ).all()
-    for collection in old_collections:
-        db.session.delete(collection)
-    collections_count = len(old_collections)
+@cli.command("table-storage-report")
+def table_storage_report():
+    """Show how much storing each distinct extracted table once saves."""
+    for name, value in storage_stats().items():
+        click.echo(f"{name}: {value}")
 
+
+@cli.command("deduplicate-tables")
+@click.option("--batch-size", default=100, help="Tables to move per transaction")
+def deduplicate_tables(batch_size):
+    """Move tables saved before deduplication to shared content."""
+    moved = deduplicate_legacy(batch_size)
+    click.echo(f"Moved {moved} tables")
+    for name, value in storage_stats().items():
+        click.echo(f"{name}: {value}")
+
+
+@cli.command("scratch-usage")
+def scratch_usage():
+    """Show how much of the scratch space quota is in use."""
+    for name, value in scratch.usage().items():
+        click.echo(f"{name}: {value}")
+
+
+@cli.command("reference-data")
+@click.option("--name", default=DOCUMENT_TYPES, help="Reference data to load")
+def show_reference_data(name):
+    """Check reference data and show where it was read from."""
+    reference_set = reference_data.get(name)
+    click.echo(f"{name}: {reference_set.path}")
+    click.echo(f"sha256: {reference_set.sha256}")
+
+
+@cli.command("sweep-scratch")
+@click.option(
+    "--max-age-hours", default=24, help="Remove directories idle for this long"
+)
+def sweep_scratch(max_age_hours):
+    """Remove scratch directories left behind by runs that never finished."""
+    count, size = scratch.sweep(max_age_hours * 60 * 60)
+    click.echo(f"Removed {count} scratch directories ({size} bytes)")
+    # unfinished uploads are kept by the retention commands until now
+    abandoned = [
+        upload
+        for upload in db.session.execute(
+            select(Upload).where(Upload.completed_at.is_(None))
+        ).scalars()
+        if not os.path.isdir(upload.scratch_dir)
+    ]
+    for upload in abandoned:
+        db.session.delete(upload)
     db.session.commit()
+    click.echo(f"Removed {len(abandoned)} abandoned uploads")
+
+
+@cli.command("startup-report")
+@click.option("--top", default=10, help="Number of packages to list")
+@click.option(
+    "--max-seconds",
+    type=float,
+    help="Fail if a cold import of the app takes longer than this",
+)
+def startup_report(top, max_seconds):
+    """Time a cold import of the app, broken down by package.
 
-    click.echo(f"Deleted {extracts_count} extracts")
-    click.echo(f"Deleted {analyses_count} cluster analyses")
-    click.echo(f"Deleted {collections_count} plan data collections")
-    click.echo(
-        f"Total items deleted: {extracts_count + analyses_count + collections_count}"
-    )
+    Fails if the import loads any of the heavy analysis modules, or takes
+    longer than --max-seconds, so it can guard against startup regressions.
+    """
+    total, packages, heavy = import_report()
+    click.echo(f"Cold import of application.wsgi: {total:.2f}s")
+    for package, seconds in sorted(
+        packages.items(), key=lambda item: item[1], reverse=True
+    )[:top]:
+        click.echo(f"  {package}: {seconds:.2f}s")
+    failures = []
+    if heavy:
+        failures.append(f"Heavy modules imported at startup: {', '.join(heavy)}")
+    if max_seconds is not None and total > max_seconds:
+        failures.append(f"Startup took {total:.2f}s, over the {max_seconds:.2f}s limit")
+    for failure in failures:
+        click.echo(failure, err=True)
+    if failures:
+        raise SystemExit(1)
@@ -0,0 +1,242 @@
+"""Compression at rest for large text and JSON columns.
+
+Values are compressed with zlib and a preset dictionary of the headers,
+document types and URL fragments that most of our CSV is made of, which
+gets a small frame most of the way to the ratio of a large one. A value
+is split into frames of FRAME_CHARS characters, each compressed on its
+own, after a header recording where each frame ends, both in the value
+and in the UTF-8 encoded text. So a page of rows, or a range of bytes of a
+download, is read by fetching the header and then just the frames that
+hold it, and downloads are decompressed a frame at a time as they stream.
+
+CompressedText and CompressedJSON are the column types. They compress
+values as they're written and decompress them whole when they're loaded;
+read_slice, iter_bytes and text_size read part of a value, or its size,
+in SQL.
+"""
+
+import bisect
+import json
+import struct
+import zlib
+
+from sqlalchemy import LargeBinary, func, select
+from sqlalchemy.types import TypeDecorator
+
+from application.extensions import db
+
+FRAME_CHARS = 32 * 1024
+LEVEL = 6
+
+# magic, dictionary, characters per frame, frames, size of the text in bytes
+_HEADER = struct.Struct(">4sHIIQ")
+_MAGIC = b"DAZ1"
+# followed by the end of each frame, counted from the end of these, and
+# the end of its text in bytes
+_END = struct.Struct(">IQ")
+
+# Values can only be decompressed with the dictionary they were compressed
+# with, so never change one; add the next number and make it DICTIONARY.
+# zlib finds the strings near the end of a dictionary most cheaply, so the
+# most common come last.
+DICTIONARIES = {
+    1: "".join(
+        [
+            "url,status,error,reason,documentation_url,",
+            "Draft Regulation 18 Regulation 19 consultation Examination ",
+            "Evidence base Inspector's report Sustainability appraisal ",
+            "Strategic environmental assessment Site allocations Policies map ",
+            "Supplementary planning document Adoption statement Local Plan ",
+            "local-development-scheme,local-plan-review,core-strategy,",
+            "strategic-flood-risk-assessment,strategic-housing-market-assessment,",
+            "financial-viability-study,viability-assessment,inspectors-report,",
+            "sustainability-appraisal,site-allocations,policies-map,",
+            "area-action-plan,adoption-statement,supplementary-planning-documents,",
+            "/documents/,/download/,/downloads/,/media/,/planning/,",
+            "/planning-policy/local-plan/,/sites/default/files/20",
+            " (PDF, KB) (PDF, MB)%20.pdf,https://www.,.gov.uk/,",
+            "local-plan,\r\n",
+            "reference,plan,name,document-url,documentation-url,document-types\r\n",
+        ]
+    ).encode("utf-8"),
+}
+DICTIONARY = 1
+
+
+class CompressedText(TypeDecorator):
+    """Text stored compressed, see the module docstring."""
+
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return None if value is None else compress_text(value)
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else decompress_text(value)
+
+
+class CompressedJSON(CompressedText):
+    """JSON stored as compressed text."""
+
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return compress_text(json.dumps(value, separators=(",", ":")))
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else json.loads(decompress_text(value))
+
+
+def compress_text(text, frame_chars=FRAME_CHARS):
+    frames = []
+    ends = []
+    end = size = 0
+    for start in range(0, len(text), frame_chars):
+        encoded = text[start : start + frame_chars].encode("utf-8")
+        size += len(encoded)
+        compressor = zlib.compressobj(LEVEL, zdict=DICTIONARIES[DICTIONARY])
+        frames.append(compressor.compress(encoded) + compressor.flush())
+        end += len(frames[-1])
+        ends.append((end, size))
+    header = _HEADER.pack(_MAGIC, DICTIONARY, frame_chars, len(frames), size)
+    return b"".join([header, *(_END.pack(*frame_end) for frame_end in ends), *frames])
+
+
+def decompress_text(data):
+    data = bytes(data)
+    dictionary, _, count, _ = _header(data)
+    ends = [end for end, _ in _ends(data[_HEADER.size :], count)]
+    return _decompress(data[_data_start(count) :], [0, *ends], dictionary)
+
+
+def read_slice(column, *criteria, start, length):
+    """Characters start to start + length (zero based) of a compressed value.
+
+    The header and the ends of the frames needed are read in one query and
+    the frames in another, so a slice costs the same wherever it is.
+    Returns None if the value is NULL.
+    """
+    frame_chars = FRAME_CHARS
+    while True:
+        first = start // frame_chars
+        last = (start + max(length, 1) - 1) // frame_chars
+        # the end of the frame before the first is where the first starts
+        index_from = max(first - 1, 0)
+        row = db.session.execute(
+            select(
+                _substr(column, 1, _HEADER.size),
+                _substr(
+                    column,
+                    _HEADER.size + index_from * _END.size + 1,
+                    (last - index_from + 1) * _END.size,
+                ),
+            ).where(*criteria)
+        ).one_or_none()
+        if row is None or row[0] is None:
+            return None
+        dictionary, stored_frame_chars, count, _ = _header(bytes(row[0]))
+        # compressed with another frame size, so look again using that
+        if stored_frame_chars == frame_chars:
+            break
+        frame_chars = stored_frame_chars
+
+    if length <= 0 or first >= count:
+        return ""
+    last = min(last, count - 1)
+    ends = [end for end, _ in _ends(bytes(row[1]), last - index_from + 1)]
+    if first == 0:
+        ends = [0, *ends]
+    data = db.session.execute(
+        select(
+            _substr(
+                column,
+                _data_start(count) + ends[0] + 1,
+                ends[-1] - ends[0],
+            )
+        ).where(*criteria)
+    ).scalar()
+    text = _decompress(bytes(data), [end - ends[0] for end in ends], dictionary)
+    offset = start - first * frame_chars
+    return text[offset : offset + length]
+
+
+def iter_bytes(column, *criteria, start, stop, frames_per_read=8):
+    """Yield bytes start to stop of the UTF-8 encoded text of a compressed value.
+
+    The ends of the frames' text find the frames holding the range, and
+    only those are read, frames_per_read at a time, and decompressed.
+    """
+    header = db.session.execute(
+        select(_substr(column, 1, _HEADER.size)).where(*criteria)
+    ).scalar()
+    if header is None:
+        return
+    dictionary, _, count, _ = _header(bytes(header))
+    if count == 0 or start >= stop:
+        return
+    index = db.session.execute(
+        select(_substr(column, _HEADER.size + 1, count * _END.size)).where(*criteria)
+    ).scalar()
+    ends = _ends(bytes(index), count)
+    bounds = [0, *(end for end, _ in ends)]
+    text_ends = [text_end for _, text_end in ends]
+    first = bisect.bisect_right(text_ends, start)
+    last = min(bisect.bisect_left(text_ends, stop), count - 1)
+
+    for read_from in range(first, last + 1, frames_per_read):
+        read_to = min(read_from + frames_per_read, last + 1)
+        base = bounds[read_from]
+        data = db.session.execute(
+            select(
+                _substr(column, _data_start(count) + base + 1, bounds[read_to] - base)
+            ).where(*criteria)
+        ).scalar()
+        data = bytes(data)
+        for number in range(read_from, read_to):
+            decompressor = zlib.decompressobj(zdict=DICTIONARIES[dictionary])
+            text = decompressor.decompress(
+                data[bounds[number] - base : bounds[number + 1] - base]
+            )
+            offset = text_ends[number - 1] if number else 0
+            yield text[max(start - offset, 0) : stop - offset]
+
+
+def text_size(column, *criteria):
+    """Size in bytes of the UTF-8 encoded text of a compressed value."""
+    header = db.session.execute(
+        select(_substr(column, 1, _HEADER.size)).where(*criteria)
+    ).scalar()
+    return None if header is None else _header(bytes(header))[3]
+
+
+def _header(data):
+    magic, dictionary, frame_chars, count, size = _HEADER.unpack_from(data)
+    if magic != _MAGIC:
+        raise ValueError("Not a compressed value")
+    return dictionary, frame_chars, count, size
+
+
+def _ends(data, count):
+    """(end of the frame, end of its text) for each of count frames."""
+    return list(_END.iter_unpack(data[: count * _END.size]))
+
+
+def _data_start(count):
+    return _HEADER.size + count * _END.size
+
+
+def _decompress(data, bounds, dictionary):
+    """The text of the frames of data between consecutive bounds."""
+    return "".join(
+        zlib.decompressobj(zdict=DICTIONARIES[dictionary])
+        .decompress(data[begin:end])
+        .decode("utf-8")
+        for begin, end in zip(bounds, bounds[1:])
+    )
+
+
+def _substr(column, start, length):
+    return func.substr(column, start, length, type_=LargeBinary)
@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 import os
+import tempfile
 
 
 class Config(object):
@@ -10,11 +11,71 @@ class Config(object):
     if DATABASE_URL.startswith("postgres://"):
         DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://")
     SQLALCHEMY_DATABASE_URI = DATABASE_URL
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        # connections dropped by the server are replaced rather than failing
+        "pool_pre_ping": os.getenv("DB_POOL_PRE_PING", "true").lower() == "true",
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", 30 * 60)),
+    }
+    if DATABASE_URL.startswith("postgresql"):
+        # each process needs a connection per request thread and job worker
+        SQLALCHEMY_ENGINE_OPTIONS.update(
+            pool_size=int(os.getenv("DB_POOL_SIZE", 10)),
+            max_overflow=int(os.getenv("DB_MAX_OVERFLOW", 5)),
+            pool_timeout=int(os.getenv("DB_POOL_TIMEOUT", 30)),
+        )
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SQLALCHEMY_RECORD_QUERIES = False
     DEBUG = False
     ALLOWED_EXTENSIONS = {"pdf"}
     MAX_CONTENT_LENGTH = 10 * 1024 * 1024  # 10MB limit
+    # larger files are sent in chunks through the uploads API
+    UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", 500 * 1024 * 1024))
+    UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+    JOB_WORKERS = int(os.getenv("JOB_WORKERS", 2))
+    JOB_RUN_SYNC = False
+    JOB_HEARTBEAT_SECONDS = 30
+    # jobs no process has beaten for this long are failed
+    JOB_STALE_SECONDS = int(os.getenv("JOB_STALE_SECONDS", 5 * 60))
+    JOB_TIMEOUT_SECONDS = int(os.getenv("JOB_TIMEOUT_SECONDS", 6 * 60 * 60))
+    COLLECT_WORKERS = int(os.getenv("COLLECT_WORKERS", 8))
+    COLLECT_SHARD_SIZE = int(os.getenv("COLLECT_SHARD_SIZE", 10))
+    COLLECT_HOST_LIMIT = int(os.getenv("COLLECT_HOST_LIMIT", 2))
+    COLLECT_INCREMENTAL = os.getenv("COLLECT_INCREMENTAL", "true").lower() == "true"
+    COLLECT_URL_FRESH_FOR = int(os.getenv("COLLECT_URL_FRESH_FOR", 24 * 60 * 60))
+    COLLECT_URL_TIMEOUT = 30
+    DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+    DOWNLOAD_GZIP = True
+    DOWNLOAD_BROTLI = True
+    COMPRESS_MIN_SIZE = 16 * 1024
+    # part of every result ETag, change it to invalidate cached result pages
+    RESULT_CACHE_VERSION = os.getenv("RESULT_CACHE_VERSION", "1")
+    RESULT_PAGE_MAX_AGE = int(os.getenv("RESULT_PAGE_MAX_AGE", 5 * 60))
+    RESULT_ARTIFACT_MAX_AGE = 365 * 24 * 60 * 60
+    RESULTS_PER_PAGE = 50
+    RESULTS_SORT_MAX_ROWS = 10000
+    INDEX_PER_PAGE = 20
+    API_PAGE_SIZE = 1000
+    API_MAX_PAGE_SIZE = 10000
+    EXTRACT_WORKERS = int(os.getenv("EXTRACT_WORKERS", min(os.cpu_count() or 1, 4)))
+    EXTRACT_CHUNK_PAGES = int(os.getenv("EXTRACT_CHUNK_PAGES", 25))
+    EXTRACT_BATCH_FILE_WORKERS = int(
+        os.getenv("EXTRACT_BATCH_FILE_WORKERS", os.cpu_count() or 1)
+    )
+    EXTRACT_BATCH_URL_WORKERS = int(os.getenv("EXTRACT_BATCH_URL_WORKERS", 8))
+    EXTRACT_CACHE_TTL = int(os.getenv("EXTRACT_CACHE_TTL", 5 * 24 * 60 * 60))
+    EXTRACT_CACHE_MAX_ENTRIES = int(os.getenv("EXTRACT_CACHE_MAX_ENTRIES", 1000))
+    EXTRACT_CACHE_HEAD_TIMEOUT = 5
+    CLUSTER_FAST_SAMPLE_SIZE = int(os.getenv("CLUSTER_FAST_SAMPLE_SIZE", 2000))
+    # extra reference files, as name=path pairs separated by commas
+    REFERENCE_DATA_FILES = os.getenv("REFERENCE_DATA_FILES", "")
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+    BLOB_STORE = os.getenv("BLOB_STORE", "database")
+    BLOB_STORE_ROOT = os.getenv("BLOB_STORE_ROOT", os.path.join(PROJECT_ROOT, "blobs"))
+    SCRATCH_ROOT = os.getenv(
+        "SCRATCH_ROOT", os.path.join(tempfile.gettempdir(), "data-analyser")
+    )
+    SCRATCH_QUOTA_BYTES = int(os.getenv("SCRATCH_QUOTA_BYTES", 2 * 1024 * 1024 * 1024))
+    SCRATCH_MEASURE_SECONDS = 5
 
 
 class DevelopmentConfig(Config):
@@ -24,3 +85,4 @@ class DevelopmentConfig(Config):
 
 class TestConfig(Config):
     TESTING = True
+    JOB_RUN_SYNC = True
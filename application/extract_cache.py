@@ -0,0 +1,128 @@
+"""Cache of table extraction results.
+
+Entries are keyed by a hash of the uploaded file (or the URL plus the
+validators its server sends back), the table index and the keywords, and
+point at the Extract that a previous run with the same inputs produced.
+"""
+
+import datetime
+import hashlib
+import threading
+import urllib.request
+
+from flask import current_app
+from sqlalchemy import delete, func, select
+
+from application.extensions import db
+from application.models import Extract, ExtractCacheEntry
+
+URL_VALIDATORS = ["ETag", "Last-Modified", "Content-Length"]
+
+_lock = threading.Lock()
+_counts = {"hits": 0, "misses": 0}
+
+
+def enabled():
+    return current_app.config["EXTRACT_CACHE_TTL"] > 0
+
+
+def make_key(index, keywords, path=None, url=None):
+    """Key for extracting from the file at path, or from url."""
+    if path is not None:
+        digest = hashlib.sha256(b"file\0")
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+    else:
+        digest = hashlib.sha256(b"url\0")
+        digest.update(url.encode("utf-8"))
+        for name, value in _url_validators(url):
+            digest.update(f"\0{name}:{value}".encode("utf-8"))
+    digest.update(f"\0index:{index}\0keywords:{keywords}".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def lookup(key):
+    """Return the id of the cached Extract for key, or None on a miss."""
+    cutoff = _cutoff()
+    entry = db.session.execute(
+        select(ExtractCacheEntry)
+        .join(Extract, Extract.id == ExtractCacheEntry.extract_id)
+        .where(ExtractCacheEntry.key == key, ExtractCacheEntry.created_at >= cutoff)
+    ).scalar_one_or_none()
+    with _lock:
+        _counts["hits" if entry else "misses"] += 1
+    if entry is None:
+        return None
+    entry.hit_count += 1
+    entry.last_hit_at = datetime.datetime.today()
+    db.session.commit()
+    return entry.extract_id
+
+
+def store(key, extract_id):
+    # an expired entry not yet evicted is replaced as if it were new, or the
+    # eviction below would delete it straight away
+    db.session.merge(
+        ExtractCacheEntry(
+            key=key,
+            extract_id=extract_id,
+            created_at=datetime.datetime.today(),
+            hit_count=0,
+            last_hit_at=None,
+        )
+    )
+    db.session.commit()
+    evict()
+
+
+def evict():
+    """Remove expired entries and the oldest entries beyond the size limit."""
+    db.session.execute(
+        delete(ExtractCacheEntry).where(ExtractCacheEntry.created_at < _cutoff())
+    )
+    keep = (
+        select(ExtractCacheEntry.key)
+        .order_by(ExtractCacheEntry.created_at.desc())
+        .limit(current_app.config["EXTRACT_CACHE_MAX_ENTRIES"])
+    )
+    db.session.execute(
+        delete(ExtractCacheEntry).where(ExtractCacheEntry.key.not_in(keep))
+    )
+    db.session.commit()
+
+
+def stats():
+    entries, hits = db.session.execute(
+        select(
+            func.count(), func.coalesce(func.sum(ExtractCacheEntry.hit_count), 0)
+        ).select_from(ExtractCacheEntry)
+    ).one()
+    with _lock:
+        counts = dict(_counts)
+    return {
+        "entries": entries,
+        "max_entries": current_app.config["EXTRACT_CACHE_MAX_ENTRIES"],
+        "ttl": current_app.config["EXTRACT_CACHE_TTL"],
+        "total_hits": hits,
+        "process_hits": counts["hits"],
+        "process_misses": counts["misses"],
+    }
+
+
+def _cutoff():
+    ttl = current_app.config["EXTRACT_CACHE_TTL"]
+    return datetime.datetime.today() - datetime.timedelta(seconds=ttl)
+
+
+def _url_validators(url):
+    request = urllib.request.Request(url, method="HEAD")
+    try:
+        with urllib.request.urlopen(
+            request, timeout=current_app.config["EXTRACT_CACHE_HEAD_TIMEOUT"]
+        ) as response:
+            headers = response.headers
+    except Exception:
+        # without validators the entry is only as fresh as the cache TTL
+        return []
+    return [(name, headers[name]) for name in URL_VALIDATORS if headers.get(name)]
@@ -19,9 +19,11 @@ def create_app(config_filename):
 
 
 def register_blueprints(app):
+    from application.api.views import api
     from application.main.views import main
 
     app.register_blueprint(main)
+    app.register_blueprint(api)
 
 
 def register_filters(app):
@@ -72,8 +74,20 @@ def register_commands(app):
 
 
 def register_extensions(app):
+    from application.blobstore import blobs
     from application.extensions import db, migrate
+    from application.jobs import jobs
+    from application.metrics import metrics
+    from application.reference_data import reference_data
+    from application.scratch import scratch
+    from application.uploads import uploads
 
     db.init_app(app)
     migrate.init_app(app, db)
+    blobs.init_app(app)
+    scratch.init_app(app)
+    uploads.init_app(app)
+    reference_data.init_app(app)
+    jobs.init_app(app)
+    metrics.init_app(app)
     # talisman.init_app(app)
@@ -0,0 +1,172 @@
+"""Fast cluster analysis for large files of invalid reasons.
+
+analyze_clusters lays every reason out with t-SNE, which gets impractical
+at tens of thousands of rows. This produces the same three output files
+with stages that grow linearly instead: reasons are vectorised with a
+hashing vectorizer, reduced with truncated SVD and grouped with mini batch
+k-means, and only a sample stratified by group is plotted, projected to
+two dimensions with PCA.
+"""
+
+import math
+import os
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+from docx import Document
+from matplotlib.figure import Figure
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.decomposition import PCA, TruncatedSVD
+from sklearn.feature_extraction.text import (
+    CountVectorizer,
+    HashingVectorizer,
+    TfidfTransformer,
+)
+from sklearn.preprocessing import normalize
+
+from application.timing import stage_timer
+
+REASON_COLUMN = "Invalid Reason Details"
+MAX_GROUPS = 12
+SVD_COMPONENTS = 50
+THEME_TERMS = 3
+
+_vectorizer = HashingVectorizer(
+    n_features=2**18,
+    alternate_sign=False,
+    norm=None,
+    ngram_range=(1, 2),
+    stop_words="english",
+)
+
+
+def analyze_clusters_fast(input_path, output_dir, sample_size=2000, timings=None):
+    """Write the visualisation, report and grouped CSV for input_path.
+
+    The seconds spent in each stage are added to timings.
+    """
+    timings = {} if timings is None else timings
+    with stage_timer(timings, "load"):
+        frame = pd.read_csv(input_path)
+        if REASON_COLUMN not in frame.columns:
+            raise ValueError(f'The file should have a column named "{REASON_COLUMN}"')
+        reasons = frame[REASON_COLUMN].dropna().astype(str).str.strip()
+        reasons = reasons[reasons != ""].tolist()
+        if not reasons:
+            raise ValueError("No invalid reasons found in the uploaded file")
+
+    with stage_timer(timings, "vectorise"):
+        counts = _vectorizer.transform(reasons).tocsr()
+
+    with stage_timer(timings, "reduce"):
+        features = _reduce(counts)
+
+    with stage_timer(timings, "cluster"):
+        labels = _cluster(features)
+        themes = _theme_names(reasons, labels)
+
+    with stage_timer(timings, "layout"):
+        sample = stratified_sample(labels, sample_size)
+        _plot(features[sample], labels[sample], themes, output_dir)
+
+    with stage_timer(timings, "report"):
+        grouped = {themes[label]: [] for label in sorted(themes)}
+        for reason, label in zip(reasons, labels):
+            grouped[themes[label]].append(reason)
+        _write_grouped_csv(grouped, output_dir)
+        _write_report(grouped, output_dir)
+
+
+def stratified_sample(labels, size, seed=0):
+    """Indexes of about size rows, taking each group in proportion."""
+    if len(labels) <= size:
+        return np.arange(len(labels))
+    rng = np.random.default_rng(seed)
+    picked = []
+    for label in np.unique(labels):
+        members = np.flatnonzero(labels == label)
+        share = max(1, math.ceil(len(members) * size / len(labels)))
+        picked.append(rng.choice(members, min(share, len(members)), replace=False))
+    return np.sort(np.concatenate(picked))
+
+
+def _reduce(counts):
+    # only a few of the hashed columns are used, and SVD is much quicker
+    # without the empty ones
+    counts = counts[:, np.unique(counts.indices)]
+    tfidf = TfidfTransformer().fit_transform(counts)
+    components = min(SVD_COMPONENTS, tfidf.shape[0] - 1, tfidf.nnz - 1)
+    if components < 2:
+        return np.zeros((tfidf.shape[0], 2))
+    return normalize(TruncatedSVD(components, random_state=0).fit_transform(tfidf))
+
+
+def _cluster(features):
+    rows = features.shape[0]
+    groups = min(MAX_GROUPS, max(1, round(math.sqrt(rows / 20))))
+    if groups == 1:
+        return np.zeros(rows, dtype=int)
+    return MiniBatchKMeans(groups, random_state=0, n_init=3).fit_predict(features)
+
+
+def _theme_names(reasons, labels):
+    """Name each group after its most frequent terms."""
+    try:
+        vectorizer = CountVectorizer(stop_words="english")
+        counts = vectorizer.fit_transform(reasons)
+        terms = vectorizer.get_feature_names_out()
+    except ValueError:
+        # every reason is made of stop words
+        counts, terms = None, []
+    themes = {}
+    for label in np.unique(labels):
+        name = f"Group {label + 1}"
+        if counts is not None:
+            totals = np.asarray(counts[labels == label].sum(axis=0)).ravel()
+            top = [terms[i] for i in totals.argsort()[::-1][:THEME_TERMS] if totals[i]]
+            if top:
+                name = ", ".join(top)
+        base, number = name, 2
+        while name in themes.values():
+            name = f"{base} ({number})"
+            number += 1
+        themes[int(label)] = name
+    return themes
+
+
+def _plot(features, labels, themes, output_dir):
+    if features.shape[0] >= 2 and features.shape[1] >= 2:
+        points = PCA(2, random_state=0).fit_transform(features)
+    else:
+        points = np.zeros((features.shape[0], 2))
+    figure = Figure(figsize=(10, 8))
+    axes = figure.subplots()
+    for label, name in themes.items():
+        selected = labels == label
+        axes.scatter(points[selected, 0], points[selected, 1], s=8, label=name)
+    axes.set_title("Invalid reason clusters (PCA of a stratified sample)")
+    axes.legend(fontsize="small", loc="best")
+    figure.savefig(os.path.join(output_dir, "TSNE_Clusters.png"), dpi=100)
+
+
+def _write_grouped_csv(grouped, output_dir):
+    frame = pd.DataFrame(
+        {theme: pd.Series(reasons) for theme, reasons in grouped.items()}
+    )
+    frame.to_csv(
+        os.path.join(output_dir, "Grouped_Invalid_Reason_Details.csv"), index=False
+    )
+
+
+def _write_report(grouped, output_dir):
+    document = Document()
+    document.add_heading("Grouped invalid reason details", level=1)
+    bullet = document.styles["List Bullet"]
+    for theme, reasons in grouped.items():
+        document.add_heading(f"{theme} ({len(reasons)} items)", level=2)
+        # each distinct reason once, most frequent first
+        for reason, count in Counter(reasons).most_common():
+            text = reason if count == 1 else f"{reason} ({count} times)"
+            document.add_paragraph(text, style=bullet)
+    document.save(os.path.join(output_dir, "Grouped_Invalid_Reason_Details.docx"))
@@ -0,0 +1,93 @@
+"""HTTP caching of result pages and downloads.
+
+Extracts, cluster analyses and plan document collections never change once
+they're saved, so their pages and files can be cached by clients. Each
+response gets a strong ETag made from the result's id and a key for its
+content, such as its creation time or the hash of a stored blob. The key is
+read with a small query before the view runs, so a client revalidating a
+page it already has gets a 304 without the result's payload being loaded.
+
+Pages are cached briefly, as they're rendered from templates that change
+between releases, while downloads are cached for a long time.
+"""
+
+import functools
+import hashlib
+
+from flask import Response, abort, current_app, make_response, request
+from sqlalchemy import select
+
+from application.extensions import db
+
+ENCODINGS = ("gzip", "br")
+
+
+def cached_result(key, artifact=False):
+    """Decorate a result view with an ETag and 304 responses.
+
+    key is called with the view arguments and returns a value identifying
+    the content, or None if there's no such result.
+    """
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(**kwargs):
+            content_key = key(**kwargs)
+            if content_key is None:
+                abort(404)
+            etag = result_etag(content_key)
+            variants = [etag] + [f"{etag}-{encoding}" for encoding in ENCODINGS]
+            matched = next(
+                (tag for tag in variants if request.if_none_match.contains(tag)),
+                None,
+            )
+            if matched:
+                response = Response(status=304)
+                response.set_etag(matched)
+            else:
+                response = make_response(view(**kwargs))
+                if response.status_code != 200:
+                    return response
+                # downloads compressed as they stream are already encoded
+                encoding = response.headers.get("Content-Encoding")
+                response.set_etag(f"{etag}-{encoding}" if encoding else etag)
+            _set_cache_control(response, artifact)
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def result_etag(content_key):
+    """Strong ETag for the current request of the content with content_key."""
+    parts = [
+        current_app.config["RESULT_CACHE_VERSION"],
+        request.endpoint,
+        *(f"{name}={value}" for name, value in sorted(request.view_args.items())),
+        request.query_string.decode("latin-1"),
+        str(content_key),
+    ]
+    return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()
+
+
+def _set_cache_control(response, artifact):
+    response.cache_control.no_cache = None
+    response.cache_control.public = True
+    if artifact:
+        response.cache_control.max_age = current_app.config["RESULT_ARTIFACT_MAX_AGE"]
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.max_age = current_app.config["RESULT_PAGE_MAX_AGE"]
+    response.vary.add("Accept-Encoding")
+
+
+def created_at(model, result_id):
+    """The creation time of a result, the usual key for cached_result."""
+    return column_value(model.created_at, result_id)
+
+
+def column_value(column, result_id):
+    """A single column of a result, as the key for cached_result."""
+    model = column.class_
+    return db.session.execute(select(column).where(model.id == result_id)).scalar()
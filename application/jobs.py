@@ -0,0 +1,251 @@
+"""Background jobs for the long running analysis tools.
+
+Jobs are recorded in the job table and run on a thread pool owned by the
+web process, so the request that submits a job can return straight away.
+A job submitted with a scratch_dir param owns that scratch directory, which
+is released once the job has finished, whether or not it succeeded.
+
+Jobs live only as long as the process running them, so every process
+records a heartbeat for the jobs it owns every JOB_HEARTBEAT_SECONDS, and
+fails pending or running jobs that no process has beaten for within
+JOB_STALE_SECONDS, such as those left behind by a restarted dyno. Jobs
+running for longer than JOB_TIMEOUT_SECONDS are failed too. The monitor
+that does this starts with the first request or job a process handles.
+"""
+
+import contextvars
+import datetime
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from flask import current_app
+from sqlalchemy import and_, func, select, update
+
+from application.extensions import db
+from application.metrics import task
+from application.models import Job
+from application.scratch import scratch
+from application.timing import stage_timer
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+RUNNING = "running"
+COMPLETE = "complete"
+FAILED = "failed"
+
+_current_job = contextvars.ContextVar("current_job", default=None)
+
+
+def current_job_id():
+    """The id of the job running on this thread, if any."""
+    return _current_job.get()
+
+
+class JobRunner:
+    def __init__(self, app=None):
+        self.app = None
+        self.handlers = {}
+        self.executor = None
+        # job id -> number of holders, for the jobs this process will run
+        self._owned = {}
+        self._lock = threading.Lock()
+        self._monitor_pid = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.executor = ThreadPoolExecutor(
+            max_workers=app.config["JOB_WORKERS"], thread_name_prefix="job"
+        )
+        app.extensions["jobs"] = self
+        app.before_request(self.start_monitor)
+
+    def handler(self, kind):
+        """Register the function that runs jobs of the given kind.
+
+        The function is called with the job params as keyword arguments and
+        should return the id of the result it saved.
+        """
+
+        def decorator(func):
+            self.handlers[kind] = func
+            return func
+
+        return decorator
+
+    def create(self, kind, batch_id=None, **params):
+        """Record a job without running it, for a batch job to run later."""
+        if kind not in self.handlers:
+            raise ValueError(f"No handler registered for {kind} jobs")
+        job = Job(kind=kind, status=PENDING, params=params, batch_id=batch_id)
+        db.session.add(job)
+        db.session.commit()
+        return job
+
+    def submit(self, kind, **params):
+        job = self.create(kind, **params)
+        if self.app.config.get("JOB_RUN_SYNC"):
+            self.run(job.id)
+        else:
+            self.start_monitor()
+            self._own([job.id])
+            self.executor.submit(self._run_in_context, job.id)
+        return job
+
+    def _run_in_context(self, job_id):
+        try:
+            with self.app.app_context():
+                self.run(job_id)
+        finally:
+            self._disown([job_id])
+
+    @contextmanager
+    def owning(self, job_ids):
+        """Keep up the heartbeat of jobs this process will run.
+
+        For example, the pending jobs of a batch it's working through.
+        """
+        job_ids = list(job_ids)
+        self._own(job_ids)
+        try:
+            yield
+        finally:
+            self._disown(job_ids)
+
+    def start(self, job_id):
+        """Mark a job running that's been handed to a worker, such as a batch's."""
+        now = datetime.datetime.today()
+        db.session.execute(
+            update(Job)
+            .where(Job.id == job_id, Job.status == PENDING)
+            .values(status=RUNNING, started_at=now, heartbeat_at=now)
+        )
+        db.session.commit()
+
+    def run(self, job_id, func=None):
+        """Run a job, calling func with its params in place of its handler if given."""
+        job = db.session.get(Job, job_id)
+        job.status = RUNNING
+        job.started_at = job.started_at or datetime.datetime.today()
+        job.heartbeat_at = job.started_at
+        db.session.commit()
+        params = dict(job.params)
+        scratch_dir = params.pop("scratch_dir", None)
+        token = _current_job.set(job_id)
+        try:
+            with self.owning([job_id]), task(job.kind), stage_timer(None, "total"):
+                result_id = (func or self.handlers[job.kind])(**params)
+            db.session.refresh(job)
+            if job.status != RUNNING:
+                # failed by the monitor for running too long
+                return
+            job.result_id = result_id
+            job.status = COMPLETE
+        except Exception as e:
+            logger.exception("Job %s (%s) failed", job_id, job.kind)
+            db.session.rollback()
+            job = db.session.get(Job, job_id)
+            job.status = FAILED
+            job.error = str(e)
+        finally:
+            _current_job.reset(token)
+            scratch.release(scratch_dir)
+        job.finished_at = datetime.datetime.today()
+        db.session.commit()
+
+    def start_monitor(self):
+        """Start the thread that beats and fails jobs, once per process."""
+        if self.app.config.get("JOB_RUN_SYNC") or self._monitor_pid == os.getpid():
+            return
+        with self._lock:
+            if self._monitor_pid == os.getpid():
+                return
+            # a forked worker doesn't inherit its parent's thread
+            self._monitor_pid = os.getpid()
+        threading.Thread(target=self._monitor, name="job-monitor", daemon=True).start()
+
+    def _monitor(self):
+        while True:
+            try:
+                with self.app.app_context():
+                    self.beat()
+                    self.fail_stale()
+            except Exception:
+                logger.exception("Couldn't check the jobs' heartbeats")
+            time.sleep(self.app.config["JOB_HEARTBEAT_SECONDS"])
+
+    def beat(self):
+        """Record a heartbeat for the unfinished jobs this process owns."""
+        with self._lock:
+            owned = list(self._owned)
+        if owned:
+            db.session.execute(
+                update(Job)
+                .where(Job.id.in_(owned), Job.status.in_((PENDING, RUNNING)))
+                .values(heartbeat_at=datetime.datetime.today())
+            )
+            db.session.commit()
+
+    def fail_stale(self):
+        """Fail the jobs that have lost their process or run for too long.
+
+        Returns the ids of the jobs failed.
+        """
+        now = datetime.datetime.today()
+        stale = now - datetime.timedelta(
+            seconds=current_app.config["JOB_STALE_SECONDS"]
+        )
+        timed_out = now - datetime.timedelta(
+            seconds=current_app.config["JOB_TIMEOUT_SECONDS"]
+        )
+        last_seen = func.coalesce(Job.heartbeat_at, Job.started_at, Job.created_at)
+        reasons = [
+            (
+                and_(Job.status.in_((PENDING, RUNNING)), last_seen < stale),
+                "The job stopped when the process running it did, please try again",
+            ),
+            (
+                and_(Job.status == RUNNING, Job.started_at < timed_out),
+                "The job took too long and was stopped",
+            ),
+        ]
+        failed = []
+        for where, error in reasons:
+            rows = db.session.execute(select(Job.id, Job.params).where(where)).all()
+            for job_id, params in rows:
+                result = db.session.execute(
+                    update(Job)
+                    .where(Job.id == job_id, where)
+                    .values(status=FAILED, error=error, finished_at=now)
+                )
+                if not result.rowcount:
+                    continue
+                failed.append(job_id)
+                logger.warning("Job %s failed: %s", job_id, error)
+                with self._lock:
+                    owned = job_id in self._owned
+                if not owned:
+                    scratch.release(params.get("scratch_dir"))
+            db.session.commit()
+        return failed
+
+    def _own(self, job_ids):
+        with self._lock:
+            for job_id in job_ids:
+                self._owned[job_id] = self._owned.get(job_id, 0) + 1
+
+    def _disown(self, job_ids):
+        with self._lock:
+            for job_id in job_ids:
+                self._owned[job_id] -= 1
+                if not self._owned[job_id]:
+                    del self._owned[job_id]
+
+
+jobs = JobRunner()
@@ -1,16 +1,30 @@
 from flask_wtf import FlaskForm
 from wtforms import (
     FileField,
+    HiddenField,
     IntegerField,
     RadioField,
     StringField,
+    TextAreaField,
     URLField,
     ValidationError,
 )
 from wtforms.validators import DataRequired, Optional
 
 
-class ExtractTablesForm(FlaskForm):
+class UploadForm(FlaskForm):
+    """A form whose file can instead be sent beforehand as a chunked upload.
+
+    upload then holds the id of the upload.
+    """
+
+    upload = HiddenField()
+
+    def has_file(self, field):
+        return bool(field.data or self.upload.data)
+
+
+class ExtractTablesForm(UploadForm):
     url = URLField("URL", validators=[Optional()])
     file = FileField("File Name", validators=[Optional()])
     file_or_url = RadioField(
@@ -25,7 +39,7 @@ class ExtractTablesForm(FlaskForm):
         if not super().validate(extra_validators=extra_validators):
             return False
 
-        if bool(self.url.data) == bool(self.file.data):
+        if bool(self.url.data) == self.has_file(self.file):
             # If both are empty or both are filled, raise error
             raise ValidationError(
                 "Please provide either a URL or a file name, but not both"
@@ -34,9 +48,53 @@ class ExtractTablesForm(FlaskForm):
         return True
 
 
-class ClusterAnalysisForm(FlaskForm):
-    file = FileField("CSV File", validators=[DataRequired()])
+class ExtractBatchForm(UploadForm):
+    urls = TextAreaField("URLs", validators=[Optional()])
+    file = FileField("Zip file", validators=[Optional()])
+    file_or_url = RadioField(
+        "Files or URLs",
+        choices=[("file", "Zip of PDF files"), ("url", "URLs")],
+        validators=[DataRequired()],
+    )
+    index = IntegerField("Index", validators=[Optional()])
+    keywords = StringField("Keywords", validators=[Optional()])
+
+    def validate(self, extra_validators=None):
+        if not super().validate(extra_validators=extra_validators):
+            return False
+
+        if bool(self.urls.data) == self.has_file(self.file):
+            raise ValidationError(
+                "Please provide either a list of URLs or a zip file, but not both"
+            )
+
+        return True
+
+
+class ClusterAnalysisForm(UploadForm):
+    file = FileField("CSV File", validators=[Optional()])
+    mode = RadioField(
+        "Mode",
+        choices=[("standard", "Standard"), ("fast", "Fast")],
+        default="standard",
+    )
+
+    def validate(self, extra_validators=None):
+        if not super().validate(extra_validators=extra_validators):
+            return False
+        if not self.has_file(self.file):
+            self.file.errors.append("Please choose a CSV file")
+            return False
+        return True
 
 
-class PlanDataCollectionForm(FlaskForm):
-    input_file = FileField("Input CSV", validators=[DataRequired()])
+class PlanDataCollectionForm(UploadForm):
+    input_file = FileField("Input CSV", validators=[Optional()])
+
+    def validate(self, extra_validators=None):
+        if not super().validate(extra_validators=extra_validators):
+            return False
+        if not self.has_file(self.input_file):
+            self.input_file.errors.append("Please choose a CSV file")
+            return False
+        return True
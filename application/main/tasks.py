@@ -0,0 +1,336 @@
+import csv
+import itertools
+import multiprocessing
+import os
+import uuid
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+from io import StringIO
+
+from flask import current_app
+from sqlalchemy import select
+
+from application import extract_cache, url_cache
+from application.blobstore import blobs
+from application.collect import (
+    URL_COLUMNS,
+    collect_plan_data_incremental,
+    collect_plan_data_sharded,
+)
+from application.columnar import encode_frame, store_table
+from application.extensions import db
+from application.jobs import jobs
+from application.models import (
+    ClusterAnalysis,
+    Extract,
+    ExtractItem,
+    Job,
+    PlanDataCollection,
+)
+from application.progress import Progress
+from application.reference_data import DOCUMENT_TYPES, reference_data
+from application.tables import index_csv
+from application.timing import stage_timer
+
+
+@jobs.handler("extract")
+def run_extract(
+    source, file_or_url, path=None, index=None, keywords=None, cache_key=None
+):
+    with stage_timer(None, "extract"):
+        extracted_tables = extract_tables(
+            source,
+            file_or_url,
+            path=path,
+            index=index,
+            keywords=keywords,
+            workers=current_app.config["EXTRACT_WORKERS"],
+            chunk_pages=current_app.config["EXTRACT_CHUNK_PAGES"],
+        )
+    return _save_extract(source, extracted_tables, cache_key)
+
+
+@jobs.handler("extract-batch")
+def run_extract_batch(extract_batch_id, file_or_url):
+    """Run the extract jobs of a batch concurrently.
+
+    Files are extracted in worker processes, one per core by default, and
+    URLs on threads, as fetching them is bound by the network rather than
+    the CPU. No more sources are submitted than there are workers, so each
+    source's job is marked running as it's submitted, and completed as its
+    tables come back.
+    """
+    batch_id = uuid.UUID(extract_batch_id)
+    sources = db.session.execute(
+        select(Job.id, Job.params)
+        .where(Job.batch_id == batch_id)
+        .order_by(Job.created_at)
+    ).all()
+    if file_or_url == "file":
+        workers = current_app.config["EXTRACT_BATCH_FILE_WORKERS"]
+        executor = ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+        )
+    else:
+        workers = current_app.config["EXTRACT_BATCH_URL_WORKERS"]
+        executor = ThreadPoolExecutor(max_workers=workers)
+
+    waiting = iter(sources)
+    futures = {}
+
+    def submit(count):
+        for job_id, params in itertools.islice(waiting, count):
+            jobs.start(job_id)
+            futures[executor.submit(extract_tables, **params)] = job_id
+
+    with executor, jobs.owning(job_id for job_id, _ in sources):
+        submit(workers)
+        while futures:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                jobs.run(
+                    futures.pop(future),
+                    lambda source, **params: _save_extract(source, future.result()),
+                )
+            submit(len(done))
+    return batch_id
+
+
+def extract_tables(
+    source,
+    file_or_url,
+    path=None,
+    index=None,
+    keywords=None,
+    workers=1,
+    chunk_pages=25,
+):
+    """Extract the tables from a file or URL as a list of DataFrames.
+
+    This doesn't need an app context, so batches can run it in worker
+    processes.
+    """
+    if file_or_url == "url":
+        from planning_data_analysis.extract import extract_table
+
+        extracted_tables = extract_table(
+            source, from_web=True, table_index=index, key_words=keywords
+        )
+    else:
+        from application.pdf_extract import extract_pdf_tables
+
+        extracted_tables = extract_pdf_tables(
+            path,
+            table_index=index,
+            key_words=keywords,
+            workers=workers,
+            chunk_pages=chunk_pages,
+        )
+    if not extracted_tables:
+        messages = {
+            "file": "No tables found in the uploaded file",
+            "url": "No tables found in the webpage provided",
+        }
+        raise ValueError(messages[file_or_url])
+    return extracted_tables
+
+
+def _save_extract(source, extracted_tables, cache_key=None):
+    extract = Extract(source=source)
+    with stage_timer(None, "encode"):
+        for index, table in enumerate(extracted_tables):
+            metadata, chunks = encode_frame(table)
+            extract.items.append(
+                ExtractItem(
+                    index=index + 1,
+                    content_hash=store_table(metadata, chunks),
+                    **metadata,
+                )
+            )
+    db.session.add(extract)
+    with stage_timer(None, "commit"):
+        db.session.commit()
+    if cache_key:
+        extract_cache.store(cache_key, extract.id)
+    return extract.id
+
+
+@jobs.handler("cluster")
+def run_cluster_analysis(input_path, filename, output_dir, mode="standard"):
+    timings = {}
+    if mode == "fast":
+        from application.fast_clusters import analyze_clusters_fast
+
+        analyze_clusters_fast(
+            input_path,
+            output_dir,
+            sample_size=current_app.config["CLUSTER_FAST_SAMPLE_SIZE"],
+            timings=timings,
+        )
+    else:
+        from planning_data_analysis.cluster_analysis import analyze_clusters
+
+        with stage_timer(timings, "analysis"):
+            analyze_clusters(input_path, output_dir)
+
+    # Read the generated files
+    visualization_path = os.path.join(output_dir, "TSNE_Clusters.png")
+    report_path = os.path.join(output_dir, "Grouped_Invalid_Reason_Details.docx")
+    csv_path = os.path.join(output_dir, "Grouped_Invalid_Reason_Details.csv")
+
+    with stage_timer(timings, "store"):
+        with open(visualization_path, "rb") as f:
+            visualization_ref, visualization_hash, visualization_size = blobs.put(
+                f.read()
+            )
+
+        with open(report_path, "rb") as f:
+            report_ref, report_hash, report_size = blobs.put(f.read())
+
+        # Read the CSV to get grouped reasons
+        import pandas as pd
+
+        grouped_df = pd.read_csv(csv_path)
+        grouped_reasons = {
+            col: grouped_df[col].dropna().tolist() for col in grouped_df.columns
+        }
+
+    # Save results to database
+    analysis = ClusterAnalysis(
+        source_file=filename,
+        grouped_reasons=grouped_reasons,
+        group_count=len(grouped_reasons),
+        visualization_ref=visualization_ref,
+        visualization_hash=visualization_hash,
+        visualization_size=visualization_size,
+        visualization_mime_type="image/png",
+        report_ref=report_ref,
+        report_hash=report_hash,
+        report_size=report_size,
+        report_mime_type="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+        mode=mode,
+        stage_timings=timings,
+    )
+    db.session.add(analysis)
+    with stage_timer(None, "commit"):
+        db.session.commit()
+    return analysis.id
+
+
+@jobs.handler("collect")
+def run_collect_plan_data(
+    input_path, input_filename, output_dir, reference=DOCUMENT_TYPES, ref_path=None
+):
+    output_path = os.path.join(output_dir, "plan_documents.csv")
+    failed_urls_path = os.path.join(output_dir, "failed_urls.csv")
+    # ref_path is only given by jobs submitted before the registry
+    if ref_path:
+        reference_set = reference_data.for_path(ref_path)
+    else:
+        reference_set = reference_data.get(reference)
+    ref_path = reference_set.path
+    reference_file = os.path.basename(ref_path)
+    with open(input_path, newline="") as f:
+        progress = Progress(total_rows=sum(1 for _ in csv.DictReader(f)))
+    options = {
+        "workers": current_app.config["COLLECT_WORKERS"],
+        "shard_size": current_app.config["COLLECT_SHARD_SIZE"],
+        "host_limit": current_app.config["COLLECT_HOST_LIMIT"],
+        "on_progress": progress.advance,
+    }
+
+    url_summary = None
+    if current_app.config["COLLECT_INCREMENTAL"]:
+        with stage_timer(None, "revalidate"):
+            reuse, url_summary = _reusable_output(
+                input_path, input_filename, reference_set.sha256, **options
+            )
+        with stage_timer(None, "collect"):
+            url_summary["reused_rows"] = collect_plan_data_incremental(
+                input_path, ref_path, output_path, failed_urls_path, reuse, **options
+            )
+    else:
+        with stage_timer(None, "collect"):
+            collect_plan_data_sharded(
+                input_path, ref_path, output_path, failed_urls_path, **options
+            )
+
+    # Read the output files
+    with stage_timer(None, "read"):
+        with open(output_path, "r") as f:
+            output_data = f.read()
+
+        failed_urls_data = None
+        if os.path.exists(failed_urls_path):
+            with open(failed_urls_path, "r") as f:
+                # an empty file means no URLs failed
+                failed_urls_data = f.read() or None
+
+    # Save results to database
+    collection = PlanDataCollection(
+        source_file=input_filename,
+        reference_file=reference_file,
+        reference_hash=reference_set.sha256,
+        data=output_data,
+        failed_urls=failed_urls_data,
+        url_summary=url_summary,
+        **index_csv(output_data),
+    )
+    db.session.add(collection)
+    progress.discard_output()
+    with stage_timer(None, "commit"):
+        db.session.commit()
+    return collection.id
+
+
+def _reusable_output(input_path, input_filename, reference_hash, **options):
+    """Find the rows of the last collection of this input that can be reused.
+
+    Only a collection classified with the same reference data is used. A
+    row's output can be reused when none of its documents have changed
+    since that collection and it didn't fail then. Returns the reuse argument for
+    collect_plan_data_incremental and a summary of the URL checks.
+    """
+    with open(input_path, newline="") as f:
+        rows = list(csv.DictReader(f))
+    outcomes = url_cache.revalidate(
+        [row[column] for row in rows for column in URL_COLUMNS if row.get(column)],
+        workers=options["workers"],
+        host_limit=options["host_limit"],
+    )
+    summary = url_cache.summarise(outcomes)
+
+    previous = db.session.execute(
+        select(PlanDataCollection)
+        .where(
+            PlanDataCollection.source_file == input_filename,
+            PlanDataCollection.reference_hash == reference_hash,
+        )
+        .order_by(PlanDataCollection.created_at.desc())
+        .limit(1)
+    ).scalar_one_or_none()
+    if previous is None or "reference" not in (previous.headers or []):
+        return ([], {}), summary
+
+    changed = url_cache.changed_since(outcomes, previous.created_at)
+    unchanged = {
+        row.get("reference")
+        for row in rows
+        if not any(row.get(column) in changed for column in URL_COLUMNS)
+    }
+    failed = set()
+    if previous.failed_urls:
+        failed = {
+            row.get("reference")
+            for row in csv.DictReader(StringIO(previous.failed_urls))
+        }
+    reuse = {}
+    for row in csv.DictReader(StringIO(previous.data)):
+        reference = row.get("reference")
+        if reference in unchanged and reference not in failed:
+            reuse.setdefault(reference, []).append(row)
+    return (previous.headers, reuse), summary
@@ -1,37 +1,91 @@
 import csv
+import datetime
 import os
-import tempfile
-from io import BytesIO, StringIO
-from pathlib import Path
+import shutil
+import zipfile
+from io import StringIO
+from itertools import islice
 
-import matplotlib
 from flask import (
     Blueprint,
+    Response,
+    abort,
     current_app,
     flash,
+    jsonify,
     redirect,
     render_template,
+    request,
     send_file,
     url_for,
 )
-from planning_data_analysis.cluster_analysis import analyze_clusters
-from planning_data_analysis.collect_plan_data import collect_plan_data
-from planning_data_analysis.extract import extract_table
+from prometheus_client import CONTENT_TYPE_LATEST
+from sqlalchemy import func, select
+from werkzeug.datastructures import MultiDict
 from werkzeug.utils import secure_filename
 
+from application import extract_cache
+from application.blobstore import blobs
+from application.columnar import ColumnarTable, storage_stats
 from application.extensions import db
+from application.http_cache import cached_result, column_value, created_at
+from application.jobs import COMPLETE, FAILED, jobs
+from application.main import tasks  # noqa: F401 registers the job handlers
 from application.main.forms import (
     ClusterAnalysisForm,
+    ExtractBatchForm,
     ExtractTablesForm,
     PlanDataCollectionForm,
 )
-from application.models import ClusterAnalysis, Extract, ExtractItem, PlanDataCollection
+from application.metrics import metrics
+from application.models import (
+    ClusterAnalysis,
+    Extract,
+    ExtractBatch,
+    ExtractItem,
+    Job,
+    PlanDataCollection,
+    Upload,
+)
+from application.pagination import keyset_page, source_filter
+from application.progress import output_chunks
+from application.reference_data import DOCUMENT_TYPES
+from application.scratch import ScratchSpaceFull, scratch
+from application.streaming import (
+    compress_response,
+    iter_zip,
+    send_payload,
+    send_stream,
+)
+from application.tables import CsvTable, paginate, sortable
+from application.timing import stage_timer
+from application.uploads import UploadError, uploads
 from application.utils import allowed_file
 
-matplotlib.use("Agg")  # Use non-interactive backend
+# Use non-interactive backend, set without importing matplotlib up front
+os.environ.setdefault("MPLBACKEND", "Agg")
 
 
 main = Blueprint("main", __name__, template_folder="templates")
+main.after_request(compress_response)
+
+PROGRESS_PREVIEW_ROWS = 20
+
+# job kind -> (form endpoint, result endpoint, result id argument)
+JOB_VIEWS = {
+    "extract": ("main.extract_tables", "main.extract_results", "extract_id"),
+    "extract-batch": ("main.extract_batch", "main.extract_batch_results", "batch_id"),
+    "cluster": (
+        "main.analyze_clusters_view",
+        "main.cluster_results",
+        "analysis_id",
+    ),
+    "collect": (
+        "main.collect_plan_documents",
+        "main.plan_documents_results",
+        "collection_id",
+    ),
+}
 
 
 @main.route("/")
@@ -45,82 +99,223 @@ def extract_tables():
     if form.validate_on_submit():
         index = form.index.data if form.index.data else None
         keywords = form.keywords.data if form.keywords.data else None
+        scratch_dir = None
         try:
             if form.file_or_url.data == "url":
-                extracted_tables = extract_table(
-                    form.url.data, from_web=True, table_index=index, key_words=keywords
-                )
+                source = form.url.data
+                params = {"file_or_url": "url"}
+                key_source = {"url": source}
             elif form.file_or_url.data == "file":
-                if allowed_file(
-                    form.file.data.filename, current_app.config["ALLOWED_EXTENSIONS"]
+                if not allowed_file(
+                    uploads.filename(form.file.data, form.upload.data),
+                    current_app.config["ALLOWED_EXTENSIONS"],
                 ):
-                    filename = secure_filename(form.file.data.filename)
-                    temp_dir = tempfile.mkdtemp()
-                    file_path = os.path.join(temp_dir, filename)
-                    form.file.data.save(file_path)
-                    extracted_tables = extract_table(
-                        file_path, from_file=True, table_index=index, key_words=keywords
-                    )
-            if extracted_tables:
-                extract = Extract(
-                    source=(
-                        form.url.data
-                        if form.file_or_url.data == "url"
-                        else form.file.data.filename
-                    )
+                    flash("Only PDF files can be uploaded", "error")
+                    return redirect(url_for("main.extract_tables"))
+                source, scratch_dir, file_path = uploads.receive(
+                    form.file.data, form.upload.data
                 )
-                for index, table in enumerate(extracted_tables):
-                    data = table.to_csv(index=False, quoting=csv.QUOTE_MINIMAL)
-                    extract.items.append(ExtractItem(data=data, index=index + 1))
-                db.session.add(extract)
-                db.session.commit()
-                return redirect(url_for("main.extract_results", extract_id=extract.id))
-            else:
-                messages = {
-                    "file": "No tables found in the uploaded file",
-                    "url": "No tables found in the webpage provided",
+                params = {
+                    "file_or_url": "file",
+                    "path": file_path,
+                    "scratch_dir": scratch_dir,
                 }
-                flash(messages[form.file_or_url.data], "error")
-                return redirect(url_for("main.extract_tables"))
+                key_source = {"path": file_path}
+
+            cache_key = None
+            if extract_cache.enabled():
+                cache_key = extract_cache.make_key(index, keywords, **key_source)
+                extract_id = extract_cache.lookup(cache_key)
+                if extract_id:
+                    scratch.release(scratch_dir)
+                    return redirect(
+                        url_for("main.extract_results", extract_id=extract_id)
+                    )
+
+            job = jobs.submit(
+                "extract",
+                source=source,
+                index=index,
+                keywords=keywords,
+                cache_key=cache_key,
+                **params,
+            )
+            return redirect(url_for("main.job_status", job_id=job.id))
 
         except Exception as e:
+            scratch.release(scratch_dir)
             flash(f"Error: {e}", "error")
             return redirect(url_for("main.extract_tables"))
 
     return render_template("extract-tables.html", form=form)
 
 
+@main.route("/extract-batch", methods=["GET", "POST"])
+def extract_batch():
+    form = ExtractBatchForm()
+    if form.validate_on_submit():
+        index = form.index.data if form.index.data else None
+        keywords = form.keywords.data if form.keywords.data else None
+        scratch_dir = None
+        try:
+            if form.file_or_url.data == "file":
+                name, scratch_dir, zip_path = uploads.receive(
+                    form.file.data, form.upload.data
+                )
+                sources = [
+                    {"source": source, "file_or_url": "file", "path": path}
+                    for source, path in _unpack_pdfs(zip_path, scratch_dir)
+                ]
+                if not sources:
+                    raise ValueError("No PDF files found in the zip file")
+            else:
+                urls = [url.strip() for url in form.urls.data.splitlines()]
+                sources = [{"source": url, "file_or_url": "url"} for url in urls if url]
+                if not sources:
+                    raise ValueError("No URLs given")
+                name = f"{len(sources)} URLs"
+
+            batch = ExtractBatch(
+                name=name,
+                file_or_url=form.file_or_url.data,
+                source_count=len(sources),
+            )
+            db.session.add(batch)
+            db.session.commit()
+            for source in sources:
+                jobs.create(
+                    "extract",
+                    batch_id=batch.id,
+                    index=index,
+                    keywords=keywords,
+                    **source,
+                )
+            jobs.submit(
+                "extract-batch",
+                extract_batch_id=str(batch.id),
+                file_or_url=batch.file_or_url,
+                scratch_dir=scratch_dir,
+            )
+            return redirect(url_for("main.extract_batch_results", batch_id=batch.id))
+
+        except Exception as e:
+            scratch.release(scratch_dir)
+            flash(f"Error: {e}", "error")
+            return redirect(url_for("main.extract_batch"))
+
+    return render_template("extract-batch.html", form=form)
+
+
+@main.route("/extract-batch/<uuid:batch_id>")
+def extract_batch_results(batch_id):
+    batch = ExtractBatch.query.get_or_404(batch_id)
+    sources = _batch_jobs(batch_id)
+    finished = all(job.status in (COMPLETE, FAILED) for job in sources)
+    return render_template(
+        "extract-batch-results.html", batch=batch, sources=sources, finished=finished
+    )
+
+
+@main.route("/extract-batch/<uuid:batch_id>/download")
+def download_extract_batch(batch_id):
+    db.get_or_404(ExtractBatch, batch_id)
+    extract_ids = [job.result_id for job in _batch_jobs(batch_id) if job.result_id]
+
+    def members():
+        for number, extract_id in enumerate(extract_ids, start=1):
+            extract = db.session.get(Extract, extract_id)
+            folder = f"{number:03d}-{secure_filename(extract.source) or 'source'}"
+            for item in extract.items:
+                csv_chunks = ColumnarTable(item).iter_csv()
+                yield f"{folder}/table_{item.index}.csv", csv_chunks
+
+    return send_stream(
+        iter_zip(members()),
+        download_name=f"extract-batch-{batch_id}.zip",
+        mimetype="application/zip",
+        compress=False,
+    )
+
+
 @main.route("/extract-result/<uuid:extract_id>")
+@cached_result(lambda extract_id: created_at(Extract, extract_id))
 def extract_results(extract_id):
     extract = Extract.query.get_or_404(extract_id)
+    selected = request.args.get("table", type=int)
     tables = []
     for item in extract.items:
-        reader = csv.DictReader(StringIO(item.data))
-        headers = reader.fieldnames
-        rows = [row for row in reader]
-        tables.append(
-            {"index": item.index, "id": item.id, "headers": headers, "rows": rows}
+        table = _table_page(
+            ColumnarTable(item),
+            request.args if item.index == selected else MultiDict(),
+            table=item.index,
+            _anchor=str(item.index),
         )
+        table.update({"index": item.index, "id": item.id})
+        tables.append(table)
     return render_template("extract-results.html", extract=extract, tables=tables)
 
 
 @main.route("/extract-result/<uuid:extract_id>/table/<uuid:table_id>")
+@cached_result(
+    lambda extract_id, table_id: created_at(Extract, extract_id), artifact=True
+)
 def download_table(extract_id, table_id):
-    item = ExtractItem.query.filter(
-        ExtractItem.extract_id == extract_id, ExtractItem.id == table_id
-    ).first_or_404()
-    if item:
-        binary_data = BytesIO(item.data.encode("utf-8"))
-        return send_file(
-            binary_data, download_name=f"table_{item.index}.csv", as_attachment=True
+    item = db.first_or_404(
+        select(ExtractItem).where(
+            ExtractItem.extract_id == extract_id, ExtractItem.id == table_id
+        )
+    )
+    return send_stream(
+        ColumnarTable(item).iter_csv(), download_name=f"table_{item.index}.csv"
+    )
+
+
+@main.route("/extract-result/<uuid:extract_id>/table/<uuid:table_id>/columns")
+@cached_result(
+    lambda extract_id, table_id: created_at(Extract, extract_id), artifact=True
+)
+def table_columns(extract_id, table_id):
+    columns = db.first_or_404(
+        select(ExtractItem.columns).where(
+            ExtractItem.extract_id == extract_id, ExtractItem.id == table_id
         )
-    return "Table not found", 404
+    )
+    return jsonify(columns)
 
 
 @main.route("/extract-index")
 def extract_index():
-    extracts = Extract.query.order_by(Extract.created_at.desc()).all()
-    return render_template("extract-index.html", extracts=extracts)
+    table_count = (
+        select(func.count())
+        .where(ExtractItem.extract_id == Extract.id)
+        .scalar_subquery()
+        .label("table_count")
+    )
+    statement = select(Extract.id, Extract.source, Extract.created_at, table_count)
+    page = _index_page(statement, Extract, Extract.source)
+    return render_template("extract-index.html", extracts=page["rows"], page=page)
+
+
+@main.route("/extract-cache")
+def extract_cache_stats():
+    return jsonify(extract_cache.stats())
+
+
+@main.route("/table-storage")
+def table_storage_stats():
+    return jsonify(storage_stats())
+
+
+@main.route("/metrics")
+def metrics_export():
+    if not metrics.enabled:
+        abort(404)
+    return Response(metrics.export(), content_type=CONTENT_TYPE_LATEST)
+
+
+@main.route("/scratch")
+def scratch_usage():
+    return jsonify(scratch.usage())
 
 
 @main.route("/cookies")
@@ -132,61 +327,32 @@ def cookies():
 def analyze_clusters_view():
     form = ClusterAnalysisForm()
     if form.validate_on_submit():
+        scratch_dir = None
         try:
-            # Create temp directory for processing
-            temp_dir = tempfile.mkdtemp()
-
-            # Save uploaded file
-            input_file = form.file.data
-            filename = secure_filename(input_file.filename)
-            input_path = os.path.join(temp_dir, filename)
-            input_file.save(input_path)
+            # Save uploaded file in a scratch directory for processing
+            filename, scratch_dir, input_path = uploads.receive(
+                form.file.data, form.upload.data
+            )
+            filename = secure_filename(filename)
 
             # Create output directory
-            output_dir = os.path.join(temp_dir, "output")
+            output_dir = os.path.join(scratch_dir, "output")
             os.makedirs(output_dir, exist_ok=True)
 
-            # Run analysis
-            analyze_clusters(input_path, output_dir)
-
-            # Read the generated files
-            visualization_path = os.path.join(output_dir, "TSNE_Clusters.png")
-            report_path = os.path.join(
-                output_dir, "Grouped_Invalid_Reason_Details.docx"
+            job = jobs.submit(
+                "cluster",
+                input_path=input_path,
+                filename=filename,
+                output_dir=output_dir,
+                mode=form.mode.data,
+                scratch_dir=scratch_dir,
             )
-            csv_path = os.path.join(output_dir, "Grouped_Invalid_Reason_Details.csv")
-
-            with open(visualization_path, "rb") as f:
-                visualization_data = f.read()
-
-            with open(report_path, "rb") as f:
-                report_data = f.read()
-
-            # Read the CSV to get grouped reasons
-            import pandas as pd
-
-            grouped_df = pd.read_csv(csv_path)
-            grouped_reasons = {
-                col: grouped_df[col].dropna().tolist() for col in grouped_df.columns
-            }
-
-            # Save results to database
-            analysis = ClusterAnalysis(
-                source_file=filename,
-                grouped_reasons=grouped_reasons,
-                visualization_data=visualization_data,
-                visualization_mime_type="image/png",
-                report_data=report_data,
-                report_mime_type="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-            )
-            db.session.add(analysis)
-            db.session.commit()
-
-            return redirect(url_for("main.cluster_results", analysis_id=analysis.id))
+            return redirect(url_for("main.job_status", job_id=job.id))
 
         except Exception as e:
+            scratch.release(scratch_dir)
             flash(f"Error: {e}", "error")
-            return redirect(url_for("main.analyze_clusters"))
+            return redirect(url_for("main.analyze_clusters_view"))
 
     return render_template("analyze-clusters.html", form=form)
 
@@ -195,69 +361,182 @@ def analyze_clusters_view():
 def collect_plan_documents():
     form = PlanDataCollectionForm()
     if form.validate_on_submit():
+        scratch_dir = None
         try:
-            # Create temp directory for processing
-            temp_dir = tempfile.mkdtemp()
-
-            # Save uploaded file
-            input_file = form.input_file.data
-            input_filename = secure_filename(input_file.filename)
-            input_path = os.path.join(temp_dir, input_filename)
-            input_file.save(input_path)
-
-            # Use local reference file
-            app_path = Path(current_app.root_path)
-            data_dir = app_path.parent / "data"
-            ref_path = data_dir / "local-plan-document-type.csv"
+            # Save uploaded file in a scratch directory for processing
+            input_filename, scratch_dir, input_path = uploads.receive(
+                form.input_file.data, form.upload.data
+            )
+            input_filename = secure_filename(input_filename)
 
             # Create output directory
-            output_dir = os.path.join(temp_dir, "output")
+            output_dir = os.path.join(scratch_dir, "output")
             os.makedirs(output_dir, exist_ok=True)
 
-            # Process plan data
-            output_path = os.path.join(output_dir, "plan_documents.csv")
-            failed_urls_path = os.path.join(output_dir, "failed_urls.csv")
-
-            collect_plan_data(input_path, ref_path, output_path, failed_urls_path)
-
-            # Read the output files
-            with open(output_path, "r") as f:
-                output_data = f.read()
-
-            failed_urls_data = None
-            if os.path.exists(failed_urls_path):
-                with open(failed_urls_path, "r") as f:
-                    failed_urls_data = f.read()
-
-            # Save results to database
-            collection = PlanDataCollection(
-                source_file=input_filename,
-                reference_file="local-plan-document-type.csv",
-                data=output_data,
-                failed_urls=failed_urls_data,
-            )
-            db.session.add(collection)
-            db.session.commit()
-
-            return redirect(
-                url_for("main.plan_documents_results", collection_id=collection.id)
+            job = jobs.submit(
+                "collect",
+                input_path=input_path,
+                input_filename=input_filename,
+                reference=DOCUMENT_TYPES,
+                output_dir=output_dir,
+                scratch_dir=scratch_dir,
             )
+            return redirect(url_for("main.job_status", job_id=job.id))
 
         except Exception as e:
+            scratch.release(scratch_dir)
             flash(f"Error: {e}", "error")
             return redirect(url_for("main.collect_plan_documents"))
 
     return render_template("collect-plan-documents.html", form=form)
 
 
+@main.route("/uploads", methods=["POST"])
+def create_upload():
+    """Start a chunked upload of the file described by the JSON body.
+
+    The body has the file's filename and size in bytes, and optionally
+    its sha256 to check it against once it has all arrived.
+    """
+    details = request.get_json(silent=True) or {}
+    try:
+        upload = uploads.create(
+            details.get("filename"), details.get("size"), details.get("sha256")
+        )
+    except UploadError as e:
+        return jsonify({"error": str(e)}), e.status
+    except ScratchSpaceFull as e:
+        return jsonify({"error": str(e)}), 507
+    return jsonify(_upload_state(upload)), 201
+
+
+@main.route("/uploads/<uuid:upload_id>")
+def upload_status(upload_id):
+    return jsonify(_upload_state(db.get_or_404(Upload, upload_id)))
+
+
+@main.route("/uploads/<uuid:upload_id>", methods=["PATCH"])
+def append_upload(upload_id):
+    """Add the request body to an upload at the offset in Upload-Offset."""
+    upload = db.get_or_404(Upload, upload_id)
+    offset = request.headers.get("Upload-Offset", type=int)
+    if offset is None:
+        return jsonify({"error": "The Upload-Offset header is needed"}), 400
+    try:
+        with stage_timer(None, "upload"):
+            uploads.append(upload, offset, request.stream)
+    except UploadError as e:
+        # an upload that arrived different from its sha256 is deleted
+        state = _upload_state(upload) if uploads.get(upload_id) else {}
+        return jsonify(dict(state, error=str(e))), e.status
+    return jsonify(_upload_state(upload))
+
+
+@main.route("/uploads/<uuid:upload_id>", methods=["DELETE"])
+def cancel_upload(upload_id):
+    uploads.cancel(db.get_or_404(Upload, upload_id))
+    return "", 204
+
+
+@main.route("/jobs/<uuid:job_id>")
+def job_status(job_id):
+    job = Job.query.get_or_404(job_id)
+    form_endpoint, result_endpoint, result_arg = JOB_VIEWS[job.kind]
+    if job.status == COMPLETE:
+        return redirect(url_for(result_endpoint, **{result_arg: job.result_id}))
+    if job.status == FAILED:
+        flash(f"Error: {job.error}", "error")
+        return redirect(url_for(form_endpoint))
+    preview = None
+    if job.progress and job.progress["header"]:
+        preview = {
+            "header": job.progress["header"],
+            "rows": list(
+                islice(
+                    (row for rows in output_chunks(job.id) for row in rows),
+                    PROGRESS_PREVIEW_ROWS,
+                )
+            ),
+        }
+    return render_template(
+        "job-status.html", job=job, elapsed=_elapsed(job), preview=preview
+    )
+
+
+@main.route("/jobs/<uuid:job_id>/status")
+def job_status_json(job_id):
+    job = Job.query.get_or_404(job_id)
+    data = {
+        "id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "error": job.error,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+        "elapsed": _elapsed(job),
+        "progress": job.progress,
+    }
+    if job.status == COMPLETE:
+        _, result_endpoint, result_arg = JOB_VIEWS[job.kind]
+        data["result_url"] = url_for(result_endpoint, **{result_arg: job.result_id})
+    return jsonify(data)
+
+
+@main.route("/jobs/<uuid:job_id>/output")
+def job_output(job_id):
+    """Output rows a job has produced so far, from chunk number start.
+
+    Poll with start set to the next_start of the previous response to get
+    just the rows produced since.
+    """
+    job = db.get_or_404(Job, job_id)
+    start = request.args.get("start", 0, type=int)
+    chunks = list(output_chunks(job_id, start))
+    return jsonify(
+        {
+            "status": job.status,
+            "header": (job.progress or {}).get("header"),
+            "rows": [row for rows in chunks for row in rows],
+            "next_start": start + len(chunks),
+        }
+    )
+
+
+@main.route("/jobs/<uuid:job_id>/output.csv")
+def download_job_output(job_id):
+    job = db.get_or_404(Job, job_id)
+    header = (job.progress or {}).get("header")
+
+    def lines():
+        buffer = StringIO()
+        writer = csv.writer(buffer)
+        if header:
+            writer.writerow(header)
+        for rows in output_chunks(job_id):
+            writer.writerows(rows)
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue().encode("utf-8")
+
+    return send_stream(lines(), download_name=f"partial-output-{job_id}.csv")
+
+
 @main.route("/plan-documents-results/<uuid:collection_id>")
+@cached_result(lambda collection_id: created_at(PlanDataCollection, collection_id))
 def plan_documents_results(collection_id):
     collection = PlanDataCollection.query.get_or_404(collection_id)
 
-    # Parse the CSV data to display in the template
-    reader = csv.DictReader(StringIO(collection.data))
-    headers = reader.fieldnames
-    rows = [row for row in reader]
+    # Read the requested page of the CSV data to display in the template
+    table = _table_page(
+        CsvTable(
+            collection,
+            PlanDataCollection.data,
+            PlanDataCollection.id == collection_id,
+        ),
+        request.args,
+    )
 
     # Parse failed URLs if they exist
     failed_urls = None
@@ -268,76 +547,230 @@ def plan_documents_results(collection_id):
     return render_template(
         "plan-documents-results.html",
         collection=collection,
-        headers=headers,
-        rows=rows,
+        table=table,
         failed_urls=failed_urls,
     )
 
 
 @main.route("/plan-documents-results/<uuid:collection_id>/download")
+@cached_result(
+    lambda collection_id: created_at(PlanDataCollection, collection_id),
+    artifact=True,
+)
 def download_plan_documents(collection_id):
-    collection = PlanDataCollection.query.get_or_404(collection_id)
-    return send_file(
-        BytesIO(collection.data.encode("utf-8")),
-        mimetype="text/csv",
+    criteria = [PlanDataCollection.id == collection_id]
+    db.first_or_404(select(PlanDataCollection.id).where(*criteria))
+    return send_payload(
+        PlanDataCollection.data,
+        *criteria,
         download_name=f"local-plan-documents-{collection_id}.csv",
-        as_attachment=True,
     )
 
 
 @main.route("/plan-documents-results/<uuid:collection_id>/failed-urls")
+@cached_result(
+    lambda collection_id: created_at(PlanDataCollection, collection_id),
+    artifact=True,
+)
 def download_failed_urls(collection_id):
-    collection = PlanDataCollection.query.get_or_404(collection_id)
-    if not collection.failed_urls:
+    criteria = [PlanDataCollection.id == collection_id]
+    has_failed_urls = db.first_or_404(
+        select(PlanDataCollection.failed_urls.isnot(None)).where(*criteria)
+    )
+    if not has_failed_urls:
         flash("No failed URLs file available", "error")
         return redirect(
             url_for("main.plan_documents_results", collection_id=collection_id)
         )
 
-    return send_file(
-        BytesIO(collection.failed_urls.encode("utf-8")),
-        mimetype="text/csv",
+    return send_payload(
+        PlanDataCollection.failed_urls,
+        *criteria,
         download_name=f"failed_urls_{collection_id}.csv",
-        as_attachment=True,
     )
 
 
 @main.route("/plan-documents-index")
 def plan_documents_index():
-    collections = PlanDataCollection.query.order_by(
-        PlanDataCollection.created_at.desc()
-    ).all()
-    return render_template("plan-documents-index.html", collections=collections)
+    statement = select(
+        PlanDataCollection.id,
+        PlanDataCollection.source_file,
+        PlanDataCollection.created_at,
+        PlanDataCollection.failed_urls.isnot(None).label("has_failed_urls"),
+    )
+    page = _index_page(statement, PlanDataCollection, PlanDataCollection.source_file)
+    return render_template(
+        "plan-documents-index.html", collections=page["rows"], page=page
+    )
 
 
 @main.route("/cluster-index")
 def cluster_index():
-    analyses = ClusterAnalysis.query.order_by(ClusterAnalysis.created_at.desc()).all()
-    return render_template("cluster-index.html", analyses=analyses)
+    statement = select(
+        ClusterAnalysis.id,
+        ClusterAnalysis.source_file,
+        ClusterAnalysis.created_at,
+        ClusterAnalysis.group_count,
+    )
+    page = _index_page(statement, ClusterAnalysis, ClusterAnalysis.source_file)
+    return render_template("cluster-index.html", analyses=page["rows"], page=page)
 
 
 @main.route("/cluster-results/<uuid:analysis_id>")
+@cached_result(lambda analysis_id: created_at(ClusterAnalysis, analysis_id))
 def cluster_results(analysis_id):
     analysis = ClusterAnalysis.query.get_or_404(analysis_id)
     return render_template("cluster-results.html", analysis=analysis)
 
 
 @main.route("/cluster-results/<uuid:analysis_id>/visualization")
+@cached_result(
+    lambda analysis_id: column_value(ClusterAnalysis.visualization_hash, analysis_id),
+    artifact=True,
+)
 def cluster_visualization(analysis_id):
     analysis = ClusterAnalysis.query.get_or_404(analysis_id)
     return send_file(
-        BytesIO(analysis.visualization_data),
+        _open_blob(analysis.visualization_ref),
         mimetype=analysis.visualization_mime_type,
         as_attachment=False,
     )
 
 
 @main.route("/cluster-results/<uuid:analysis_id>/report")
+@cached_result(
+    lambda analysis_id: column_value(ClusterAnalysis.report_hash, analysis_id),
+    artifact=True,
+)
 def cluster_report(analysis_id):
     analysis = ClusterAnalysis.query.get_or_404(analysis_id)
     return send_file(
-        BytesIO(analysis.report_data),
+        _open_blob(analysis.report_ref),
         mimetype=analysis.report_mime_type,
         download_name=f"cluster_analysis_report_{analysis_id}.docx",
         as_attachment=True,
     )
+
+
+def _open_blob(ref):
+    """Open a stored file, as a 404 if it has gone from the blob store."""
+    try:
+        return blobs.open(ref)
+    except FileNotFoundError:
+        current_app.logger.warning("Blob %s is missing from the blob store", ref)
+        abort(404)
+
+
+def _upload_state(upload):
+    return {
+        "id": upload.id,
+        "filename": upload.filename,
+        "size": upload.size,
+        "offset": upload.received,
+        "chunk_size": uploads.chunk_size,
+        "complete": upload.completed_at is not None,
+        "sha256": upload.sha256,
+        "url": url_for("main.upload_status", upload_id=upload.id),
+    }
+
+
+def _elapsed(job):
+    if job.started_at is None:
+        return None
+    finished = job.finished_at or datetime.datetime.today()
+    return (finished - job.started_at).total_seconds()
+
+
+def _unpack_pdfs(zip_path, scratch_dir):
+    """Save the PDF files in an uploaded zip, each in its own directory.
+
+    Returns a list of (name in the zip, saved path) pairs.
+    """
+    pdfs = []
+    with zipfile.ZipFile(zip_path) as archive:
+        members = [
+            info
+            for info in archive.infolist()
+            if not info.is_dir()
+            and allowed_file(info.filename, current_app.config["ALLOWED_EXTENSIONS"])
+        ]
+        scratch.check(sum(info.file_size for info in members))
+        for number, info in enumerate(members):
+            filename = secure_filename(os.path.basename(info.filename)) or "file.pdf"
+            path = os.path.join(scratch_dir, f"pdf-{number}", filename)
+            os.makedirs(os.path.dirname(path))
+            with archive.open(info) as source, open(path, "wb") as target:
+                shutil.copyfileobj(source, target)
+            pdfs.append((info.filename, path))
+    os.remove(zip_path)
+    return pdfs
+
+
+def _batch_jobs(batch_id):
+    return (
+        db.session.execute(
+            select(Job).where(Job.batch_id == batch_id).order_by(Job.created_at)
+        )
+        .scalars()
+        .all()
+    )
+
+
+def _index_page(statement, model, source_column):
+    """Read the page of an index listing requested in the query string."""
+    source = request.args.get("source", "").strip()
+    if source:
+        statement = statement.where(source_filter(source_column, source))
+    page = keyset_page(
+        statement,
+        model.created_at,
+        model.id,
+        after=request.args.get("after"),
+        before=request.args.get("before"),
+    )
+    page["source"] = source
+    for direction in ["previous", "next"]:
+        if page[direction]:
+            cursor = "before" if direction == "previous" else "after"
+            page[f"{direction}_url"] = url_for(
+                request.endpoint, source=source or None, **{cursor: page[direction]}
+            )
+    return page
+
+
+def _table_page(source, args, **url_args):
+    """Read the page of a stored table requested in args.
+
+    source is a CsvTable or ColumnarTable. The returned url function builds
+    links to other pages and sort orders of the same table, passing
+    url_args through.
+    """
+    page = args.get("page", 1, type=int)
+    sort = args.get("sort")
+    order = "desc" if args.get("order") == "desc" else "asc"
+    if sort not in source.headers or not sortable(source.row_count):
+        sort = None
+
+    pagination = paginate(page, source.row_count)
+    if sort:
+        rows = source.sorted_rows(
+            sort, order == "desc", pagination["start"], pagination["stop"]
+        )
+    else:
+        rows = source.rows(pagination["start"], pagination["stop"])
+
+    def url(**changes):
+        params = {"page": pagination["page"], "sort": sort, "order": order}
+        params.update(url_args, **changes)
+        params = {key: value for key, value in params.items() if value is not None}
+        return url_for(request.endpoint, **request.view_args, **params)
+
+    return {
+        "headers": source.headers,
+        "rows": rows,
+        "pagination": pagination,
+        "sortable": sortable(source.row_count),
+        "sort": sort,
+        "order": order,
+        "url": url,
+    }
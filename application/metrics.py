@@ -0,0 +1,191 @@
+"""Prometheus metrics for requests, analysis stages and SQL queries.
+
+Every request's latency, status, request and response body sizes and
+query count are recorded against its endpoint, along with the number of
+requests in flight. Stages timed with application.timing.stage_timer are
+recorded against the job kind, or the endpoint, they ran for. Recording a
+value costs a few microseconds, so this is on by default.
+
+Metrics are kept per process. When gunicorn runs several workers, set
+PROMETHEUS_MULTIPROC_DIR to a shared empty directory so /metrics reports
+the total across workers.
+"""
+
+import contextvars
+import os
+import time
+from contextlib import contextmanager
+
+from flask import g, has_request_context, request
+from prometheus_client import (
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from sqlalchemy import event
+
+from application.extensions import db
+
+SIZE_BUCKETS = [2**power for power in range(10, 32, 2)]
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Time to handle a request, up to its response being returned",
+    ["method", "endpoint", "status"],
+)
+REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress",
+    "Requests being handled",
+    ["method", "endpoint"],
+    multiprocess_mode="livesum",
+)
+REQUEST_SIZE = Histogram(
+    "http_request_size_bytes",
+    "Size of request bodies, such as uploads",
+    ["endpoint"],
+    buckets=SIZE_BUCKETS,
+)
+RESPONSE_SIZE = Histogram(
+    "http_response_size_bytes",
+    "Size of response bodies as sent, after any compression",
+    ["endpoint"],
+    buckets=SIZE_BUCKETS,
+)
+REQUEST_QUERIES = Histogram(
+    "http_request_db_queries",
+    "SQL queries run while handling a request",
+    ["endpoint"],
+    buckets=[0, 1, 2, 5, 10, 20, 50, 100, 200, 500],
+)
+QUERY_DURATION = Histogram(
+    "db_query_duration_seconds",
+    "Time to execute a SQL statement",
+    ["statement"],
+    buckets=[0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5],
+)
+QUERIES = Counter("db_queries", "SQL statements executed", ["statement"])
+STAGE_DURATION = Histogram(
+    "analysis_stage_duration_seconds",
+    "Time spent in each stage of an analysis",
+    ["task", "stage"],
+    buckets=[0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800],
+)
+
+STATEMENTS = {"SELECT", "INSERT", "UPDATE", "DELETE"}
+
+_task = contextvars.ContextVar("task", default=None)
+
+
+class Metrics:
+    def __init__(self, app=None):
+        self.enabled = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config["METRICS_ENABLED"]
+        app.extensions["metrics"] = self
+        if not self.enabled:
+            return
+        app.before_request(_before_request)
+        app.after_request(_after_request)
+        app.teardown_request(_teardown_request)
+        with app.app_context():
+            for engine in db.engines.values():
+                event.listen(engine, "before_cursor_execute", _before_query)
+                event.listen(engine, "after_cursor_execute", _after_query)
+
+    def export(self):
+        """The current metrics in the Prometheus text format."""
+        if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+            return generate_latest(registry)
+        return generate_latest()
+
+
+metrics = Metrics()
+
+
+@contextmanager
+def task(name):
+    """Label the stages timed in the block as part of the named task."""
+    token = _task.set(name)
+    try:
+        yield
+    finally:
+        _task.reset(token)
+
+
+def observe_stage(stage, seconds):
+    name = _task.get()
+    if name is None:
+        name = request.endpoint if has_request_context() else ""
+    STAGE_DURATION.labels(name or "", stage).observe(seconds)
+
+
+def _endpoint():
+    return request.endpoint or "none"
+
+
+def _before_request():
+    g.metrics_started = time.perf_counter()
+    g.metrics_queries = 0
+    g.metrics_status = 500
+    REQUESTS_IN_PROGRESS.labels(request.method, _endpoint()).inc()
+    if request.content_length:
+        REQUEST_SIZE.labels(_endpoint()).observe(request.content_length)
+
+
+def _after_request(response):
+    g.metrics_status = response.status_code
+    endpoint = _endpoint()
+    if response.content_length is not None:
+        RESPONSE_SIZE.labels(endpoint).observe(response.content_length)
+    elif response.is_streamed and not response.direct_passthrough:
+        response.response = _count_bytes(
+            response.response, RESPONSE_SIZE.labels(endpoint).observe
+        )
+    return response
+
+
+def _teardown_request(exception):
+    # streamed responses tear the request down again once they're sent
+    started = g.pop("metrics_started", None)
+    if started is None:
+        return
+    endpoint = _endpoint()
+    REQUESTS_IN_PROGRESS.labels(request.method, endpoint).dec()
+    REQUEST_DURATION.labels(request.method, endpoint, g.metrics_status).observe(
+        time.perf_counter() - started
+    )
+    REQUEST_QUERIES.labels(endpoint).observe(g.metrics_queries)
+
+
+def _count_bytes(chunks, observe):
+    size = 0
+    try:
+        for chunk in chunks:
+            size += len(chunk)
+            yield chunk
+    finally:
+        observe(size)
+        if hasattr(chunks, "close"):
+            chunks.close()
+
+
+def _before_query(conn, cursor, statement, parameters, context, executemany):
+    conn.info["metrics_started"] = time.perf_counter()
+
+
+def _after_query(conn, cursor, statement, parameters, context, executemany):
+    seconds = time.perf_counter() - conn.info["metrics_started"]
+    verb = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ""
+    verb = verb if verb in STATEMENTS else "OTHER"
+    QUERY_DURATION.labels(verb).observe(seconds)
+    QUERIES.labels(verb).inc()
+    if has_request_context() and "metrics_queries" in g:
+        g.metrics_queries += 1
@@ -2,13 +2,25 @@ import datetime
 import uuid
 from typing import List
 
-from sqlalchemy import JSON, UUID, DateTime, Integer, LargeBinary, Text
+from sqlalchemy import (
+    JSON,
+    UUID,
+    BigInteger,
+    DateTime,
+    Integer,
+    LargeBinary,
+    Text,
+    func,
+)
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
+from application.compression import CompressedJSON, CompressedText
 from application.extensions import db
 
 
 class Extract(db.Model):
+    __table_args__ = (db.Index("ix_extract_created_at_id", "created_at", "id"),)
+
     id: Mapped[uuid.UUID] = mapped_column(
         UUID(as_uuid=True), primary_key=True, default=uuid.uuid4
     )
@@ -20,6 +32,19 @@ class Extract(db.Model):
         back_populates="extract",
         order_by="ExtractItem.index",
         cascade="all, delete-orphan",
+        passive_deletes=True,
+    )
+
+
+class ExtractBatch(db.Model):
+    id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True), primary_key=True, default=uuid.uuid4
+    )
+    name: Mapped[str] = mapped_column(Text, nullable=False)
+    file_or_url: Mapped[str] = mapped_column(Text, nullable=False)
+    source_count: Mapped[int] = mapped_column(Integer, nullable=False)
+    created_at: Mapped[datetime.date] = mapped_column(
+        DateTime, default=datetime.datetime.today, nullable=False
     )
 
 
@@ -28,14 +53,82 @@ class ExtractItem(db.Model):
         UUID(as_uuid=True), primary_key=True, default=uuid.uuid4
     )
     index: Mapped[int] = mapped_column(Integer, nullable=False)
-    data: Mapped[str] = mapped_column(Text, nullable=False)
+    headers: Mapped[list] = mapped_column(JSON, nullable=False)
+    columns: Mapped[list] = mapped_column(JSON, nullable=False)
+    row_count: Mapped[int] = mapped_column(Integer, nullable=False)
+    chunk_rows: Mapped[int] = mapped_column(Integer, nullable=False)
+    content_hash: Mapped[str] = mapped_column(
+        Text, db.ForeignKey("table_content.hash"), nullable=True, index=True
+    )
     extract_id: Mapped[uuid.UUID] = mapped_column(
-        UUID(as_uuid=True), db.ForeignKey("extract.id"), nullable=False
+        UUID(as_uuid=True),
+        db.ForeignKey("extract.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True,
     )
     extract: Mapped["Extract"] = relationship(back_populates="items")
+    chunks: Mapped[List["ExtractItemChunk"]] = relationship(
+        back_populates="item",
+        order_by="ExtractItemChunk.number",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+    )
+
+
+class ExtractItemChunk(db.Model):
+    extract_item_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True),
+        db.ForeignKey("extract_item.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    number: Mapped[int] = mapped_column(Integer, primary_key=True)
+    data: Mapped[list] = mapped_column(JSON, nullable=False)
+    item: Mapped["ExtractItem"] = relationship(back_populates="chunks")
+
+
+class TableContent(db.Model):
+    hash: Mapped[str] = mapped_column(Text, primary_key=True)
+    size: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    ref_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    created_at: Mapped[datetime.date] = mapped_column(
+        DateTime, default=datetime.datetime.today, nullable=False
+    )
+    chunks: Mapped[List["TableContentChunk"]] = relationship(
+        order_by="TableContentChunk.number",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+    )
+
+
+class TableContentChunk(db.Model):
+    content_hash: Mapped[str] = mapped_column(
+        Text,
+        db.ForeignKey("table_content.hash", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    number: Mapped[int] = mapped_column(Integer, primary_key=True)
+    data: Mapped[list] = mapped_column(CompressedJSON, nullable=False)
+
+
+class ExtractCacheEntry(db.Model):
+    key: Mapped[str] = mapped_column(Text, primary_key=True)
+    extract_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True),
+        db.ForeignKey("extract.id", ondelete="CASCADE"),
+        nullable=False,
+    )
+    created_at: Mapped[datetime.date] = mapped_column(
+        DateTime, default=datetime.datetime.today, nullable=False
+    )
+    hit_count: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    last_hit_at: Mapped[datetime.date] = mapped_column(DateTime, nullable=True)
 
 
 class ClusterAnalysis(db.Model):
+    __table_args__ = (
+        db.Index("ix_cluster_analysis_created_at_id", "created_at", "id"),
+    )
+
     id: Mapped[uuid.UUID] = mapped_column(
         UUID(as_uuid=True), primary_key=True, default=uuid.uuid4
     )
@@ -44,20 +137,120 @@ class ClusterAnalysis(db.Model):
         DateTime, default=datetime.datetime.today, nullable=False
     )
     grouped_reasons: Mapped[dict] = mapped_column(JSON, nullable=False)
-    visualization_data: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+    group_count: Mapped[int] = mapped_column(Integer, nullable=False)
+    visualization_ref: Mapped[str] = mapped_column(Text, nullable=False)
+    visualization_hash: Mapped[str] = mapped_column(Text, nullable=False)
+    visualization_size: Mapped[int] = mapped_column(BigInteger, nullable=False)
     visualization_mime_type: Mapped[str] = mapped_column(Text, nullable=False)
-    report_data: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+    report_ref: Mapped[str] = mapped_column(Text, nullable=False)
+    report_hash: Mapped[str] = mapped_column(Text, nullable=False)
+    report_size: Mapped[int] = mapped_column(BigInteger, nullable=False)
     report_mime_type: Mapped[str] = mapped_column(Text, nullable=False)
+    mode: Mapped[str] = mapped_column(Text, nullable=False, default="standard")
+    stage_timings: Mapped[dict] = mapped_column(JSON, nullable=True)
+
+
+class Blob(db.Model):
+    ref: Mapped[str] = mapped_column(Text, primary_key=True)
+    data: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+    size: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    stored_at: Mapped[datetime.date] = mapped_column(
+        DateTime, default=datetime.datetime.today, nullable=False
+    )
 
 
 class PlanDataCollection(db.Model):
+    __table_args__ = (
+        db.Index("ix_plan_data_collection_created_at_id", "created_at", "id"),
+    )
+
     id: Mapped[uuid.UUID] = mapped_column(
         UUID(as_uuid=True), primary_key=True, default=uuid.uuid4
     )
     source_file: Mapped[str] = mapped_column(Text, nullable=False)
     reference_file: Mapped[str] = mapped_column(Text, nullable=False)
+    reference_hash: Mapped[str] = mapped_column(Text, nullable=True)
+    created_at: Mapped[datetime.date] = mapped_column(
+        DateTime, default=datetime.datetime.today, nullable=False
+    )
+    data: Mapped[str] = mapped_column(CompressedText, nullable=False, deferred=True)
+    failed_urls: Mapped[str] = mapped_column(
+        CompressedText, nullable=True, deferred=True
+    )
+    headers: Mapped[list] = mapped_column(JSON, nullable=True)
+    row_count: Mapped[int] = mapped_column(Integer, nullable=True)
+    row_offsets: Mapped[dict] = mapped_column(JSON, nullable=True)
+    url_summary: Mapped[dict] = mapped_column(JSON, nullable=True)
+
+
+class UrlCacheEntry(db.Model):
+    url: Mapped[str] = mapped_column(Text, primary_key=True)
+    etag: Mapped[str] = mapped_column(Text, nullable=True)
+    last_modified: Mapped[str] = mapped_column(Text, nullable=True)
+    checked_at: Mapped[datetime.date] = mapped_column(DateTime, nullable=True)
+    changed_at: Mapped[datetime.date] = mapped_column(DateTime, nullable=True)
+
+
+# prefix searches on lower(source) need text_pattern_ops unless the
+# database uses the C collation
+def _source_index(name, column):
+    return db.Index(
+        name,
+        func.lower(column).label("lower_source"),
+        postgresql_ops={"lower_source": "text_pattern_ops"},
+    )
+
+
+_source_index("ix_extract_lower_source", Extract.source)
+_source_index("ix_cluster_analysis_lower_source_file", ClusterAnalysis.source_file)
+_source_index(
+    "ix_plan_data_collection_lower_source_file", PlanDataCollection.source_file
+)
+
+
+class Job(db.Model):
+    id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True), primary_key=True, default=uuid.uuid4
+    )
+    kind: Mapped[str] = mapped_column(Text, nullable=False)
+    status: Mapped[str] = mapped_column(Text, nullable=False, default="pending")
+    params: Mapped[dict] = mapped_column(JSON, nullable=False)
+    result_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), nullable=True)
+    error: Mapped[str] = mapped_column(Text, nullable=True)
+    batch_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True), nullable=True, index=True
+    )
+    created_at: Mapped[datetime.date] = mapped_column(
+        DateTime, default=datetime.datetime.today, nullable=False
+    )
+    started_at: Mapped[datetime.date] = mapped_column(DateTime, nullable=True)
+    heartbeat_at: Mapped[datetime.date] = mapped_column(DateTime, nullable=True)
+    finished_at: Mapped[datetime.date] = mapped_column(DateTime, nullable=True)
+    progress: Mapped[dict] = mapped_column(JSON, nullable=True)
+
+
+class JobOutput(db.Model):
+    job_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True),
+        db.ForeignKey("job.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    number: Mapped[int] = mapped_column(Integer, primary_key=True)
+    rows: Mapped[list] = mapped_column(JSON, nullable=False)
+
+
+class Upload(db.Model):
+    id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True), primary_key=True, default=uuid.uuid4
+    )
+    filename: Mapped[str] = mapped_column(Text, nullable=False)
+    size: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    received: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    expected_sha256: Mapped[str] = mapped_column(Text, nullable=True)
+    sha256: Mapped[str] = mapped_column(Text, nullable=True)
+    scratch_dir: Mapped[str] = mapped_column(Text, nullable=False)
+    path: Mapped[str] = mapped_column(Text, nullable=False)
     created_at: Mapped[datetime.date] = mapped_column(
         DateTime, default=datetime.datetime.today, nullable=False
     )
-    data: Mapped[str] = mapped_column(Text, nullable=False)
-    failed_urls: Mapped[str] = mapped_column(Text, nullable=True)
+    completed_at: Mapped[datetime.date] = mapped_column(DateTime, nullable=True)
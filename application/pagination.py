@@ -0,0 +1,79 @@
+"""Keyset pagination for the result index pages.
+
+Pages are ordered newest first by (created_at, id) and the links between
+them carry a cursor holding the key of the row at the edge of the page,
+so each page is a single index range scan however old it is.
+"""
+
+import base64
+import binascii
+import datetime
+import uuid
+
+from flask import current_app
+from sqlalchemy import func, tuple_
+
+from application.extensions import db
+
+
+def keyset_page(statement, created_column, id_column, after=None, before=None):
+    """Run statement for one page of rows, newest first.
+
+    after and before are cursors from a previous page's next/previous
+    values. Returns a dict of rows and the cursors of the pages either
+    side, which are None when there is no such page.
+    """
+    per_page = current_app.config["INDEX_PER_PAGE"]
+    key = tuple_(created_column, id_column)
+    after, before = decode_cursor(after), decode_cursor(before)
+    backwards = after is None and before is not None
+    if after:
+        statement = statement.where(key < tuple_(*after))
+    elif before:
+        statement = statement.where(key > tuple_(*before))
+
+    if backwards:
+        statement = statement.order_by(created_column.asc(), id_column.asc())
+    else:
+        statement = statement.order_by(created_column.desc(), id_column.desc())
+    rows = db.session.execute(statement.limit(per_page + 1)).all()
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+
+    if backwards:
+        rows.reverse()
+        has_previous, has_next = more, True
+    else:
+        has_previous, has_next = after is not None, more
+
+    page = {"rows": rows, "previous": None, "next": None}
+    if rows and has_previous:
+        page["previous"] = encode_cursor(rows[0].created_at, rows[0].id)
+    if rows and has_next:
+        page["next"] = encode_cursor(rows[-1].created_at, rows[-1].id)
+    return page
+
+
+def source_filter(column, text):
+    """Case insensitive prefix match, which can use a lower(column) index."""
+    escaped = text.lower().replace("\\", "\\\\").replace("%", "\\%")
+    escaped = escaped.replace("_", "\\_")
+    return func.lower(column).like(f"{escaped}%", escape="\\")
+
+
+def encode_cursor(created_at, row_id):
+    value = f"{created_at.isoformat()}|{row_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(value).decode("ascii")
+
+
+def decode_cursor(cursor):
+    """Decode a cursor, returning None if it is missing or malformed."""
+    if not cursor:
+        return None
+    try:
+        created_at, row_id = (
+            base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8").split("|")
+        )
+        return datetime.datetime.fromisoformat(created_at), uuid.UUID(row_id)
+    except (binascii.Error, UnicodeError, ValueError):
+        return None
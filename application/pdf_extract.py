@@ -0,0 +1,86 @@
+"""Page parallel table extraction from PDF files.
+
+Large PDFs are split into chunks of ``chunk_pages`` pages, each saved as a
+PDF of its own next to the original, and extract_table runs over the
+chunks on a pool of worker processes. Tables come back in document order,
+so numbering them from 1 gives the same numbering as a single pass.
+
+A table that runs across a chunk boundary is extracted as two tables.
+When a table index is asked for, the document is read in one pass, as the
+index counts tables across the whole document.
+
+PDFium isn't thread safe and jobs run on threads of the web process, so
+every call into it here holds _pdfium_lock.
+"""
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import pypdfium2 as pdfium
+from planning_data_analysis.extract import extract_table
+
+_pdfium_lock = threading.Lock()
+
+
+def extract_pdf_tables(
+    path, table_index=None, key_words=None, workers=1, chunk_pages=25
+):
+    """Extract the tables from the PDF at path as a list of DataFrames."""
+    chunks = _page_chunks(path, chunk_pages)
+    if workers <= 1 or len(chunks) <= 1 or table_index is not None:
+        return extract_table(
+            path, from_file=True, table_index=table_index, key_words=key_words
+        )
+
+    chunk_dir = os.path.join(os.path.dirname(path), "pages")
+    os.makedirs(chunk_dir, exist_ok=True)
+    chunk_paths = _split(path, chunks, chunk_dir)
+    # spawn rather than fork, as jobs run on threads of the web process
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(
+        max_workers=min(workers, len(chunks)), mp_context=context
+    ) as executor:
+        results = executor.map(
+            _extract_chunk, chunk_paths, [key_words] * len(chunk_paths)
+        )
+        return [table for tables in results for table in tables]
+
+
+def _page_chunks(path, chunk_pages):
+    """Page ranges of the document, or a single chunk if it can't be read."""
+    with _pdfium_lock:
+        try:
+            document = pdfium.PdfDocument(path)
+        except pdfium.PdfiumError:
+            return [None]
+        try:
+            page_count = len(document)
+        finally:
+            document.close()
+    return [
+        range(start, min(start + chunk_pages, page_count))
+        for start in range(0, page_count, chunk_pages)
+    ]
+
+
+def _split(path, chunks, chunk_dir):
+    paths = []
+    with _pdfium_lock:
+        source = pdfium.PdfDocument(path)
+        try:
+            for number, pages in enumerate(chunks):
+                chunk = pdfium.PdfDocument.new()
+                chunk.import_pages(source, pages=list(pages))
+                chunk_path = os.path.join(chunk_dir, f"{number}.pdf")
+                chunk.save(chunk_path)
+                chunk.close()
+                paths.append(chunk_path)
+        finally:
+            source.close()
+    return paths
+
+
+def _extract_chunk(path, key_words):
+    return extract_table(path, from_file=True, key_words=key_words) or []
@@ -0,0 +1,68 @@
+"""Progress of running jobs, for the job status page to show.
+
+A job records how far it has got in its row's progress column, and the
+output rows it has produced so far as numbered job_output rows. Both are
+committed as the job goes, so any worker can show them while it runs, and
+they outlast the client that submitted it.
+"""
+
+from sqlalchemy import delete, select, update
+
+from application.extensions import db
+from application.jobs import current_job_id
+from application.models import Job, JobOutput
+
+
+class Progress:
+    def __init__(self, total_rows, job_id=None):
+        self.job_id = job_id or current_job_id()
+        self.state = {
+            "rows_total": total_rows,
+            "rows_done": 0,
+            "urls_processed": 0,
+            "urls_failed": 0,
+            "output_rows": 0,
+            "header": None,
+        }
+        self.chunks = 0
+        self._save()
+
+    def advance(self, rows, urls, header, output_rows, failed_rows):
+        """Record rows input rows done, with the output they produced."""
+        state = self.state
+        state["rows_done"] += rows
+        state["urls_processed"] += urls
+        state["urls_failed"] += len(failed_rows)
+        if output_rows:
+            state["header"] = state["header"] or header
+            state["output_rows"] += len(output_rows)
+            db.session.add(
+                JobOutput(job_id=self.job_id, number=self.chunks, rows=output_rows)
+            )
+            self.chunks += 1
+        self._save()
+
+    def discard_output(self):
+        """Delete the output rows, once the job has stored its whole output.
+
+        They are kept when a job fails, so the rows collected before it did
+        can still be downloaded.
+        """
+        db.session.execute(delete(JobOutput).where(JobOutput.job_id == self.job_id))
+
+    def _save(self):
+        if self.job_id is None:
+            return
+        db.session.execute(
+            update(Job).where(Job.id == self.job_id).values(progress=dict(self.state))
+        )
+        db.session.commit()
+
+
+def output_chunks(job_id, start=0):
+    """The output rows of a job from chunk number start, as lists of rows."""
+    return db.session.execute(
+        select(JobOutput.rows)
+        .where(JobOutput.job_id == job_id, JobOutput.number >= start)
+        .order_by(JobOutput.number)
+    ).scalars()
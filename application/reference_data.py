@@ -0,0 +1,105 @@
+"""Reference data files and the hashes of their contents.
+
+A reference file is a CSV of entities with name and reference columns,
+such as data/local-plan-document-type.csv. The registry checks a file's
+columns and hashes it the first time it's asked for. After that, asking
+for the file only costs a stat, and it's read again only if its
+modification time changes.
+
+Documents are classified by collect_plan_data from planning-data-analysis,
+which only takes the path of a reference file and reads it itself. So the
+registry doesn't classify anything: it checks the file, hands out its path
+and records the hash a collection was classified with.
+
+Files are registered by name. The document types are always registered,
+and REFERENCE_DATA_FILES adds others, as a comma separated list of
+name=path pairs.
+"""
+
+import csv
+import hashlib
+import io
+import os
+import threading
+
+DOCUMENT_TYPES = "local-plan-document-type"
+
+
+class ReferenceDataError(Exception):
+    pass
+
+
+class ReferenceSet:
+    """A checked reference file and the hash of its contents."""
+
+    def __init__(self, path, sha256, mtime):
+        self.path = path
+        self.sha256 = sha256
+        self.mtime = mtime
+
+
+class ReferenceData:
+    def __init__(self, app=None):
+        self.files = {}
+        self._sets = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.register(
+            DOCUMENT_TYPES,
+            os.path.join(
+                app.config["PROJECT_ROOT"], "data", "local-plan-document-type.csv"
+            ),
+        )
+        for entry in app.config["REFERENCE_DATA_FILES"].split(","):
+            if entry.strip():
+                name, _, path = entry.partition("=")
+                self.register(name.strip(), path.strip())
+        app.extensions["reference_data"] = self
+
+    def register(self, name, path):
+        with self._lock:
+            self.files[name] = os.path.abspath(path)
+
+    def get(self, name):
+        """The ReferenceSet of the named file, read again if the file changed."""
+        try:
+            path = self.files[name]
+        except KeyError:
+            raise ReferenceDataError(f"There's no reference data called {name}")
+        return self.for_path(path)
+
+    def for_path(self, path):
+        """The ReferenceSet of a file that needn't be registered."""
+        path = os.path.abspath(path)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError as e:
+            raise ReferenceDataError(
+                f"Can't read {os.path.basename(path)} reference data: {e}"
+            )
+        current = self._sets.get(path)
+        if current is not None and current.mtime == mtime:
+            return current
+        with self._lock:
+            current = self._sets.get(path)
+            if current is None or current.mtime != mtime:
+                current = _load(path, mtime)
+                self._sets[path] = current
+        return current
+
+
+def _load(path, mtime):
+    with open(path, "rb") as f:
+        data = f.read()
+    reader = csv.reader(io.StringIO(data.decode("utf-8-sig"), newline=""))
+    if not {"name", "reference"} <= set(next(reader, [])):
+        raise ReferenceDataError(
+            f"{os.path.basename(path)} needs name and reference columns"
+        )
+    return ReferenceSet(path, hashlib.sha256(data).hexdigest(), mtime)
+
+
+reference_data = ReferenceData()
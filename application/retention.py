@@ -0,0 +1,269 @@
+"""Set based deletion of old results.
+
+Results are deleted by id in batches, each batch in its own short
+transaction, with child rows removed by the same batch of ids. Nothing is
+loaded into the session, so clearing a long history needs neither the
+memory for every row nor long held locks.
+
+Extracted tables are shared between extracts, so deleting an extract
+takes its items' references off their table content, and only content
+left with no references is deleted.
+
+Work still in progress is kept whatever its age: pending and running
+jobs, uploads that haven't finished, and batches with jobs left to run.
+"""
+
+import time
+
+from sqlalchemy import (
+    Text,
+    and_,
+    cast,
+    delete,
+    func,
+    inspect,
+    not_,
+    select,
+    true,
+    update,
+)
+
+from application.extensions import db
+from application.jobs import PENDING, RUNNING
+from application.models import (
+    ClusterAnalysis,
+    Extract,
+    ExtractBatch,
+    ExtractCacheEntry,
+    ExtractItem,
+    ExtractItemChunk,
+    Job,
+    JobOutput,
+    PlanDataCollection,
+    TableContent,
+    TableContentChunk,
+    Upload,
+)
+from application.streaming import byte_length
+
+
+def _plan():
+    """(model, bytes per row, [(child model, where for parent ids, bytes per row)])
+
+    Children are deleted in the order listed, before their parents.
+    """
+    return [
+        (
+            Extract,
+            None,
+            [
+                (
+                    ExtractItemChunk,
+                    lambda ids: ExtractItemChunk.extract_item_id.in_(
+                        select(ExtractItem.id).where(ExtractItem.extract_id.in_(ids))
+                    ),
+                    byte_length(cast(ExtractItemChunk.data, Text)),
+                ),
+                (ExtractItem, ExtractItem.extract_id.in_, None),
+                (ExtractCacheEntry, ExtractCacheEntry.extract_id.in_, None),
+            ],
+        ),
+        (
+            ClusterAnalysis,
+            ClusterAnalysis.visualization_size + ClusterAnalysis.report_size,
+            [],
+        ),
+        (
+            PlanDataCollection,
+            byte_length(PlanDataCollection.data)
+            + func.coalesce(byte_length(PlanDataCollection.failed_urls), 0),
+            [],
+        ),
+        (ExtractBatch, None, []),
+        (Upload, None, []),
+        (
+            Job,
+            None,
+            [
+                (
+                    JobOutput,
+                    JobOutput.job_id.in_,
+                    byte_length(cast(JobOutput.rows, Text)),
+                )
+            ],
+        ),
+    ]
+
+
+def purge(cutoff=None, batch_size=1000, dry_run=False):
+    """Delete results created before cutoff, or every result if it is None.
+
+    Returns a dict of rows, bytes and seconds for each table. With dry_run
+    the rows and bytes that would be deleted are counted instead.
+    """
+    report = {}
+    for model, size, children in _plan():
+        tables = [model] + [child for child, _, _ in children]
+        if model is Extract:
+            tables += [TableContentChunk, TableContent]
+        for table in tables:
+            report[table.__tablename__] = {"rows": 0, "bytes": 0, "seconds": 0.0}
+        where = model.created_at < cutoff if cutoff is not None else true()
+        in_progress = _in_progress(model)
+        if in_progress is not None:
+            where = and_(where, not_(in_progress))
+        key = inspect(model).primary_key[0]
+
+        if dry_run:
+            parent_ids = select(key).where(where)
+            _measure(report, model, size, key.in_(parent_ids))
+            for child, child_of, child_size in children:
+                _measure(report, child, child_size, child_of(parent_ids))
+            if model is Extract:
+                references = _references(parent_ids)
+                unreferenced = and_(
+                    references > 0, TableContent.ref_count <= references
+                )
+                _measure(
+                    report,
+                    TableContentChunk,
+                    _chunk_size(),
+                    TableContentChunk.content_hash.in_(
+                        select(TableContent.hash).where(unreferenced)
+                    ),
+                )
+                _measure(report, TableContent, None, unreferenced)
+            continue
+
+        while True:
+            ids = (
+                db.session.execute(select(key).where(where).limit(batch_size))
+                .scalars()
+                .all()
+            )
+            if not ids:
+                break
+            unreferenced = _release_tables(ids) if model is Extract else []
+            for child, child_of, child_size in children:
+                _delete(report, child, child_size, child_of(ids))
+            _delete(report, model, size, key.in_(ids))
+            if unreferenced:
+                _delete_tables(report, unreferenced)
+            db.session.commit()
+    return report
+
+
+def _in_progress(model):
+    """Where clause for the rows of model still being worked on, if any."""
+    unfinished = Job.status.in_((PENDING, RUNNING))
+    if model is Job:
+        return unfinished
+    if model is Upload:
+        return Upload.completed_at.is_(None)
+    if model is ExtractBatch:
+        return ExtractBatch.id.in_(
+            select(Job.batch_id).where(Job.batch_id.isnot(None), unfinished)
+        )
+    return None
+
+
+def _references(extract_ids):
+    """The number of references items of the extracts make to each content."""
+    return (
+        select(func.count())
+        .where(
+            ExtractItem.content_hash == TableContent.hash,
+            ExtractItem.extract_id.in_(extract_ids),
+        )
+        .scalar_subquery()
+    )
+
+
+def _release_tables(extract_ids):
+    """Take the references of the extracts' items off their table content.
+
+    Returns the hashes of the content left without references, to delete
+    once the items are.
+    """
+    hashes = select(ExtractItem.content_hash).where(
+        ExtractItem.extract_id.in_(extract_ids)
+    )
+    db.session.execute(
+        update(TableContent)
+        .where(TableContent.hash.in_(hashes))
+        .values(ref_count=TableContent.ref_count - _references(extract_ids))
+        .execution_options(synchronize_session=False)
+    )
+    return (
+        db.session.execute(
+            select(TableContent.hash).where(
+                TableContent.hash.in_(hashes), TableContent.ref_count <= 0
+            )
+        )
+        .scalars()
+        .all()
+    )
+
+
+def _delete_tables(report, hashes):
+    """Delete the content of hashes that is still without references.
+
+    A run may have stored the same table again since its references were
+    released, so the content is locked and checked again, and only the
+    chunks of the content that goes are deleted.
+    """
+    unreferenced = and_(TableContent.hash.in_(hashes), TableContent.ref_count <= 0)
+    hashes = (
+        db.session.execute(
+            select(TableContent.hash).where(unreferenced).with_for_update()
+        )
+        .scalars()
+        .all()
+    )
+    if not hashes:
+        return
+    _delete(
+        report,
+        TableContentChunk,
+        _chunk_size(),
+        TableContentChunk.content_hash.in_(hashes),
+    )
+    _delete(
+        report,
+        TableContent,
+        None,
+        and_(TableContent.hash.in_(hashes), TableContent.ref_count <= 0),
+    )
+
+
+def _chunk_size():
+    return byte_length(TableContentChunk.data)
+
+
+def _measure(report, model, size, where):
+    started = time.perf_counter()
+    columns = [func.count()]
+    if size is not None:
+        columns.append(func.coalesce(func.sum(size), 0))
+    counts = db.session.execute(select(*columns).select_from(model).where(where)).one()
+    entry = report[model.__tablename__]
+    entry["rows"] += counts[0]
+    entry["bytes"] += counts[1] if size is not None else 0
+    entry["seconds"] += time.perf_counter() - started
+
+
+def _delete(report, model, size, where):
+    started = time.perf_counter()
+    if size is not None:
+        freed = db.session.execute(
+            select(func.coalesce(func.sum(size), 0)).where(where)
+        ).scalar()
+    else:
+        freed = 0
+    result = db.session.execute(
+        delete(model).where(where).execution_options(synchronize_session=False)
+    )
+    entry = report[model.__tablename__]
+    entry["rows"] += result.rowcount
+    entry["bytes"] += freed
+    entry["seconds"] += time.perf_counter() - started
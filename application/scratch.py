@@ -0,0 +1,184 @@
+"""Scratch space for uploads and the files analysis runs write.
+
+Each run gets its own directory under SCRATCH_ROOT, which is removed when
+the run finishes. New directories are refused while the space in use,
+plus what the new run expects to need, would go over SCRATCH_QUOTA_BYTES.
+
+A directory counts for whichever is larger, the space it takes on disk or
+the space reserved for it when it was made, so runs that have been
+admitted but haven't written their files yet still count against the
+quota. Reservations are kept in the process and in a file in the
+directory, where other processes see them when they next measure the
+space in use, which is at most every SCRATCH_MEASURE_SECONDS rather than
+on every allocation.
+Directories left behind by runs that never finished (for example when a
+worker is killed) are cleared by the sweep-scratch command.
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+PREFIX = "run-"
+RESERVATION = ".reserved"
+
+
+class ScratchSpaceFull(Exception):
+    pass
+
+
+class ScratchSpace:
+    def __init__(self, app=None):
+        self.root = None
+        self.quota = None
+        self.measure_interval = None
+        self._lock = threading.Lock()
+        # directory -> bytes reserved for it by this process
+        self._reserved = {}
+        # directory -> bytes it counts for, as last measured
+        self._measured = {}
+        self._measured_at = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.root = app.config["SCRATCH_ROOT"]
+        self.quota = app.config["SCRATCH_QUOTA_BYTES"]
+        self.measure_interval = app.config["SCRATCH_MEASURE_SECONDS"]
+        os.makedirs(self.root, exist_ok=True)
+        app.extensions["scratch"] = self
+
+    def allocate(self, reserve=0):
+        """Create a directory for a run expected to need reserve bytes."""
+        with self._lock:
+            self._check(reserve)
+            path = os.path.abspath(tempfile.mkdtemp(prefix=PREFIX, dir=self.root))
+            if reserve:
+                with open(os.path.join(path, RESERVATION), "w") as f:
+                    f.write(str(reserve))
+                self._reserved[path] = reserve
+        return path
+
+    def check(self, reserve):
+        """Raise ScratchSpaceFull unless reserve more bytes would fit."""
+        with self._lock:
+            self._check(reserve)
+
+    def release(self, path):
+        if path and os.path.dirname(os.path.abspath(path)) == os.path.abspath(
+            self.root
+        ):
+            shutil.rmtree(path, ignore_errors=True)
+            with self._lock:
+                self._reserved.pop(os.path.abspath(path), None)
+                self._measured.pop(os.path.abspath(path), None)
+
+    @contextmanager
+    def directory(self, reserve=0):
+        path = self.allocate(reserve)
+        try:
+            yield path
+        finally:
+            self.release(path)
+
+    def usage(self):
+        directories = size = reserved = 0
+        for entry in self._directories():
+            directories += 1
+            size += _tree_size(entry.path)
+            reserved += _reservation(entry.path)
+        return {
+            "root": self.root,
+            "directories": directories,
+            "bytes": size,
+            "reserved_bytes": reserved,
+            "quota": self.quota,
+        }
+
+    def _check(self, reserve):
+        if self._used() + reserve > self.quota:
+            raise ScratchSpaceFull(
+                "There isn't enough space to process this right now, "
+                "please try again later"
+            )
+
+    def _used(self):
+        """The bytes the directories count for, measured now and then."""
+        now = time.monotonic()
+        measured_at = self._measured_at
+        if measured_at is None or now - measured_at >= self.measure_interval:
+            self._measured = {
+                os.path.abspath(entry.path): max(
+                    _tree_size(entry.path), _reservation(entry.path)
+                )
+                for entry in self._directories()
+            }
+            # directories handed to and released by another process
+            self._reserved = {
+                path: size
+                for path, size in self._reserved.items()
+                if os.path.isdir(path)
+            }
+            self._measured_at = now
+        paths = self._measured.keys() | self._reserved.keys()
+        return sum(
+            max(self._measured.get(path, 0), self._reserved.get(path, 0))
+            for path in paths
+        )
+
+    def sweep(self, max_age):
+        """Remove directories not modified for max_age seconds.
+
+        Returns a (count, bytes) tuple of what was removed.
+        """
+        cutoff = time.time() - max_age
+        count = size = 0
+        for entry in self._directories():
+            if _last_modified(entry.path) < cutoff:
+                size += _tree_size(entry.path)
+                self.release(entry.path)
+                count += 1
+        return count, size
+
+    def _directories(self):
+        return [
+            entry
+            for entry in os.scandir(self.root)
+            if entry.is_dir() and entry.name.startswith(PREFIX)
+        ]
+
+
+def _reservation(path):
+    try:
+        with open(os.path.join(path, RESERVATION)) as f:
+            return int(f.read() or 0)
+    except (OSError, ValueError):
+        return 0
+
+
+def _tree_size(path):
+    size = 0
+    for directory, _, files in os.walk(path):
+        for name in files:
+            try:
+                size += os.path.getsize(os.path.join(directory, name))
+            except OSError:
+                pass
+    return size
+
+
+def _last_modified(path):
+    latest = os.path.getmtime(path)
+    for directory, _, files in os.walk(path):
+        for name in files:
+            try:
+                latest = max(latest, os.path.getmtime(os.path.join(directory, name)))
+            except OSError:
+                pass
+    return latest
+
+
+scratch = ScratchSpace()
@@ -0,0 +1,90 @@
+/*
+  Sends large files through the uploads API in chunks before a form is
+  submitted, so they aren't limited by the size of a single request.
+
+  Forms opt in with a data-chunked-upload attribute and hold a hidden
+  "upload" input. Once a file has been uploaded its id is put in that
+  input, the file input is cleared and the form is submitted as usual.
+*/
+(function () {
+  'use strict';
+
+  // smaller files are sent with the form
+  const CHUNKED_MIN_SIZE = 4 * 1024 * 1024;
+  const RETRIES = 5;
+
+  function showStatus(form, text) {
+    let status = form.querySelector('.app-upload-status');
+    if (!status) {
+      status = document.createElement('p');
+      status.className = 'govuk-body app-upload-status';
+      status.setAttribute('role', 'status');
+      form.appendChild(status);
+    }
+    status.textContent = text;
+  }
+
+  async function request(method, url, body, headers) {
+    const response = await fetch(url, { method: method, body: body, headers: headers });
+    const state = await response.json();
+    if (!response.ok && response.status !== 409) {
+      throw new Error(state.error || 'The upload failed');
+    }
+    return state;
+  }
+
+  async function upload(form, file) {
+    let state = await request(
+      'POST',
+      '/uploads',
+      JSON.stringify({ filename: file.name, size: file.size }),
+      { 'Content-Type': 'application/json' }
+    );
+    let failures = 0;
+    while (!state.complete) {
+      const percent = Math.floor((100 * state.offset) / file.size);
+      showStatus(form, 'Uploading ' + file.name + ': ' + percent + '%');
+      const chunk = file.slice(state.offset, state.offset + state.chunk_size);
+      try {
+        state = await request('PATCH', state.url, chunk, {
+          'Content-Type': 'application/offset+octet-stream',
+          'Upload-Offset': String(state.offset)
+        });
+        failures = 0;
+      } catch (error) {
+        failures += 1;
+        if (failures > RETRIES) {
+          throw error;
+        }
+        // carry on from wherever the server got to
+        state = await request('GET', state.url);
+      }
+    }
+    return state.id;
+  }
+
+  function init(form) {
+    form.addEventListener('submit', async function (event) {
+      const fileInput = form.querySelector('input[type="file"]');
+      const file = fileInput && fileInput.files[0];
+      if (!file || file.size < CHUNKED_MIN_SIZE || form.dataset.uploading) {
+        return;
+      }
+      event.preventDefault();
+      form.dataset.uploading = 'true';
+      try {
+        form.querySelector('input[name="upload"]').value = await upload(form, file);
+        fileInput.value = '';
+        showStatus(form, 'Uploaded ' + file.name);
+        form.submit();
+      } catch (error) {
+        showStatus(form, 'Error: ' + error.message);
+        delete form.dataset.uploading;
+      }
+    });
+  }
+
+  document.addEventListener('DOMContentLoaded', function () {
+    document.querySelectorAll('form[data-chunked-upload]').forEach(init);
+  });
+})();
@@ -0,0 +1,208 @@
+"""Stream large payloads to the client without loading them whole.
+
+Text columns are read from the database in fixed size slices so a download
+only ever holds one slice in memory, compressed ones a few frames at a time
+(see application.compression). Those responses support single byte
+range requests, which for compressed columns read just the frames holding
+the range. Payloads generated on the fly, such as CSV written from a
+columnar table or a zip of several tables, are sent as they are produced.
+Both kinds are compressed on the fly, with brotli or gzip, for clients that
+accept it. compress_response does the same for large pages built in memory.
+"""
+
+import zipfile
+import zlib
+
+import brotli
+from flask import Response, current_app, request, stream_with_context
+from sqlalchemy import LargeBinary, cast, func, select
+
+from application import compression
+from application.extensions import db
+
+COMPRESSED_MIMETYPES = {"text/html", "text/csv", "application/json"}
+
+
+def byte_length(column):
+    """SQL expression for the size in bytes of a text column."""
+    if db.engine.dialect.name == "sqlite":
+        return func.length(cast(column, LargeBinary))
+    return func.octet_length(column)
+
+
+def payload_size(column, *criteria):
+    """Size in bytes of the UTF-8 encoded column value."""
+    if isinstance(column.type, compression.CompressedText):
+        return compression.text_size(column, *criteria)
+    return db.session.execute(select(byte_length(column)).where(*criteria)).scalar()
+
+
+def iter_payload(column, *criteria, chunk_size=None):
+    """Yield the UTF-8 encoded column value in chunks of chunk_size characters."""
+    chunk_size = chunk_size or current_app.config["DOWNLOAD_CHUNK_SIZE"]
+    offset = 0
+    while True:
+        chunk = read_slice(column, *criteria, start=offset, length=chunk_size)
+        if not chunk:
+            return
+        yield chunk.encode("utf-8")
+        if len(chunk) < chunk_size:
+            return
+        offset += chunk_size
+
+
+def iter_payload_range(column, *criteria, start, stop):
+    """Yield bytes start to stop of the UTF-8 encoded column value."""
+    if isinstance(column.type, compression.CompressedText):
+        return compression.iter_bytes(column, *criteria, start=start, stop=stop)
+    return _slice(iter_payload(column, *criteria), start, stop)
+
+
+def read_slice(column, *criteria, start, length):
+    """Characters start to start + length (zero based) of a text column."""
+    if isinstance(column.type, compression.CompressedText):
+        return compression.read_slice(column, *criteria, start=start, length=length)
+    return db.session.execute(
+        select(func.substr(column, start + 1, length)).where(*criteria)
+    ).scalar()
+
+
+def send_payload(column, *criteria, download_name, mimetype="text/csv"):
+    size = payload_size(column, *criteria)
+    headers = {
+        "Content-Disposition": f'attachment; filename="{download_name}"',
+        "Accept-Ranges": "bytes",
+    }
+    status = 200
+
+    if request.range is not None:
+        byte_range = request.range.range_for_length(size)
+        if byte_range is None:
+            headers["Content-Range"] = f"bytes */{size}"
+            return Response(status=416, headers=headers)
+        start, stop = byte_range
+        chunks = iter_payload_range(column, *criteria, start=start, stop=stop)
+        headers["Content-Range"] = f"bytes {start}-{stop - 1}/{size}"
+        headers["Content-Length"] = str(stop - start)
+        status = 206
+    elif encoding := _content_encoding():
+        chunks = _compress(iter_payload(column, *criteria), encoding)
+        headers["Content-Encoding"] = encoding
+        headers["Vary"] = "Accept-Encoding"
+    else:
+        chunks = iter_payload(column, *criteria)
+        headers["Content-Length"] = str(size)
+
+    return Response(
+        stream_with_context(chunks), status=status, mimetype=mimetype, headers=headers
+    )
+
+
+def send_stream(chunks, download_name, mimetype="text/csv", compress=True):
+    """Send a payload generated on the fly, whose size isn't known up front.
+
+    With no download_name it is sent as the body of the response rather
+    than as an attachment.
+    """
+    headers = {}
+    if download_name:
+        headers["Content-Disposition"] = f'attachment; filename="{download_name}"'
+    encoding = _content_encoding() if compress else None
+    if encoding:
+        chunks = _compress(chunks, encoding)
+        headers["Content-Encoding"] = encoding
+        headers["Vary"] = "Accept-Encoding"
+    return Response(stream_with_context(chunks), mimetype=mimetype, headers=headers)
+
+
+def compress_response(response):
+    """Compress a large text response held in memory, for after_request."""
+    if (
+        response.status_code != 200
+        or response.direct_passthrough
+        or response.is_streamed
+        or "Content-Encoding" in response.headers
+        or response.mimetype not in COMPRESSED_MIMETYPES
+        or response.content_length is None
+        or response.content_length < current_app.config["COMPRESS_MIN_SIZE"]
+    ):
+        return response
+    encoding = _content_encoding()
+    if encoding is None:
+        return response
+    response.set_data(b"".join(_compress([response.get_data()], encoding)))
+    response.headers["Content-Encoding"] = encoding
+    response.vary.add("Accept-Encoding")
+    etag, weak = response.get_etag()
+    if etag:
+        # a strong ETag identifies the bytes sent, so differs per encoding
+        response.set_etag(f"{etag}-{encoding}", weak)
+    return response
+
+
+def iter_zip(members):
+    """Yield a zip file of (name, chunks) members as it is written."""
+    output = _Output()
+    with zipfile.ZipFile(output, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, chunks in members:
+            with archive.open(name, "w") as member:
+                for chunk in chunks:
+                    member.write(chunk)
+                    yield output.drain()
+        yield output.drain()
+    yield output.drain()
+
+
+class _Output:
+    """Write only file object that hands back what has been written to it."""
+
+    def __init__(self):
+        self.parts = []
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self.parts)
+        self.parts = []
+        return data
+
+
+def _content_encoding():
+    """The encoding to compress the response with, or None."""
+    if not current_app.config["DOWNLOAD_GZIP"] or request.args.get("gzip") == "0":
+        return None
+    if current_app.config["DOWNLOAD_BROTLI"] and request.accept_encodings["br"] > 0:
+        return "br"
+    if request.accept_encodings["gzip"] > 0:
+        return "gzip"
+    return None
+
+
+def _slice(chunks, start, stop):
+    position = 0
+    for chunk in chunks:
+        end = position + len(chunk)
+        if end > start:
+            yield chunk[max(start - position, 0) : stop - position]
+        if end >= stop:
+            return
+        position = end
+
+
+def _compress(chunks, encoding):
+    if encoding == "br":
+        compressor = brotli.Compressor(quality=5)
+        compress, finish = compressor.process, compressor.finish
+    else:
+        compressor = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+        compress, finish = compressor.compress, compressor.flush
+    for chunk in chunks:
+        compressed = compress(chunk)
+        if compressed:
+            yield compressed
+    yield finish()
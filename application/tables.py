@@ -0,0 +1,163 @@
+"""Paging over CSV payloads stored in text columns.
+
+When a payload is saved we record its headers, its row count and the
+character offset of every ``ROW_OFFSET_STRIDE``-th row. A page of rows can
+then be read by fetching and parsing just the slice of the column that
+holds it, however far into the table the page is.
+"""
+
+import csv
+import math
+from io import StringIO
+
+from flask import current_app
+
+from application.extensions import db
+from application.streaming import iter_payload, read_slice
+
+ROW_OFFSET_STRIDE = 50
+
+
+def index_csv(data, stride=ROW_OFFSET_STRIDE):
+    """Build the row index for a CSV payload.
+
+    Returns a dict of headers, row_count and row_offsets suitable for
+    passing straight to the model constructor.
+    """
+    lines = _CountingLines(data)
+    reader = csv.reader(lines)
+    headers = next(reader, [])
+    offsets = []
+    row_count = 0
+    while True:
+        start = lines.position
+        row = next(reader, None)
+        if row is None:
+            break
+        if not row:
+            continue
+        if row_count % stride == 0:
+            offsets.append(start)
+        row_count += 1
+    offsets.append(lines.position)
+    return {
+        "headers": headers,
+        "row_count": row_count,
+        "row_offsets": {"stride": stride, "offsets": offsets},
+    }
+
+
+def ensure_indexed(obj, column):
+    """Index a payload saved before row indexes were recorded."""
+    if obj.row_offsets is None:
+        for key, value in index_csv(getattr(obj, column)).items():
+            setattr(obj, key, value)
+        db.session.commit()
+
+
+def read_rows(column, *criteria, headers, row_offsets, start, stop):
+    """Read rows start to stop (zero based, exclusive) as dicts."""
+    stride = row_offsets["stride"]
+    offsets = row_offsets["offsets"]
+    first_block = start // stride
+    if first_block >= len(offsets) - 1:
+        return []
+    last_block = min(math.ceil(stop / stride), len(offsets) - 1)
+    begin, end = offsets[first_block], offsets[last_block]
+
+    text = read_slice(column, *criteria, start=begin, length=end - begin)
+    reader = csv.reader(StringIO(text, newline=""))
+    rows = []
+    non_blank = (row for row in reader if row)
+    for number, row in enumerate(non_blank, start=first_block * stride):
+        if number >= stop:
+            break
+        if number >= start:
+            rows.append(dict(zip(headers, row)))
+    return rows
+
+
+def read_sorted_rows(column, *criteria, sort, reverse, start, stop):
+    """Read a page of rows ordered by the sort column.
+
+    Sorting needs the whole payload, so callers should only offer it for
+    tables up to RESULTS_SORT_MAX_ROWS rows.
+    """
+    text = b"".join(iter_payload(column, *criteria)).decode("utf-8")
+    reader = csv.DictReader(StringIO(text, newline=""))
+    rows = sorted(reader, key=lambda row: sort_key(row.get(sort)), reverse=reverse)
+    return rows[start:stop]
+
+
+class CsvTable:
+    """Read access to a stored CSV payload for the result views."""
+
+    def __init__(self, obj, column, *criteria):
+        ensure_indexed(obj, column.key)
+        self.obj = obj
+        self.column = column
+        self.criteria = criteria
+        self.headers = obj.headers
+        self.row_count = obj.row_count
+
+    def rows(self, start, stop):
+        return read_rows(
+            self.column,
+            *self.criteria,
+            headers=self.headers,
+            row_offsets=self.obj.row_offsets,
+            start=start,
+            stop=stop,
+        )
+
+    def sorted_rows(self, sort, reverse, start, stop):
+        return read_sorted_rows(
+            self.column,
+            *self.criteria,
+            sort=sort,
+            reverse=reverse,
+            start=start,
+            stop=stop,
+        )
+
+
+def paginate(page, total):
+    """Work out the row range and navigation for a page of results."""
+    per_page = current_app.config["RESULTS_PER_PAGE"]
+    pages = max(math.ceil(total / per_page), 1)
+    page = min(max(page, 1), pages)
+    return {
+        "page": page,
+        "pages": pages,
+        "total": total,
+        "start": (page - 1) * per_page,
+        "stop": page * per_page,
+    }
+
+
+def sortable(row_count):
+    return row_count <= current_app.config["RESULTS_SORT_MAX_ROWS"]
+
+
+def sort_key(value):
+    # numbers sort before text, and numerically rather than alphabetically
+    try:
+        return (0, float(value), "")
+    except (TypeError, ValueError):
+        return (1, 0, value or "")
+
+
+class _CountingLines:
+    """Line iterator that keeps track of how many characters it has returned."""
+
+    def __init__(self, data):
+        self.lines = iter(StringIO(data, newline=""))
+        self.position = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        line = next(self.lines)
+        self.position += len(line)
+        return line
@@ -0,0 +1,23 @@
+"""Timing of the stages of an analysis run."""
+
+import time
+from contextlib import contextmanager
+
+from application.metrics import observe_stage
+
+
+@contextmanager
+def stage_timer(timings, stage):
+    """Add the seconds spent in the block to timings[stage].
+
+    The time is also recorded in the stage duration metric. timings may be
+    None to only record the metric.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - started
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + seconds
+        observe_stage(stage, seconds)
@@ -0,0 +1,215 @@
+"""Chunked, resumable uploads straight to scratch space.
+
+A client creates an upload with the file's name and size, then sends the
+file in order as chunks of at most UPLOAD_CHUNK_SIZE bytes, each at the
+offset the server says it has received up to. A chunk is streamed to disk
+as it arrives, so neither the chunk nor the file is ever held in memory,
+and files up to UPLOAD_MAX_BYTES get past the MAX_CONTENT_LENGTH limit on
+a single request. An interrupted chunk is dropped and sent again from the
+same offset. The upload's row is locked while a chunk is written, so a
+chunk sent twice at once is written once and the other gets a conflict.
+Chunks can land on any worker, so the file is hashed once, read back from
+disk, when the last one arrives.
+
+Once every byte has arrived a form takes the upload by its id in place of
+a file field, and the run it starts owns the upload's scratch directory.
+Uploads that are never taken are cleared with the rest of the scratch
+space by sweep-scratch.
+"""
+
+import datetime
+import hashlib
+import os
+import uuid
+
+from flask import request
+from sqlalchemy import select
+from werkzeug.utils import secure_filename
+
+from application.extensions import db
+from application.models import Upload
+from application.scratch import scratch
+from application.timing import stage_timer
+
+BUFFER_SIZE = 1024 * 1024
+
+
+class UploadError(Exception):
+    status = 400
+
+
+class UploadConflict(UploadError):
+    """A chunk was sent for an offset other than the one the upload is at."""
+
+    status = 409
+
+
+class Uploads:
+    def __init__(self, app=None):
+        self.max_bytes = None
+        self.chunk_size = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.max_bytes = app.config["UPLOAD_MAX_BYTES"]
+        self.chunk_size = app.config["UPLOAD_CHUNK_SIZE"]
+        app.extensions["uploads"] = self
+
+    def create(self, filename, size, sha256=None):
+        """Start an upload of a file of size bytes.
+
+        With sha256, the upload fails unless the file that arrives has that
+        hex digest.
+        """
+        if not secure_filename(filename or ""):
+            raise UploadError("The file needs a name")
+        if not isinstance(size, int) or size < 0:
+            raise UploadError("The file size must be a whole number of bytes")
+        if size > self.max_bytes:
+            raise UploadError(
+                f"Files can be at most {self.max_bytes // (1024 * 1024)} MB"
+            )
+        # an empty file is complete as soon as it's created, so check it now
+        if size == 0 and sha256 and sha256.lower() != hashlib.sha256().hexdigest():
+            raise UploadError("An empty file can't have that sha256")
+        scratch_dir = scratch.allocate(reserve=size)
+        upload = Upload(
+            filename=filename,
+            size=size,
+            expected_sha256=sha256.lower() if sha256 else None,
+            scratch_dir=scratch_dir,
+            path=os.path.join(scratch_dir, secure_filename(filename)),
+        )
+        open(upload.path, "wb").close()
+        db.session.add(upload)
+        if size == 0:
+            self._complete(upload)
+        db.session.commit()
+        return upload
+
+    def get(self, upload_id):
+        """The upload with the given id, which may be a string from a form."""
+        try:
+            return db.session.get(Upload, uuid.UUID(str(upload_id)))
+        except ValueError:
+            return None
+
+    def append(self, upload, offset, stream):
+        """Write the chunk read from stream at offset, returning its size.
+
+        The upload is read again and locked until the chunk is committed, as
+        another request may have moved it on since it was loaded.
+        """
+        locked = db.session.execute(
+            select(Upload)
+            .where(Upload.id == upload.id)
+            .with_for_update()
+            .execution_options(populate_existing=True)
+        ).scalar_one_or_none()
+        try:
+            if locked is None:
+                raise UploadConflict("This upload has been cancelled")
+            written = self._write(locked, offset, stream)
+        except Exception:
+            db.session.rollback()
+            raise
+        db.session.commit()
+        return written
+
+    def _write(self, upload, offset, stream):
+        if upload.completed_at is not None:
+            raise UploadConflict("This upload is already complete")
+        if offset != upload.received:
+            raise UploadConflict(
+                f"Expected the chunk at offset {upload.received}, not {offset}"
+            )
+        limit = min(self.chunk_size, upload.size - offset)
+        written = 0
+        with open(upload.path, "r+b") as f:
+            # drop whatever an interrupted chunk left past the offset
+            f.seek(offset)
+            f.truncate()
+            while True:
+                block = stream.read(BUFFER_SIZE)
+                if not block:
+                    break
+                written += len(block)
+                if written > limit:
+                    raise UploadError(
+                        f"Chunks can be at most {limit} bytes at offset {offset}"
+                    )
+                f.write(block)
+
+        upload.received = offset + written
+        if upload.received == upload.size:
+            self._complete(upload)
+        return written
+
+    def filename(self, file=None, upload_id=None):
+        """The name of a file sent with a request, or of a chunked upload."""
+        if upload_id:
+            upload = self.get(upload_id)
+            return upload.filename if upload else ""
+        return file.filename
+
+    def receive(self, file=None, upload_id=None):
+        """Put a file sent with a request in a new scratch directory.
+
+        file is the FileStorage of a file sent with the request. A chunked
+        upload, given by its id instead, is already in a scratch directory
+        of its own, which is claimed. Returns the file's name as uploaded,
+        the scratch directory, which the caller now owns, and the file's
+        path.
+        """
+        if upload_id:
+            return self.claim(upload_id)
+        scratch_dir = scratch.allocate(reserve=request.content_length or 0)
+        try:
+            path = os.path.join(scratch_dir, secure_filename(file.filename))
+            with stage_timer(None, "upload"):
+                file.save(path)
+        except Exception:
+            scratch.release(scratch_dir)
+            raise
+        return file.filename, scratch_dir, path
+
+    def claim(self, upload_id):
+        """Take a complete upload for a run.
+
+        Returns the file's name as uploaded, its scratch directory, which the
+        caller now owns, and its path.
+        """
+        upload = self.get(upload_id)
+        if upload is None or upload.completed_at is None:
+            raise UploadError("The file hasn't finished uploading")
+        claimed = (upload.filename, upload.scratch_dir, upload.path)
+        db.session.delete(upload)
+        db.session.commit()
+        return claimed
+
+    def cancel(self, upload):
+        scratch.release(upload.scratch_dir)
+        db.session.delete(upload)
+        db.session.commit()
+
+    def _complete(self, upload):
+        sha256 = _hash_file(upload.path)
+        if upload.expected_sha256 and upload.expected_sha256 != sha256:
+            scratch.release(upload.scratch_dir)
+            db.session.delete(upload)
+            db.session.commit()
+            raise UploadError("The file changed as it was uploaded, please try again")
+        upload.sha256 = sha256
+        upload.completed_at = datetime.datetime.today()
+
+
+def _hash_file(path):
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        while block := f.read(BUFFER_SIZE):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+uploads = Uploads()
@@ -0,0 +1,144 @@
+"""Conditional HTTP cache for the URLs plan document collections fetch.
+
+Each URL's ETag and Last-Modified are kept from one collection to the
+next. A re-run sends conditional HEAD requests with those validators, so
+the rows whose documents haven't changed can reuse the classification from
+the previous collection instead of being collected again. Only HEAD
+requests are made, as collect_plan_data downloads whatever has changed
+itself. A URL whose server gives no validators can't be checked, so is
+always collected again.
+"""
+
+import datetime
+import threading
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+from flask import current_app
+from sqlalchemy import select
+
+from application.extensions import db
+from application.models import UrlCacheEntry
+
+# checked recently enough that no request was made
+SKIPPED = "skipped"
+# the server said the content hasn't changed, or gave the same validators
+REVALIDATED = "revalidated"
+# new, changed, or with no validators to tell
+CHANGED = "changed"
+FAILED = "failed"
+
+UNCHANGED = {SKIPPED, REVALIDATED}
+
+
+def revalidate(urls, workers=8, host_limit=2):
+    """Check each URL against the cache, returning a dict of url to outcome."""
+    urls = sorted(set(urls))
+    entries = {
+        entry.url: entry
+        for entry in db.session.execute(
+            select(UrlCacheEntry).where(UrlCacheEntry.url.in_(urls))
+        ).scalars()
+    }
+    now = datetime.datetime.today()
+    fresh_since = now - datetime.timedelta(
+        seconds=current_app.config["COLLECT_URL_FRESH_FOR"]
+    )
+    timeout = current_app.config["COLLECT_URL_TIMEOUT"]
+
+    outcomes = {}
+    to_check = []
+    for url in urls:
+        entry = entries.get(url)
+        if entry and _has_validators(entry) and entry.checked_at >= fresh_since:
+            outcomes[url] = SKIPPED
+        else:
+            validators = (entry.etag, entry.last_modified) if entry else (None, None)
+            to_check.append((url, validators))
+
+    host_slots = {}
+    for url, _ in to_check:
+        host_slots.setdefault(_host(url), threading.BoundedSemaphore(host_limit))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(
+            lambda check: _fetch(*check, host_slots[_host(check[0])], timeout),
+            to_check,
+        )
+        for (url, _), (status, etag, last_modified) in zip(to_check, results):
+            entry = entries.get(url)
+            if status is None:
+                outcomes[url] = FAILED
+                continue
+            if entry is None:
+                entry = UrlCacheEntry(url=url)
+                db.session.add(entry)
+            if status == 304 or (
+                _has_validators(entry)
+                and (etag, last_modified) == (entry.etag, entry.last_modified)
+            ):
+                outcomes[url] = REVALIDATED
+            else:
+                outcomes[url] = CHANGED
+                entry.changed_at = now
+                entry.etag = etag
+                entry.last_modified = last_modified
+            entry.checked_at = now
+    db.session.commit()
+    return outcomes
+
+
+def changed_since(outcomes, since):
+    """The URLs in outcomes that changed, or couldn't be checked, after since."""
+    changed = {url for url, outcome in outcomes.items() if outcome not in UNCHANGED}
+    changed.update(
+        db.session.execute(
+            select(UrlCacheEntry.url).where(
+                UrlCacheEntry.url.in_(list(outcomes)),
+                UrlCacheEntry.changed_at > since,
+            )
+        ).scalars()
+    )
+    return changed
+
+
+def summarise(outcomes):
+    summary = {SKIPPED: 0, REVALIDATED: 0, CHANGED: 0, FAILED: 0}
+    for outcome in outcomes.values():
+        summary[outcome] += 1
+    return summary
+
+
+def _fetch(url, validators, slot, timeout):
+    """Conditional HEAD request for url.
+
+    Returns (status, etag, last modified), with a status of None if the
+    request failed.
+    """
+    etag, last_modified = validators
+    request = urllib.request.Request(url, method="HEAD")
+    if etag:
+        request.add_header("If-None-Match", etag)
+    if last_modified:
+        request.add_header("If-Modified-Since", last_modified)
+    with slot:
+        try:
+            with urllib.request.urlopen(request, timeout=timeout) as response:
+                headers = response.headers
+                status = response.status
+        except urllib.error.HTTPError as e:
+            if e.code != 304:
+                return None, None, None
+            return 304, e.headers.get("ETag"), e.headers.get("Last-Modified")
+        except Exception:
+            return None, None, None
+    return status, headers.get("ETag"), headers.get("Last-Modified")
+
+
+def _has_validators(entry):
+    return bool(entry.etag or entry.last_modified)
+
+
+def _host(url):
+    return urlparse(url).netloc.lower()
@@ -0,0 +1,87 @@
+"""Loading of the heavy analysis libraries.
+
+The analysis tools depend on pandas, scikit-learn, matplotlib and the PDF
+stack, which take seconds to import. The job handlers import the modules
+using them when a job first runs, so a web worker can serve pages as soon
+as it starts. HEAVY_MODULES lists them so they can be loaded ahead of
+time. When the app is preloaded, the gunicorn master loads them before
+forking, so workers share them copy on write. Otherwise each worker loads
+them on a background thread once it has started.
+
+import_report measures a cold import of the app in a fresh interpreter,
+which is what each worker pays before serving its first request.
+"""
+
+import importlib
+import subprocess
+import sys
+import threading
+import time
+
+HEAVY_MODULES = [
+    "pandas",
+    "matplotlib.pyplot",
+    "sklearn",
+    "docx",
+    "pypdfium2",
+    "planning_data_analysis.extract",
+    "planning_data_analysis.cluster_analysis",
+    "planning_data_analysis.collect_plan_data",
+    "application.fast_clusters",
+    "application.pdf_extract",
+]
+
+
+def import_heavy_modules():
+    """Import HEAVY_MODULES, returning the seconds each one took."""
+    timings = {}
+    for name in HEAVY_MODULES:
+        started = time.perf_counter()
+        importlib.import_module(name)
+        timings[name] = time.perf_counter() - started
+    return timings
+
+
+def warm_in_background(log=None):
+    """Import HEAVY_MODULES on a daemon thread, logging the time taken."""
+
+    def warm():
+        timings = import_heavy_modules()
+        if log is not None:
+            log(f"Loaded analysis modules in {sum(timings.values()):.2f}s")
+
+    thread = threading.Thread(target=warm, name="warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+def import_report(module="application.wsgi"):
+    """Time a cold import of module in a new interpreter.
+
+    Returns the total seconds, the seconds spent in each top level package
+    and the names of any HEAVY_MODULES it imported.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    packages = {}
+    imported = set()
+    total = 0
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_time, cumulative, name = line[len("import time:") :].split("|")
+        if not self_time.strip().isdigit():
+            continue
+        name = name.strip()
+        imported.add(name)
+        package = name.split(".")[0]
+        packages[package] = packages.get(package, 0) + int(self_time) / 1e6
+        if name == module:
+            total = int(cumulative) / 1e6
+    heavy = [name for name in HEAVY_MODULES if name in imported]
+    return total, packages, heavy
@@ -0,0 +1,15 @@
+from application.config import Config, TestConfig
+
+
+class BenchmarkConfig(TestConfig):
+    WTF_CSRF_ENABLED = False
+    # every upload is new work rather than a cache hit
+    EXTRACT_CACHE_TTL = 0
+    # each collection is made from scratch rather than from the last one
+    COLLECT_INCREMENTAL = False
+
+
+class ServingBenchmarkConfig(Config):
+    """Production settings, less CSRF, for the serving benchmark."""
+
+    WTF_CSRF_ENABLED = False
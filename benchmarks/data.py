@@ -0,0 +1,157 @@
+"""Synthetic inputs for the benchmarks, generated the same way every run."""
+
+import csv
+import io
+import random
+
+import pandas as pd
+
+from application.columnar import encode_frame, store_table
+from application.extensions import db
+from application.models import Extract, ExtractItem
+
+PAGE_WIDTH, PAGE_HEIGHT = 595, 842
+
+REASON_TEMPLATES = [
+    "Site location plan {detail} is missing the red line boundary",
+    "Ownership certificate {detail} has not been signed",
+    "Application fee {detail} was incorrect, please pay the balance",
+    "Description of development {detail} is unclear",
+    "Biodiversity net gain statement {detail} is missing",
+    "Drawings {detail} don't show a scale bar",
+]
+REASON_DETAILS = [
+    "for the proposal",
+    "submitted with the application",
+    "on the revised drawings",
+    "(see guidance note 4)",
+    "for plot {number}",
+    "under reference {number}",
+]
+
+
+def synthetic_pdf(pages, rows=30, columns=5):
+    """A PDF of the given number of pages, each holding one ruled table."""
+    objects = [None, None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_numbers = []
+    for page in range(pages):
+        content = _table_content(page, rows, columns)
+        objects.append(
+            b"<< /Length %d >>\nstream\n%s\nendstream" % (len(content), content)
+        )
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>"
+            % (PAGE_WIDTH, PAGE_HEIGHT, len(objects))
+        )
+        page_numbers.append(len(objects))
+    objects[0] = b"<< /Type /Catalog /Pages 2 0 R >>"
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % number for number in page_numbers),
+        len(page_numbers),
+    )
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(output)
+    output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        output += b"%010d 00000 n \n" % offset
+    output += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        len(objects) + 1,
+        xref,
+    )
+    return bytes(output)
+
+
+def _table_content(page, rows, columns):
+    left, top = 40, PAGE_HEIGHT - 60
+    width = (PAGE_WIDTH - 2 * left) / columns
+    height = min(20, (top - 40) / (rows + 1))
+    bottom = top - height * (rows + 1)
+    lines = [b"0.5 w"]
+    for row in range(rows + 2):
+        y = top - height * row
+        lines.append(b"%.1f %.1f m %.1f %.1f l S" % (left, y, PAGE_WIDTH - left, y))
+    for column in range(columns + 1):
+        x = left + width * column
+        lines.append(b"%.1f %.1f m %.1f %.1f l S" % (x, top, x, bottom))
+    for row in range(rows + 1):
+        for column in range(columns):
+            if row == 0:
+                text = f"Column {column + 1}"
+            else:
+                text = f"{page}-{row}-{column}"
+            lines.append(
+                b"BT /F1 8 Tf %.1f %.1f Td (%s) Tj ET"
+                % (
+                    left + width * column + 4,
+                    top - height * (row + 1) + 6,
+                    text.encode("ascii"),
+                )
+            )
+    return b"\n".join(lines)
+
+
+def plan_data_csv(path, scale):
+    """plan_data.csv repeated scale times, with the references made unique."""
+    with open(path, newline="") as f:
+        reader = csv.DictReader(f)
+        header = reader.fieldnames
+        rows = list(reader)
+    output = io.StringIO()
+    writer = csv.DictWriter(output, header)
+    writer.writeheader()
+    for copy in range(scale):
+        for row in rows:
+            writer.writerow(dict(row, reference=f"{row['reference']}-{copy}"))
+    return output.getvalue().encode("utf-8")
+
+
+def reasons_csv(rows, seed=0):
+    """A cluster analysis input of invalid reasons drawn from a few themes."""
+    rng = random.Random(seed)
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(["Reference", "Invalid Reason Details"])
+    for number in range(rows):
+        detail = rng.choice(REASON_DETAILS).format(number=rng.randint(1, 500))
+        writer.writerow(
+            [f"APP/{number}", rng.choice(REASON_TEMPLATES).format(detail=detail)]
+        )
+    return output.getvalue().encode("utf-8")
+
+
+def table_frame(rows, seed=0):
+    """A DataFrame with a mix of column types, like a large extracted table."""
+    rng = random.Random(seed)
+    return pd.DataFrame(
+        {
+            "reference": [f"REF-{number:07d}" for number in range(rows)],
+            "count": [rng.randint(0, 10000) for _ in range(rows)],
+            "area": [round(rng.uniform(0, 500), 2) for _ in range(rows)],
+            "status": [
+                rng.choice(["adopted", "draft", "withdrawn"]) for _ in range(rows)
+            ],
+            "description": [
+                rng.choice(REASON_TEMPLATES).format(detail=f"item {number}")
+                for number in range(rows)
+            ],
+        }
+    )
+
+
+def store_extract(rows):
+    """Save an extract of one table with the given number of rows.
+
+    Returns the ids of the extract and its table.
+    """
+    metadata, chunks = encode_frame(table_frame(rows))
+    item = ExtractItem(index=1, content_hash=store_table(metadata, chunks), **metadata)
+    extract = Extract(source=f"benchmark-{rows}.pdf", items=[item])
+    db.session.add(extract)
+    db.session.commit()
+    return extract.id, item.id
@@ -0,0 +1,62 @@
+"""Stand-ins for the network, so the benchmarks run offline.
+
+Every URL answers with a small document and an ETag, and
+collect_plan_data, which downloads each plan document, writes the input
+rows back out as its output. Collection benchmarks then measure the
+sharding, URL caching and storage done here rather than the speed of
+council websites.
+"""
+
+import csv
+import email.message
+import hashlib
+import io
+import urllib.request
+from contextlib import ExitStack, contextmanager
+from unittest import mock
+
+
+class _Response(io.BytesIO):
+    status = 200
+
+    def __init__(self, url):
+        body = f"Document at {url}".encode("utf-8")
+        super().__init__(body)
+        self.headers = email.message.Message()
+        self.headers["ETag"] = f'"{hashlib.sha256(body).hexdigest()[:16]}"'
+        self.headers["Content-Length"] = str(len(body))
+
+
+def _urlopen(request, *args, **kwargs):
+    url = request.full_url if isinstance(request, urllib.request.Request) else request
+    return _Response(url)
+
+
+def _collect_plan_data(input_path, ref_path, output_path, failed_urls_path):
+    with open(input_path, newline="") as f:
+        rows = list(csv.DictReader(f))
+    with open(output_path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["reference", "plan", "document-url", "document-type"])
+        for row in rows:
+            writer.writerow(
+                [
+                    row["reference"],
+                    row.get("plan", ""),
+                    row.get("document-url", ""),
+                    row.get("document-types", ""),
+                ]
+            )
+
+
+@contextmanager
+def offline():
+    with ExitStack() as stack:
+        stack.enter_context(mock.patch("urllib.request.urlopen", _urlopen))
+        stack.enter_context(
+            mock.patch(
+                "planning_data_analysis.collect_plan_data.collect_plan_data",
+                _collect_plan_data,
+            )
+        )
+        yield
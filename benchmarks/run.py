@@ -0,0 +1,365 @@
+"""Benchmarks for the analysis routes and the storage paths behind them.
+
+Run from the repository root with
+
+    python -m benchmarks.run --scale 10 --scale 100 --save results.json
+
+Every case drives the app through the Flask test client, so it measures a
+request from routing to the last byte of the response, with jobs run
+inside the request that submits them. A case is run once to warm up, once
+under tracemalloc for the peak memory allocated in this process, then
+--repeat times for its latency. Cases that upload or download a payload
+also report its throughput. collect_stored reads a collection's whole
+payload from the database and reports the bytes it takes at rest, so runs
+either side of a storage change compare size with read latency.
+
+Inputs are synthetic and scaled by --scale: PDFs of that many pages,
+plan_data.csv repeated that many times, and extracted tables and cluster
+analysis inputs with hundreds of rows per unit of scale. External fetches
+are stubbed by benchmarks.offline, so nothing leaves the machine.
+
+The database is a new SQLite file unless --database-url points at an
+empty one, such as a local Postgres, whose tables are dropped afterwards.
+
+With --baseline, each case is compared with a saved run, and the run
+fails if any case's median latency or peak memory grew by more than
+--tolerance.
+"""
+
+import argparse
+import io
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+
+CASES = []
+
+
+def case(name):
+    """Register a benchmark.
+
+    The decorated function is called with the test client and scale, to
+    set up any data, and returns the function to time. That function may
+    return the number of bytes it uploaded or downloaded.
+    """
+
+    def decorator(setup):
+        CASES.append((name, setup))
+        return setup
+
+    return decorator
+
+
+class BenchmarkError(Exception):
+    pass
+
+
+def _check(response, status=200):
+    if response.status_code != status:
+        raise BenchmarkError(
+            f"{response.request.path} returned {response.status_code}, "
+            f"expected {status}"
+        )
+    return response
+
+
+def _submit(client, path, data):
+    """Post a tool form and follow the job through to its result page."""
+    response = _check(
+        client.post(path, data=data, content_type="multipart/form-data"), 302
+    )
+    result = _check(client.get(response.location), 302)
+    if result.location.endswith(path):
+        raise BenchmarkError(f"The job submitted to {path} failed")
+    return result.location
+
+
+def _download(client, path, **headers):
+    response = _check(client.get(path, headers=headers))
+    size = len(response.get_data())
+    response.close()
+    return size
+
+
+@case("extract_upload")
+def extract_upload(client, scale):
+    from benchmarks.data import synthetic_pdf
+
+    pdf = synthetic_pdf(pages=scale)
+
+    def run():
+        _submit(
+            client,
+            "/extract-tables",
+            {"file_or_url": "file", "file": (io.BytesIO(pdf), "benchmark.pdf")},
+        )
+        return len(pdf)
+
+    return run
+
+
+def _extract_table(scale):
+    from benchmarks.data import store_extract
+
+    extract_id, item_id = store_extract(rows=100 * scale)
+    return f"/extract-result/{extract_id}", item_id
+
+
+@case("extract_page")
+def extract_page(client, scale):
+    path, _ = _extract_table(scale)
+    return lambda: _download(client, f"{path}?table=1&page=2")
+
+
+@case("extract_sorted_page")
+def extract_sorted_page(client, scale):
+    path, _ = _extract_table(scale)
+    return lambda: _download(client, f"{path}?table=1&sort=count&order=desc")
+
+
+@case("extract_revalidate")
+def extract_revalidate(client, scale):
+    path, _ = _extract_table(scale)
+    etag = _check(client.get(path)).headers["ETag"]
+
+    def run():
+        _check(client.get(path, headers={"If-None-Match": etag}), 304)
+
+    return run
+
+
+@case("extract_download")
+def extract_download(client, scale):
+    path, item_id = _extract_table(scale)
+    return lambda: _download(
+        client, f"{path}/table/{item_id}", **{"Accept-Encoding": "identity"}
+    )
+
+
+@case("extract_download_gzip")
+def extract_download_gzip(client, scale):
+    path, item_id = _extract_table(scale)
+    return lambda: _download(
+        client, f"{path}/table/{item_id}", **{"Accept-Encoding": "gzip"}
+    )
+
+
+@case("collect_upload")
+def collect_upload(client, scale):
+    from benchmarks.data import plan_data_csv
+
+    plan_data = plan_data_csv("plan_data.csv", scale)
+
+    def run():
+        _submit(
+            client,
+            "/collect-plan-documents",
+            {"input_file": (io.BytesIO(plan_data), "plan_data.csv")},
+        )
+        return len(plan_data)
+
+    return run
+
+
+def _collection(client, scale):
+    from benchmarks.data import plan_data_csv
+
+    plan_data = plan_data_csv("plan_data.csv", scale)
+    return _submit(
+        client,
+        "/collect-plan-documents",
+        {"input_file": (io.BytesIO(plan_data), f"plan_data_{scale}.csv")},
+    )
+
+
+@case("collect_page")
+def collect_page(client, scale):
+    path = _collection(client, scale)
+    return lambda: _download(client, f"{path}?page=2")
+
+
+@case("collect_download")
+def collect_download(client, scale):
+    path = _collection(client, scale)
+    return lambda: _download(
+        client, f"{path}/download", **{"Accept-Encoding": "identity"}
+    )
+
+
+@case("collect_stored")
+def collect_stored(client, scale):
+    from sqlalchemy import select
+
+    from application.extensions import db
+    from application.models import PlanDataCollection
+    from application.streaming import byte_length, iter_payload
+
+    collection_id = uuid.UUID(_collection(client, scale).rsplit("/", 1)[1])
+    criteria = [PlanDataCollection.id == collection_id]
+    stored = db.session.execute(
+        select(byte_length(PlanDataCollection.data)).where(*criteria)
+    ).scalar()
+
+    def run():
+        for _ in iter_payload(PlanDataCollection.data, *criteria):
+            pass
+        return stored
+
+    return run
+
+
+@case("cluster_upload_fast")
+def cluster_upload_fast(client, scale):
+    from benchmarks.data import reasons_csv
+
+    reasons = reasons_csv(rows=200 * scale)
+
+    def run():
+        _submit(
+            client,
+            "/analyze-clusters",
+            {"file": (io.BytesIO(reasons), "reasons.csv"), "mode": "fast"},
+        )
+        return len(reasons)
+
+    return run
+
+
+@case("cluster_visualization")
+def cluster_visualization(client, scale):
+    from benchmarks.data import reasons_csv
+
+    path = _submit(
+        client,
+        "/analyze-clusters",
+        {"file": (io.BytesIO(reasons_csv(rows=200 * scale)), "r.csv"), "mode": "fast"},
+    )
+    return lambda: _download(client, f"{path}/visualization")
+
+
+def measure(run, repeat):
+    run()
+    tracemalloc.start()
+    try:
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    seconds = []
+    size = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        size = run()
+        seconds.append(time.perf_counter() - started)
+    seconds.sort()
+    median = statistics.median(seconds)
+    result = {
+        "median": median,
+        "p95": seconds[min(len(seconds) - 1, round(0.95 * (len(seconds) - 1)))],
+        "min": seconds[0],
+        "per_second": 1 / median if median else None,
+        "peak_bytes": peak,
+    }
+    if size:
+        result["bytes"] = size
+        result["bytes_per_second"] = size / median if median else None
+    return result
+
+
+def compare(results, baseline, tolerance):
+    """Descriptions of the cases that regressed from the baseline."""
+    regressions = []
+    for key, result in results.items():
+        before = baseline.get(key)
+        if before is None:
+            continue
+        for metric in ("median", "peak_bytes"):
+            if before[metric] and result[metric] > before[metric] * (1 + tolerance):
+                regressions.append(
+                    f"{key} {metric}: {before[metric]:.4g} -> {result[metric]:.4g}"
+                )
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", type=int, action="append", help="default 10")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--case", action="append", help="only run these cases")
+    parser.add_argument("--database-url", help="an empty database to run against")
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare with results saved earlier")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args(argv)
+    scales = args.scale or [10]
+    selected = [(name, setup) for name, setup in CASES if name in (args.case or [name])]
+
+    with tempfile.TemporaryDirectory(prefix="benchmarks-") as work_dir:
+        app = create_benchmark_app(work_dir, args.database_url)
+        results = run_cases(app, selected, scales, args.repeat)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"Regression: {regression}", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+def create_benchmark_app(work_dir, database_url=None):
+    os.environ.setdefault("SECRET_KEY", "benchmarks")
+    os.environ["DATABASE_URL"] = database_url or "sqlite:///" + os.path.join(
+        work_dir, "benchmarks.db"
+    )
+    os.environ["BLOB_STORE_ROOT"] = os.path.join(work_dir, "blobs")
+    os.environ["SCRATCH_ROOT"] = os.path.join(work_dir, "scratch")
+
+    from application.factory import create_app
+
+    app = create_app("benchmarks.config.BenchmarkConfig")
+    return app
+
+
+def run_cases(app, cases, scales, repeat):
+    from sqlalchemy import inspect
+
+    from application.extensions import db
+    from benchmarks.offline import offline
+
+    results = {}
+    with app.app_context(), offline():
+        if inspect(db.engine).get_table_names():
+            raise BenchmarkError("The benchmark database must be empty")
+        db.create_all()
+        try:
+            client = app.test_client()
+            print(f"{'case':<36}{'median':>10}{'p95':>10}{'peak MB':>10}{'MB/s':>10}")
+            for scale in scales:
+                for name, setup in cases:
+                    key = f"{name}@{scale}"
+                    result = measure(setup(client, scale), repeat)
+                    results[key] = result
+                    rate = result.get("bytes_per_second")
+                    print(
+                        f"{key:<36}{result['median']:>10.4f}{result['p95']:>10.4f}"
+                        f"{result['peak_bytes'] / 1e6:>10.1f}"
+                        f"{rate / 1e6 if rate else 0:>10.1f}"
+                    )
+        finally:
+            db.session.remove()
+            db.drop_all()
+    return results
+
+
+if __name__ == "__main__":
+    sys.exit(main())
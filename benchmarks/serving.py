@@ -0,0 +1,182 @@
+"""Concurrent request throughput of the app under gunicorn.
+
+Run from the repository root with
+
+    python -m benchmarks.serving --worker-class sync --worker-class gthread
+
+For each worker class, gunicorn is started with gunicorn.conf.py and
+--workers processes, and --requests requests are sent from --concurrency
+client threads. Every other request submits a URL to extract tables from,
+which makes the extract cache send a HEAD request to a local server that
+takes --delay seconds to answer, standing in for a slow council website.
+The rest read a page of a stored table. Requests per second and latency
+percentiles are reported for each worker class.
+"""
+
+import argparse
+import http.client
+import http.server
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+
+class _SlowHandler(http.server.BaseHTTPRequestHandler):
+    delay = 0.5
+
+    def do_HEAD(self):
+        time.sleep(self.delay)
+        self.send_response(200)
+        self.send_header("ETag", '"benchmark"')
+        self.end_headers()
+
+    def do_GET(self):
+        # the extraction job fails straight away, so it adds little load
+        self.send_response(404)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _seed(environment):
+    """Create the tables and a stored table, returning its page's path."""
+    os.environ.update(environment)
+    from application.extensions import db
+    from application.factory import create_app
+    from benchmarks.data import store_extract
+
+    app = create_app(environment["FLASK_CONFIG"])
+    with app.app_context():
+        db.create_all()
+        extract_id, _ = store_extract(rows=2000)
+    return f"/extract-result/{extract_id}?table=1&page=3"
+
+
+def _request(port, method, path, body=None):
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+    headers = {"Content-Type": "application/x-www-form-urlencoded"} if body else {}
+    started = time.perf_counter()
+    try:
+        connection.request(method, path, body=body, headers=headers)
+        response = connection.getresponse()
+        response.read()
+        ok = response.status in (200, 302)
+    except OSError:
+        ok = False
+    finally:
+        connection.close()
+    return time.perf_counter() - started, ok
+
+
+def _wait_until_up(port, process, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("gunicorn exited before it was ready")
+        try:
+            if _request(port, "GET", "/cookies")[1]:
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("gunicorn didn't start in time")
+
+
+def run(worker_class, environment, page, slow_url, args):
+    port = _free_port()
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "gunicorn",
+            "-c",
+            "gunicorn.conf.py",
+            "-b",
+            f"127.0.0.1:{port}",
+            "--workers",
+            str(args.workers),
+            "application.wsgi:app",
+        ],
+        env=dict(
+            os.environ,
+            **environment,
+            GUNICORN_WORKER_CLASS=worker_class,
+            GUNICORN_WARM_IMPORTS="false",
+        ),
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        _wait_until_up(port, process)
+        submit = urllib.parse.urlencode({"file_or_url": "url", "url": slow_url})
+        requests = [
+            ("POST", "/extract-tables", submit) if number % 2 else ("GET", page, None)
+            for number in range(args.requests)
+        ]
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            results = list(executor.map(lambda r: _request(port, *r), requests))
+        elapsed = time.perf_counter() - started
+    finally:
+        process.terminate()
+        process.wait()
+
+    seconds = sorted(duration for duration, _ in results)
+    return {
+        "requests_per_second": len(results) / elapsed,
+        "p50": statistics.median(seconds),
+        "p95": seconds[round(0.95 * (len(seconds) - 1))],
+        "errors": sum(not ok for _, ok in results),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--worker-class", action="append")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--delay", type=float, default=0.5)
+    args = parser.parse_args(argv)
+
+    _SlowHandler.delay = args.delay
+    slow_server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _SlowHandler)
+    threading.Thread(target=slow_server.serve_forever, daemon=True).start()
+    slow_url = f"http://127.0.0.1:{slow_server.server_port}/plan.html"
+
+    with tempfile.TemporaryDirectory(prefix="benchmarks-") as work_dir:
+        environment = {
+            "FLASK_CONFIG": "benchmarks.config.ServingBenchmarkConfig",
+            "SECRET_KEY": os.getenv("SECRET_KEY", "benchmarks"),
+            "DATABASE_URL": "sqlite:///" + os.path.join(work_dir, "serving.db"),
+            "BLOB_STORE_ROOT": os.path.join(work_dir, "blobs"),
+            "SCRATCH_ROOT": os.path.join(work_dir, "scratch"),
+            "METRICS_ENABLED": "false",
+        }
+        page = _seed(environment)
+        print(f"{'worker class':<16}{'req/s':>10}{'p50':>10}{'p95':>10}{'errors':>8}")
+        for worker_class in args.worker_class or ["sync", "gthread"]:
+            result = run(worker_class, environment, page, slow_url, args)
+            print(
+                f"{worker_class:<16}{result['requests_per_second']:>10.1f}"
+                f"{result['p50']:>10.3f}{result['p95']:>10.3f}{result['errors']:>8}"
+            )
+    slow_server.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,37 @@
+import os
+
+from application.warmup import import_heavy_modules, warm_in_background
+
+# Load the app in the master before forking workers, so they share its
+# memory. Off by default, as every worker then restarts with the master.
+preload_app = os.getenv("GUNICORN_PRELOAD", "false").lower() == "true"
+warm_imports = os.getenv("GUNICORN_WARM_IMPORTS", "true").lower() == "true"
+
+# Threaded workers, so a request waiting on a slow website or the database
+# doesn't hold up the rest of its worker. Greenlet workers aren't supported,
+# as gevent's monkey patching doesn't mix with the process pools and C
+# extensions the analysis library runs on.
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+if worker_class not in ("sync", "gthread"):
+    raise ValueError(f"Unsupported gunicorn worker class {worker_class}")
+# gunicorn switches sync workers to gthread if given more than one thread
+threads = int(os.getenv("GUNICORN_THREADS", 8)) if worker_class == "gthread" else 1
+
+
+def on_starting(server):
+    if preload_app and warm_imports:
+        timings = import_heavy_modules()
+        for name, seconds in timings.items():
+            server.log.info(f"Imported {name} in {seconds:.2f}s")
+
+
+def post_fork(server, worker):
+    if not preload_app and warm_imports:
+        warm_in_background(worker.log.info)
+
+
+def child_exit(server, worker):
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
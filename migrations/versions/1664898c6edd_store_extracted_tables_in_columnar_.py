@@ -0,0 +1,159 @@
+"""store extracted tables in columnar chunks
+
+Revision ID: 1664898c6edd
+Revises: ec245ed8f443
+Create Date: 2026-10-18 19:59:27.484833
+
+"""
+import csv
+from io import StringIO
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '1664898c6edd'
+down_revision = 'ec245ed8f443'
+branch_labels = None
+depends_on = None
+
+CHUNK_ROWS = 1000
+
+extract_item = sa.table(
+    'extract_item',
+    sa.column('id', sa.UUID()),
+    sa.column('data', sa.Text()),
+    sa.column('headers', sa.JSON()),
+    sa.column('columns', sa.JSON()),
+    sa.column('row_count', sa.Integer()),
+    sa.column('chunk_rows', sa.Integer()),
+)
+
+extract_item_chunk = sa.table(
+    'extract_item_chunk',
+    sa.column('extract_item_id', sa.UUID()),
+    sa.column('number', sa.Integer()),
+    sa.column('data', sa.JSON()),
+)
+
+
+def upgrade():
+    op.create_table('extract_item_chunk',
+    sa.Column('extract_item_id', sa.UUID(), nullable=False),
+    sa.Column('number', sa.Integer(), nullable=False),
+    sa.Column('data', sa.JSON(), nullable=False),
+    sa.ForeignKeyConstraint(['extract_item_id'], ['extract_item.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('extract_item_id', 'number')
+    )
+    with op.batch_alter_table('extract_item', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('columns', sa.JSON(), nullable=True))
+        batch_op.add_column(sa.Column('chunk_rows', sa.Integer(), nullable=True))
+
+    # convert the stored CSV one item at a time
+    connection = op.get_bind()
+    ids = connection.execute(sa.select(extract_item.c.id)).scalars().all()
+    for item_id in ids:
+        data = connection.execute(
+            sa.select(extract_item.c.data).where(extract_item.c.id == item_id)
+        ).scalar()
+        metadata, chunks = encode_csv(data)
+        connection.execute(
+            extract_item.update().where(extract_item.c.id == item_id).values(**metadata)
+        )
+        if chunks:
+            connection.execute(
+                extract_item_chunk.insert(),
+                [
+                    {'extract_item_id': item_id, 'number': number, 'data': chunk}
+                    for number, chunk in enumerate(chunks)
+                ],
+            )
+
+    with op.batch_alter_table('extract_item', schema=None) as batch_op:
+        batch_op.alter_column('columns', existing_type=sa.JSON(), nullable=False)
+        batch_op.alter_column('chunk_rows', existing_type=sa.Integer(), nullable=False)
+        batch_op.alter_column('headers', existing_type=sa.JSON(), nullable=False)
+        batch_op.alter_column('row_count', existing_type=sa.Integer(), nullable=False)
+        batch_op.drop_column('row_offsets')
+        batch_op.drop_column('data')
+
+
+def encode_csv(data):
+    """Split a stored CSV table into column metadata and chunks of values.
+
+    A copy of the columnar encoding as it was when this was written, so
+    later changes to the app can't change what this does. The CSV no longer
+    says what type each column was extracted as, and inferring one would
+    change values such as "007" or "1e3", so every column is kept as text
+    and the table is read back exactly as it was stored. Empty cells, which
+    is how missing values were written, become nulls.
+    """
+    rows = list(csv.reader(StringIO(data, newline='')))
+    headers = rows[0] if rows else []
+    values = [[] for _ in headers]
+    for row in rows[1:]:
+        for position, column in enumerate(values):
+            cell = row[position] if position < len(row) else ''
+            column.append(cell if cell != '' else None)
+
+    columns = []
+    for name, column in zip(headers, values):
+        present = [value for value in column if value is not None]
+        stats = {
+            'count': len(present),
+            'nulls': len(column) - len(present),
+            'distinct': len(set(present)),
+        }
+        columns.append({'name': name, 'type': 'text', 'stats': stats})
+    row_count = max(len(rows) - 1, 0)
+    chunks = [
+        [column[start:start + CHUNK_ROWS] for column in values]
+        for start in range(0, row_count, CHUNK_ROWS)
+    ]
+    return {
+        'headers': headers,
+        'columns': columns,
+        'row_count': row_count,
+        'chunk_rows': CHUNK_ROWS,
+    }, chunks
+
+
+def downgrade():
+    with op.batch_alter_table('extract_item', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('data', sa.Text(), nullable=True))
+        batch_op.add_column(sa.Column('row_offsets', sa.JSON(), nullable=True))
+        batch_op.alter_column('row_count', existing_type=sa.Integer(), nullable=True)
+        batch_op.alter_column('headers', existing_type=sa.JSON(), nullable=True)
+
+    # rebuild the CSV; row offsets are left to be indexed when next viewed
+    connection = op.get_bind()
+    ids = connection.execute(sa.select(extract_item.c.id)).scalars().all()
+    for item_id in ids:
+        headers = connection.execute(
+            sa.select(extract_item.c.headers).where(extract_item.c.id == item_id)
+        ).scalar()
+        output = StringIO()
+        writer = csv.writer(output, quoting=csv.QUOTE_MINIMAL, lineterminator='\n')
+        writer.writerow(headers)
+        chunks = connection.execute(
+            sa.select(extract_item_chunk.c.data)
+            .where(extract_item_chunk.c.extract_item_id == item_id)
+            .order_by(extract_item_chunk.c.number)
+        ).scalars()
+        for chunk in chunks:
+            writer.writerows(
+                ['' if value is None else str(value) for value in row]
+                for row in zip(*chunk)
+            )
+        connection.execute(
+            extract_item.update()
+            .where(extract_item.c.id == item_id)
+            .values(data=output.getvalue())
+        )
+
+    with op.batch_alter_table('extract_item', schema=None) as batch_op:
+        batch_op.alter_column('data', existing_type=sa.Text(), nullable=False)
+        batch_op.drop_column('chunk_rows')
+        batch_op.drop_column('columns')
+
+    op.drop_table('extract_item_chunk')
@@ -0,0 +1,127 @@
+"""compress large text columns
+
+Revision ID: 36a7b5e4c4c8
+Revises: 5f219361d44a
+Create Date: 2026-10-18 20:46:06.496220
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+from application.compression import CompressedJSON, CompressedText
+
+# revision identifiers, used by Alembic.
+revision = '36a7b5e4c4c8'
+down_revision = '5f219361d44a'
+branch_labels = None
+depends_on = None
+
+plan_data_collection = sa.table(
+    'plan_data_collection',
+    sa.column('id', sa.UUID()),
+    sa.column('data', sa.Text()),
+    sa.column('failed_urls', sa.Text()),
+    sa.column('data_compressed', CompressedText()),
+    sa.column('failed_urls_compressed', CompressedText()),
+)
+
+table_content_chunk = sa.table(
+    'table_content_chunk',
+    sa.column('content_hash', sa.Text()),
+    sa.column('number', sa.Integer()),
+    sa.column('data', sa.JSON()),
+    sa.column('data_compressed', CompressedJSON()),
+)
+
+
+def upgrade():
+    _convert(
+        'plan_data_collection',
+        plan_data_collection,
+        ['id'],
+        {'data': False, 'failed_urls': True},
+    )
+    _convert(
+        'table_content_chunk',
+        table_content_chunk,
+        ['content_hash', 'number'],
+        {'data': False},
+    )
+
+
+def downgrade():
+    _restore(
+        'plan_data_collection',
+        plan_data_collection,
+        ['id'],
+        {'data': (sa.Text(), False), 'failed_urls': (sa.Text(), True)},
+    )
+    _restore(
+        'table_content_chunk',
+        table_content_chunk,
+        ['content_hash', 'number'],
+        {'data': (sa.JSON(), False)},
+    )
+
+
+def _convert(name, table, key, columns):
+    """Compress each of columns, a dict of name to nullable, one row at a time."""
+    with op.batch_alter_table(name, schema=None) as batch_op:
+        for column in columns:
+            batch_op.add_column(sa.Column(f'{column}_compressed', sa.LargeBinary(), nullable=True))
+
+    _copy(table, key, {column: f'{column}_compressed' for column in columns})
+
+    with op.batch_alter_table(name, schema=None) as batch_op:
+        for column in columns:
+            batch_op.drop_column(column)
+    with op.batch_alter_table(name, schema=None) as batch_op:
+        for column, nullable in columns.items():
+            batch_op.alter_column(
+                f'{column}_compressed',
+                new_column_name=column,
+                existing_type=sa.LargeBinary(),
+                nullable=nullable,
+            )
+
+
+def _restore(name, table, key, columns):
+    """Decompress each of columns, a dict of name to (type, nullable)."""
+    with op.batch_alter_table(name, schema=None) as batch_op:
+        for column in columns:
+            batch_op.alter_column(
+                column,
+                new_column_name=f'{column}_compressed',
+                existing_type=sa.LargeBinary(),
+                nullable=True,
+            )
+    with op.batch_alter_table(name, schema=None) as batch_op:
+        for column, (type_, _) in columns.items():
+            batch_op.add_column(sa.Column(column, type_, nullable=True))
+
+    _copy(table, key, {f'{column}_compressed': column for column in columns})
+
+    with op.batch_alter_table(name, schema=None) as batch_op:
+        for column, (type_, nullable) in columns.items():
+            batch_op.drop_column(f'{column}_compressed')
+            batch_op.alter_column(column, existing_type=type_, nullable=nullable)
+
+
+def _copy(table, key, columns):
+    """Copy each source column of columns to its target a row at a time.
+
+    The table's column types compress or decompress the values on the way.
+    """
+    connection = op.get_bind()
+    key_columns = [table.c[name] for name in key]
+    keys = connection.execute(sa.select(*key_columns)).all()
+    for values in keys:
+        where = sa.and_(*(column == value for column, value in zip(key_columns, values)))
+        row = connection.execute(
+            sa.select(*(table.c[source] for source in columns)).where(where)
+        ).one()
+        connection.execute(
+            table.update()
+            .where(where)
+            .values({target: value for target, value in zip(columns.values(), row)})
+        )
@@ -0,0 +1,133 @@
+"""move cluster analysis files to blob store
+
+Revision ID: 3c3ea9597fc2
+Revises: ab65a41431f3
+Create Date: 2026-10-18 19:51:43.600835
+
+"""
+import datetime
+import hashlib
+
+import sqlalchemy as sa
+from alembic import op
+from flask import current_app
+
+# revision identifiers, used by Alembic.
+revision = '3c3ea9597fc2'
+down_revision = 'ab65a41431f3'
+branch_labels = None
+depends_on = None
+
+FILES = ['visualization', 'report']
+
+cluster_analysis = sa.table(
+    'cluster_analysis',
+    sa.column('id', sa.UUID()),
+    *[sa.column(f'{name}_data', sa.LargeBinary()) for name in FILES],
+    *[sa.column(f'{name}_ref', sa.Text()) for name in FILES],
+    *[sa.column(f'{name}_hash', sa.Text()) for name in FILES],
+    *[sa.column(f'{name}_size', sa.BigInteger()) for name in FILES],
+)
+
+blob = sa.table(
+    'blob',
+    sa.column('ref', sa.Text()),
+    sa.column('data', sa.LargeBinary()),
+    sa.column('size', sa.BigInteger()),
+    sa.column('stored_at', sa.DateTime()),
+)
+
+
+def upgrade():
+    op.create_table('blob',
+    sa.Column('ref', sa.Text(), nullable=False),
+    sa.Column('data', sa.LargeBinary(), nullable=False),
+    sa.Column('size', sa.BigInteger(), nullable=False),
+    sa.Column('stored_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('ref')
+    )
+    connection = op.get_bind()
+    ids = connection.execute(sa.select(cluster_analysis.c.id)).scalars().all()
+
+    with op.batch_alter_table('cluster_analysis', schema=None) as batch_op:
+        for name in FILES:
+            batch_op.add_column(sa.Column(f'{name}_ref', sa.Text(), nullable=True))
+            batch_op.add_column(sa.Column(f'{name}_hash', sa.Text(), nullable=True))
+            batch_op.add_column(sa.Column(f'{name}_size', sa.BigInteger(), nullable=True))
+
+    # move the files into the blob store one row at a time
+    for analysis_id in ids:
+        row = connection.execute(
+            sa.select(*[cluster_analysis.c[f'{name}_data'] for name in FILES])
+            .where(cluster_analysis.c.id == analysis_id)
+        ).one()
+        values = {}
+        for name, data in zip(FILES, row):
+            ref, digest, size = _put(connection, data)
+            values.update({f'{name}_ref': ref, f'{name}_hash': digest, f'{name}_size': size})
+        connection.execute(
+            cluster_analysis.update()
+            .where(cluster_analysis.c.id == analysis_id)
+            .values(**values)
+        )
+
+    with op.batch_alter_table('cluster_analysis', schema=None) as batch_op:
+        for name in FILES:
+            batch_op.alter_column(f'{name}_ref', existing_type=sa.Text(), nullable=False)
+            batch_op.alter_column(f'{name}_hash', existing_type=sa.Text(), nullable=False)
+            batch_op.alter_column(f'{name}_size', existing_type=sa.BigInteger(), nullable=False)
+            batch_op.drop_column(f'{name}_data')
+
+
+def _put(connection, data):
+    """Store data with the configured blob store, returning (ref, hash, size).
+
+    The database store is written through the migration's own connection,
+    as the app's session would wait on the locks the migration holds.
+    """
+    if current_app.config['BLOB_STORE'] != 'database':
+        return current_app.extensions['blobs'].put(data)
+    digest = hashlib.sha256(data).hexdigest()
+    ref = f'{digest[:2]}/{digest}'
+    stored = connection.execute(sa.select(blob.c.ref).where(blob.c.ref == ref)).scalar()
+    if stored is None:
+        connection.execute(
+            blob.insert().values(
+                ref=ref, data=data, size=len(data), stored_at=datetime.datetime.today()
+            )
+        )
+    return ref, digest, len(data)
+
+
+def _read(connection, ref):
+    if current_app.config['BLOB_STORE'] != 'database':
+        return current_app.extensions['blobs'].read(ref)
+    return connection.execute(sa.select(blob.c.data).where(blob.c.ref == ref)).scalar()
+
+
+def downgrade():
+    with op.batch_alter_table('cluster_analysis', schema=None) as batch_op:
+        for name in FILES:
+            batch_op.add_column(sa.Column(f'{name}_data', sa.LargeBinary(), nullable=True))
+
+    connection = op.get_bind()
+    ids = connection.execute(sa.select(cluster_analysis.c.id)).scalars().all()
+    for analysis_id in ids:
+        row = connection.execute(
+            sa.select(*[cluster_analysis.c[f'{name}_ref'] for name in FILES])
+            .where(cluster_analysis.c.id == analysis_id)
+        ).one()
+        connection.execute(
+            cluster_analysis.update()
+            .where(cluster_analysis.c.id == analysis_id)
+            .values(**{f'{name}_data': _read(connection, ref) for name, ref in zip(FILES, row)})
+        )
+
+    with op.batch_alter_table('cluster_analysis', schema=None) as batch_op:
+        for name in FILES:
+            batch_op.alter_column(f'{name}_data', existing_type=sa.LargeBinary(), nullable=False)
+            batch_op.drop_column(f'{name}_size')
+            batch_op.drop_column(f'{name}_hash')
+            batch_op.drop_column(f'{name}_ref')
+
+    op.drop_table('blob')
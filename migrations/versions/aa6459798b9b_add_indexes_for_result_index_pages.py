@@ -0,0 +1,78 @@
+"""add indexes for result index pages
+
+Revision ID: aa6459798b9b
+Revises: 3c3ea9597fc2
+Create Date: 2026-10-18 19:53:18.843903
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'aa6459798b9b'
+down_revision = '3c3ea9597fc2'
+branch_labels = None
+depends_on = None
+
+SOURCE_INDEXES = [
+    ('ix_extract_lower_source', 'extract', 'source'),
+    ('ix_cluster_analysis_lower_source_file', 'cluster_analysis', 'source_file'),
+    ('ix_plan_data_collection_lower_source_file', 'plan_data_collection', 'source_file'),
+]
+
+cluster_analysis = sa.table(
+    'cluster_analysis',
+    sa.column('id', sa.UUID()),
+    sa.column('grouped_reasons', sa.JSON()),
+    sa.column('group_count', sa.Integer()),
+)
+
+
+def upgrade():
+    with op.batch_alter_table('cluster_analysis', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('group_count', sa.Integer(), nullable=True))
+
+    connection = op.get_bind()
+    for analysis_id, grouped_reasons in connection.execute(
+        sa.select(cluster_analysis.c.id, cluster_analysis.c.grouped_reasons)
+    ).all():
+        connection.execute(
+            cluster_analysis.update()
+            .where(cluster_analysis.c.id == analysis_id)
+            .values(group_count=len(grouped_reasons))
+        )
+
+    with op.batch_alter_table('cluster_analysis', schema=None) as batch_op:
+        batch_op.alter_column('group_count', existing_type=sa.Integer(), nullable=False)
+        batch_op.create_index('ix_cluster_analysis_created_at_id', ['created_at', 'id'], unique=False)
+
+    with op.batch_alter_table('extract', schema=None) as batch_op:
+        batch_op.create_index('ix_extract_created_at_id', ['created_at', 'id'], unique=False)
+
+    with op.batch_alter_table('extract_item', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_extract_item_extract_id'), ['extract_id'], unique=False)
+
+    with op.batch_alter_table('plan_data_collection', schema=None) as batch_op:
+        batch_op.create_index('ix_plan_data_collection_created_at_id', ['created_at', 'id'], unique=False)
+
+    ops = ' text_pattern_ops' if connection.dialect.name == 'postgresql' else ''
+    for name, table, column in SOURCE_INDEXES:
+        op.create_index(name, table, [sa.text(f'lower({column}){ops}')], unique=False)
+
+
+def downgrade():
+    for name, table, _ in SOURCE_INDEXES:
+        op.drop_index(name, table_name=table)
+
+    with op.batch_alter_table('plan_data_collection', schema=None) as batch_op:
+        batch_op.drop_index('ix_plan_data_collection_created_at_id')
+
+    with op.batch_alter_table('extract_item', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_extract_item_extract_id'))
+
+    with op.batch_alter_table('extract', schema=None) as batch_op:
+        batch_op.drop_index('ix_extract_created_at_id')
+
+    with op.batch_alter_table('cluster_analysis', schema=None) as batch_op:
+        batch_op.drop_index('ix_cluster_analysis_created_at_id')
+        batch_op.drop_column('group_count')
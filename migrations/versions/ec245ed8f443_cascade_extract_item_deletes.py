@@ -0,0 +1,36 @@
+"""cascade extract item deletes
+
+Revision ID: ec245ed8f443
+Revises: aa6459798b9b
+Create Date: 2026-10-18 19:54:47.434156
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'ec245ed8f443'
+down_revision = 'aa6459798b9b'
+branch_labels = None
+depends_on = None
+
+# matches the name Postgres gave the constraint, and names the unnamed
+# constraint SQLite reflects so batch mode can drop it
+naming_convention = {'fk': '%(table_name)s_%(column_0_name)s_fkey'}
+
+
+def upgrade():
+    with op.batch_alter_table(
+        'extract_item', schema=None, naming_convention=naming_convention
+    ) as batch_op:
+        batch_op.drop_constraint('extract_item_extract_id_fkey', type_='foreignkey')
+        batch_op.create_foreign_key(
+            'extract_item_extract_id_fkey', 'extract', ['extract_id'], ['id'], ondelete='CASCADE'
+        )
+
+
+def downgrade():
+    with op.batch_alter_table(
+        'extract_item', schema=None, naming_convention=naming_convention
+    ) as batch_op:
+        batch_op.drop_constraint('extract_item_extract_id_fkey', type_='foreignkey')
+        batch_op.create_foreign_key('extract_item_extract_id_fkey', 'extract', ['extract_id'], ['id'])
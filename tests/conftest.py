@@ -0,0 +1,35 @@
+import os
+import tempfile
+
+import pytest
+
+# the config is read when it's imported, so point it at a scratch database,
+# blob store and scratch space first
+_work_dir = tempfile.mkdtemp(prefix="data-analyser-tests-")
+os.environ.setdefault("SECRET_KEY", "tests")
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(_work_dir, "tests.db")
+os.environ["BLOB_STORE_ROOT"] = os.path.join(_work_dir, "blobs")
+os.environ["SCRATCH_ROOT"] = os.path.join(_work_dir, "scratch")
+
+
+@pytest.fixture(scope="session")
+def app():
+    from application.factory import create_app
+
+    return create_app("application.config.TestConfig")
+
+
+@pytest.fixture
+def db(app):
+    from application.extensions import db
+
+    with app.app_context():
+        db.create_all()
+        yield db
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app, db):
+    return app.test_client()
@@ -0,0 +1,120 @@
+import datetime
+import gzip
+import io
+import json
+
+import pytest
+
+ROWS = 5
+INPUT = "reference,name,document-url,documentation-url\r\n" + "".join(
+    f"plan-{number},Local plan {number},,\r\n" for number in range(ROWS)
+)
+
+
+@pytest.fixture
+def collection(client):
+    response = client.post(
+        "/api/v1/collections",
+        data={"file": (io.BytesIO(INPUT.encode("utf-8")), "plans.csv")},
+        content_type="multipart/form-data",
+    )
+    assert response.status_code == 202
+    job = client.get(response.headers["Location"]).get_json()
+    assert job["status"] == "complete"
+    return client.get(job["result_url"]).get_json()
+
+
+def _ndjson(data):
+    return [json.loads(line) for line in data.decode("utf-8").splitlines()]
+
+
+def test_submit_answers_with_the_job(client):
+    response = client.post(
+        "/api/v1/collections",
+        data={"file": (io.BytesIO(INPUT.encode("utf-8")), "plans.csv")},
+        content_type="multipart/form-data",
+    )
+
+    job = response.get_json()
+    assert response.status_code == 202
+    assert response.headers["Location"] == job["url"]
+    assert job["kind"] == "collect"
+    for name in ["created_at", "started_at", "finished_at"]:
+        datetime.datetime.fromisoformat(job[name])
+    assert client.get(job["url"]).get_json()["result_url"] == job["result_url"]
+
+
+def test_collection(collection):
+    assert collection["source_file"] == "plans.csv"
+    assert collection["row_count"] == ROWS
+    assert datetime.datetime.fromisoformat(collection["created_at"])
+
+
+def test_rows_as_ndjson(client, collection):
+    response = client.get(collection["rows_url"])
+
+    assert response.mimetype == "application/x-ndjson"
+    assert response.headers["X-Total-Count"] == str(ROWS)
+    assert "Link" not in response.headers
+    rows = _ndjson(response.data)
+    assert [row["reference"] for row in rows] == [f"plan-{n}" for n in range(ROWS)]
+    assert list(rows[0]) == collection["headers"]
+
+
+def test_rows_paged_with_offset_limit_and_fields(client, collection):
+    response = client.get(
+        collection["rows_url"],
+        query_string={"offset": 1, "limit": 2, "fields": "reference"},
+    )
+
+    assert _ndjson(response.data) == [{"reference": "plan-1"}, {"reference": "plan-2"}]
+    next_url = response.headers["Link"].split(">")[0].lstrip("<")
+    assert _ndjson(client.get(next_url).data) == [
+        {"reference": "plan-3"},
+        {"reference": "plan-4"},
+    ]
+
+
+def test_rows_as_a_json_page(app, client, collection, monkeypatch):
+    monkeypatch.setitem(app.config, "API_MAX_PAGE_SIZE", 3)
+
+    page = client.get(
+        collection["rows_url"], query_string={"format": "json", "limit": 100}
+    ).get_json()
+
+    assert page["offset"] == 0
+    assert page["row_count"] == ROWS
+    assert [row["reference"] for row in page["rows"]] == ["plan-0", "plan-1", "plan-2"]
+    rest = client.get(page["next"]).get_json()
+    assert [row["reference"] for row in rest["rows"]] == ["plan-3", "plan-4"]
+    assert rest["next"] is None
+
+
+def test_rows_compressed(client, collection):
+    plain = client.get(collection["rows_url"]).data
+
+    response = client.get(collection["rows_url"], headers={"Accept-Encoding": "gzip"})
+
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(response.data) == plain
+
+
+@pytest.mark.parametrize(
+    "method, url, options",
+    [
+        ("get", None, {"query_string": {"fields": "reference,colour"}}),
+        ("post", "/api/v1/collections", {"json": {}}),
+        ("post", "/api/v1/collections", {"json": ["not", "an", "object"]}),
+        (
+            "post",
+            "/api/v1/extracts",
+            {"json": {"url": "https://example.com/plan.pdf", "index": "first"}},
+        ),
+        ("post", "/api/v1/clusters", {"json": {"mode": "slow"}}),
+    ],
+)
+def test_bad_requests(client, collection, method, url, options):
+    response = getattr(client, method)(url or collection["rows_url"], **options)
+
+    assert response.status_code == 400
+    assert response.get_json()["error"]
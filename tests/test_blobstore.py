@@ -0,0 +1,71 @@
+import datetime
+import os
+
+import pytest
+from sqlalchemy import update
+
+from application.blobstore import DatabaseBlobStore, LocalBlobStore, blobs
+from application.models import Blob, ClusterAnalysis
+
+
+def test_storing_a_blob_again_restarts_its_grace_period(tmp_path):
+    store = LocalBlobStore(str(tmp_path))
+    ref, _, _ = store.put(b"report")
+    old = (datetime.datetime.now() - datetime.timedelta(hours=2)).timestamp()
+    os.utime(tmp_path / ref, (old, old))
+
+    assert store.put(b"report")[0] == ref
+    count, _ = store.sweep(set(), datetime.datetime.now() - datetime.timedelta(hours=1))
+
+    assert count == 0
+    assert store.read(ref) == b"report"
+
+
+def test_missing_blob_is_not_found(client, db):
+    ref, digest, size = blobs.put(b"report")
+    analysis = ClusterAnalysis(
+        source_file="reasons.csv",
+        grouped_reasons={},
+        group_count=0,
+        visualization_ref="00/missing",
+        visualization_hash="missing",
+        visualization_size=10,
+        visualization_mime_type="image/png",
+        report_ref=ref,
+        report_hash=digest,
+        report_size=size,
+        report_mime_type="application/octet-stream",
+    )
+    db.session.add(analysis)
+    db.session.commit()
+
+    missing = client.get(f"/cluster-results/{analysis.id}/visualization")
+    found = client.get(f"/cluster-results/{analysis.id}/report")
+
+    assert missing.status_code == 404
+    assert "ETag" not in missing.headers
+    assert found.status_code == 200
+    assert found.data == b"report"
+
+
+def test_database_store_keeps_blobs_in_the_database(db):
+    store = DatabaseBlobStore()
+    ref, digest, size = store.put(b"visualization")
+    db.session.commit()
+    old = datetime.datetime.now() - datetime.timedelta(hours=2)
+    db.session.execute(update(Blob).values(stored_at=old))
+    unreferenced, _, _ = store.put(b"unreferenced")
+    db.session.commit()
+    db.session.execute(update(Blob).values(stored_at=old))
+
+    assert store.put(b"visualization") == (ref, digest, size)
+    db.session.commit()
+    count, swept = store.sweep(
+        set(), datetime.datetime.now() - datetime.timedelta(hours=1)
+    )
+
+    assert (count, swept) == (1, len(b"unreferenced"))
+    assert store.read(ref) == b"visualization"
+    assert not store.exists(unreferenced)
+    with pytest.raises(FileNotFoundError):
+        store.open(unreferenced)
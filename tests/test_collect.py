@@ -0,0 +1,20 @@
+import io
+
+
+def test_collecting_a_file_with_no_rows(client):
+    header = "reference,name,document-url,documentation-url\r\n"
+
+    response = client.post(
+        "/api/v1/collections",
+        data={"file": (io.BytesIO(header.encode("utf-8")), "plans.csv")},
+        content_type="multipart/form-data",
+    )
+    job = client.get(response.headers["Location"]).get_json()
+
+    assert job["status"] == "complete"
+    collection = client.get(job["result_url"]).get_json()
+    assert collection["row_count"] == 0
+    assert collection["headers"] == header.strip().split(",")
+    assert client.get(collection["rows_url"]).data == b""
+    failed_urls = f"/plan-documents-results/{collection['id']}/failed-urls"
+    assert client.get(failed_urls).status_code == 302
@@ -0,0 +1,64 @@
+import csv
+import importlib.util
+import os
+from io import StringIO
+
+import pandas as pd
+
+from application.columnar import ColumnarTable, encode_frame, store_table
+from application.models import Extract, ExtractItem
+
+VALUES = ["007", "0123", "1e3", "12345678901234567890", "1.50", "true", "", "£5 fee"]
+
+MIGRATION = os.path.join(
+    os.path.dirname(__file__),
+    os.pardir,
+    "migrations",
+    "versions",
+    "1664898c6edd_store_extracted_tables_in_columnar_.py",
+)
+
+
+def _store(db, metadata, chunks):
+    item = ExtractItem(index=1, content_hash=store_table(metadata, chunks), **metadata)
+    db.session.add(Extract(source="test.pdf", items=[item]))
+    db.session.commit()
+    return ColumnarTable(item)
+
+
+def _csv(rows):
+    buffer = StringIO()
+    csv.writer(buffer, lineterminator="\n").writerows(rows)
+    return buffer.getvalue()
+
+
+def test_string_values_round_trip(db):
+    frame = pd.DataFrame({"fee": VALUES, "reference": list("abcdefgh")}, dtype=str)
+
+    metadata, chunks = encode_frame(frame, chunk_rows=3)
+    table = _store(db, metadata, chunks)
+
+    assert [column["type"] for column in metadata["columns"]] == ["text", "text"]
+    assert [row["fee"] for row in table.rows(0, len(VALUES))] == VALUES
+    assert [row["fee"] for row in table.rows(4, 6)] == VALUES[4:6]
+    expected = _csv([["fee", "reference"], *zip(VALUES, "abcdefgh")])
+    assert b"".join(table.iter_csv()).decode("utf-8") == expected
+
+
+def test_migration_keeps_legacy_values_exactly(db):
+    spec = importlib.util.spec_from_file_location("columnar_migration", MIGRATION)
+    migration = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(migration)
+    # duplicate headers and quoted values, as DataFrame.to_csv wrote them
+    data = _csv([["fee", "fee", "name"], *([value, value, "a, b"] for value in VALUES)])
+
+    metadata, chunks = migration.encode_csv(data)
+    table = _store(db, metadata, chunks)
+
+    assert metadata["headers"] == ["fee", "fee", "name"]
+    assert metadata["columns"][0]["stats"] == {"count": 7, "nulls": 1, "distinct": 7}
+    assert b"".join(table.iter_csv()).decode("utf-8") == data
+    assert migration.encode_csv("") == (
+        {"headers": [], "columns": [], "row_count": 0, "chunk_rows": 1000},
+        [],
+    )
@@ -0,0 +1,70 @@
+import random
+import zlib
+
+from application import compression
+from application.compression import FRAME_CHARS, compress_text, decompress_text
+from application.models import PlanDataCollection
+from application.streaming import iter_payload_range, read_slice
+
+# several frames, with characters of one to three bytes in UTF-8
+TEXT = "".join(
+    f"{number},Local Plan adoption statement,£{number},Łódź – déjà vu\r\n"
+    for number in range(5000)
+)
+ENCODED = TEXT.encode("utf-8")
+
+
+def _collection(db):
+    collection = PlanDataCollection(
+        source_file="plan_data.csv", reference_file="reference.csv", data=TEXT
+    )
+    db.session.add(collection)
+    db.session.commit()
+    return collection.id
+
+
+def test_round_trip():
+    assert len(TEXT) > 3 * FRAME_CHARS
+    assert decompress_text(compress_text(TEXT)) == TEXT
+    assert decompress_text(compress_text("")) == ""
+
+
+def test_read_parts_of_a_value(db):
+    criteria = [PlanDataCollection.id == _collection(db)]
+    ranges = random.Random(1).sample(range(len(ENCODED)), 40)
+
+    for start, stop in [(0, 1), (0, len(ENCODED)), *zip(ranges[::2], ranges[1::2])]:
+        start, stop = sorted((start, stop))
+        data = iter_payload_range(
+            PlanDataCollection.data, *criteria, start=start, stop=stop
+        )
+        assert b"".join(data) == ENCODED[start:stop]
+        assert (
+            read_slice(PlanDataCollection.data, *criteria, start=start, length=stop)
+            == TEXT[start : start + stop]
+        )
+
+
+def test_range_request_reads_only_the_frames_it_needs(client, db, monkeypatch):
+    collection_id = _collection(db)
+    decompressed = []
+    original = zlib.decompressobj
+
+    def decompressobj(**options):
+        decompressed.append(options)
+        return original(**options)
+
+    monkeypatch.setattr(compression.zlib, "decompressobj", decompressobj)
+    start = len(ENCODED) - 100
+
+    response = client.get(
+        f"/plan-documents-results/{collection_id}/download",
+        headers={"Range": f"bytes={start}-"},
+    )
+
+    assert response.status_code == 206
+    assert response.headers["Content-Range"] == (
+        f"bytes {start}-{len(ENCODED) - 1}/{len(ENCODED)}"
+    )
+    assert response.data == ENCODED[start:]
+    assert len(decompressed) == 1
@@ -0,0 +1,27 @@
+import datetime
+
+from application import extract_cache
+from application.models import Extract, ExtractCacheEntry
+
+
+def _extract(db):
+    extract = Extract(source="plan.pdf", items=[])
+    db.session.add(extract)
+    db.session.commit()
+    return extract.id
+
+
+def test_storing_over_an_expired_entry_caches_the_new_result(app, db):
+    old_id, new_id = _extract(db), _extract(db)
+    extract_cache.store("key", old_id)
+    expired = datetime.timedelta(seconds=app.config["EXTRACT_CACHE_TTL"] + 60)
+    entry = db.session.get(ExtractCacheEntry, "key")
+    entry.created_at -= expired
+    entry.hit_count = 3
+    db.session.commit()
+    assert extract_cache.lookup("key") is None
+
+    extract_cache.store("key", new_id)
+
+    assert extract_cache.lookup("key") == new_id
+    assert db.session.get(ExtractCacheEntry, "key").hit_count == 1
@@ -0,0 +1,127 @@
+import datetime
+
+from application.jobs import COMPLETE, FAILED, PENDING, RUNNING, jobs
+from application.models import Job
+
+
+def _job(db, status, age, **fields):
+    started = datetime.datetime.today() - datetime.timedelta(seconds=age)
+    job = Job(
+        kind="extract",
+        status=status,
+        params={},
+        created_at=started,
+        started_at=started if status == RUNNING else None,
+        **fields,
+    )
+    db.session.add(job)
+    db.session.commit()
+    return job.id
+
+
+def _status(db, job_id):
+    return db.session.get(Job, job_id).status
+
+
+def test_fail_stale_fails_jobs_left_by_a_stopped_process(app, db):
+    stale = app.config["JOB_STALE_SECONDS"]
+    running = _job(db, RUNNING, stale + 60)
+    pending = _job(db, PENDING, stale + 60)
+    recent = _job(db, RUNNING, 10)
+    beating = _job(
+        db,
+        RUNNING,
+        stale + 60,
+        heartbeat_at=datetime.datetime.today() - datetime.timedelta(seconds=10),
+    )
+
+    assert set(jobs.fail_stale()) == {running, pending}
+    db.session.expire_all()
+    assert _status(db, running) == FAILED
+    assert _status(db, pending) == FAILED
+    assert "stopped" in db.session.get(Job, running).error
+    assert _status(db, recent) == RUNNING
+    assert _status(db, beating) == RUNNING
+
+
+def test_fail_stale_fails_jobs_running_past_the_timeout(app, db):
+    job_id = _job(
+        db,
+        RUNNING,
+        app.config["JOB_TIMEOUT_SECONDS"] + 60,
+        heartbeat_at=datetime.datetime.today(),
+    )
+
+    assert jobs.fail_stale() == [job_id]
+    db.session.expire_all()
+    assert "too long" in db.session.get(Job, job_id).error
+
+
+def test_beat_keeps_owned_jobs_alive(app, db):
+    job_id = _job(db, PENDING, app.config["JOB_STALE_SECONDS"] + 60)
+
+    with jobs.owning([job_id]):
+        jobs.beat()
+    assert jobs.fail_stale() == []
+    assert _status(db, job_id) == PENDING
+
+
+def test_run_leaves_a_job_failed_while_it_ran(app, db):
+    job_id = _job(db, PENDING, 0)
+
+    def timed_out():
+        db.session.execute(
+            Job.__table__.update()
+            .where(Job.id == job_id)
+            .values(status=FAILED, error="The job took too long and was stopped")
+        )
+        db.session.commit()
+        return None
+
+    jobs.run(job_id, timed_out)
+    db.session.expire_all()
+    assert _status(db, job_id) == FAILED
+
+    other = _job(db, PENDING, 0)
+    jobs.run(other, lambda: None)
+    assert _status(db, other) == COMPLETE
+
+
+def test_batch_jobs_are_running_once_submitted(app, db, monkeypatch):
+    from application.main import tasks
+    from application.models import ExtractBatch
+
+    batch = ExtractBatch(name="2 URLs", file_or_url="url", source_count=2)
+    db.session.add(batch)
+    db.session.commit()
+    job_ids = [
+        jobs.create("extract", batch_id=batch.id, source=url, file_or_url="url").id
+        for url in ("https://a.test", "https://b.test")
+    ]
+    events = []
+    start, run = jobs.start, jobs.run
+
+    def record_start(job_id):
+        start(job_id)
+        events.append(("start", job_id, _status(db, job_id)))
+
+    def record_run(job_id, func=None):
+        events.append(("run", job_id))
+        run(job_id, func)
+
+    monkeypatch.setitem(app.config, "EXTRACT_BATCH_URL_WORKERS", 1)
+    monkeypatch.setattr(jobs, "start", record_start)
+    monkeypatch.setattr(jobs, "run", record_run)
+    monkeypatch.setattr(tasks, "extract_tables", lambda **params: [])
+
+    tasks.run_extract_batch(str(batch.id), "url")
+
+    first, second = job_ids
+    assert events == [
+        ("start", first, RUNNING),
+        ("run", first),
+        ("start", second, RUNNING),
+        ("run", second),
+    ]
+    db.session.expire_all()
+    assert [_status(db, job_id) for job_id in job_ids] == [COMPLETE, COMPLETE]
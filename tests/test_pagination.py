@@ -0,0 +1,74 @@
+import datetime
+
+import pytest
+from sqlalchemy import select
+
+from application.models import PlanDataCollection
+from application.pagination import keyset_page
+
+NOW = datetime.datetime(2026, 10, 1, 12, 0)
+
+
+@pytest.fixture
+def collections(app, db, monkeypatch):
+    monkeypatch.setitem(app.config, "INDEX_PER_PAGE", 3)
+    # two pairs share a creation time, so the id breaks the tie
+    times = [
+        NOW - datetime.timedelta(minutes=minutes) for minutes in (0, 1, 1, 2, 3, 3, 4)
+    ]
+    rows = [
+        PlanDataCollection(
+            source_file=f"{number}.csv",
+            reference_file="reference.csv",
+            data="",
+            created_at=created_at,
+        )
+        for number, created_at in enumerate(times)
+    ]
+    db.session.add_all(rows)
+    db.session.commit()
+    newest_first = sorted(rows, key=lambda row: (row.created_at, row.id), reverse=True)
+    return [row.id for row in newest_first]
+
+
+def _page(**cursors):
+    statement = select(PlanDataCollection.id, PlanDataCollection.created_at)
+    return keyset_page(
+        statement, PlanDataCollection.created_at, PlanDataCollection.id, **cursors
+    )
+
+
+def _ids(page):
+    return [row.id for row in page["rows"]]
+
+
+def test_pages_forwards_and_backwards(collections):
+    pages = [_page()]
+    while pages[-1]["next"]:
+        pages.append(_page(after=pages[-1]["next"]))
+
+    assert [_ids(page) for page in pages] == [
+        collections[0:3],
+        collections[3:6],
+        collections[6:7],
+    ]
+    assert pages[0]["previous"] is None
+    assert pages[-1]["next"] is None
+
+    backwards = [pages[-1]]
+    while backwards[-1]["previous"]:
+        backwards.append(_page(before=backwards[-1]["previous"]))
+
+    assert [_ids(page) for page in backwards] == [
+        collections[6:7],
+        collections[3:6],
+        collections[0:3],
+    ]
+    # the first page reached going back has no page before it
+    assert backwards[-1]["previous"] is None
+    assert _ids(_page(after=backwards[-1]["next"])) == collections[3:6]
+
+
+def test_malformed_cursor_gives_the_first_page(collections):
+    assert _ids(_page(after="not a cursor")) == collections[0:3]
+    assert _ids(_page(before="bm90IGEgY3Vyc29y")) == collections[0:3]
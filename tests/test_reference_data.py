@@ -0,0 +1,43 @@
+import hashlib
+
+import pytest
+
+from application.reference_data import ReferenceData, ReferenceDataError
+
+DATA = b"reference,name\r\nlocal-plan,Local plan\r\n"
+
+
+def test_files_are_hashed_and_read_again_when_they_change(tmp_path):
+    path = tmp_path / "types.csv"
+    path.write_bytes(DATA)
+    registry = ReferenceData()
+    registry.register("types", str(path))
+
+    reference_set = registry.get("types")
+    assert reference_set.sha256 == hashlib.sha256(DATA).hexdigest()
+    assert registry.get("types") is reference_set
+
+    changed = DATA + b"policies-map,Policies map\r\n"
+    path.write_bytes(changed)
+    reference_set.mtime -= 1
+    assert registry.get("types").sha256 == hashlib.sha256(changed).hexdigest()
+
+
+def test_unregistered_files_are_hashed_by_path(tmp_path):
+    path = tmp_path / "legacy.csv"
+    path.write_bytes(DATA)
+    registry = ReferenceData()
+
+    assert registry.for_path(str(path)).sha256 == hashlib.sha256(DATA).hexdigest()
+
+
+def test_files_without_name_and_reference_columns_are_rejected(tmp_path):
+    path = tmp_path / "types.csv"
+    path.write_bytes(b"reference,title\r\n")
+    registry = ReferenceData()
+    registry.register("types", str(path))
+
+    with pytest.raises(ReferenceDataError):
+        registry.get("types")
+    with pytest.raises(ReferenceDataError):
+        registry.get("missing")
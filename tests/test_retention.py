@@ -0,0 +1,138 @@
+import datetime
+
+import pandas as pd
+
+from application.columnar import encode_frame, store_table
+from application.jobs import COMPLETE, FAILED, PENDING, RUNNING
+from application.models import (
+    Extract,
+    ExtractBatch,
+    ExtractItem,
+    Job,
+    TableContent,
+    TableContentChunk,
+    Upload,
+)
+from application.retention import _delete_tables, _release_tables, purge
+
+LATER = datetime.datetime.today() + datetime.timedelta(days=1)
+EARLIER = datetime.datetime.today() - datetime.timedelta(days=10)
+
+
+def _upload(db, completed):
+    upload = Upload(
+        filename="plan_data.csv",
+        size=10,
+        scratch_dir="/tmp/scratch",
+        path="/tmp/scratch/plan_data.csv",
+        completed_at=datetime.datetime.today() if completed else None,
+    )
+    db.session.add(upload)
+    db.session.commit()
+    return upload.id
+
+
+def _extract(db, tables, created_at=None):
+    items = []
+    for index, values in enumerate(tables, start=1):
+        metadata, chunks = encode_frame(
+            pd.DataFrame({"reference": values}, dtype=str), chunk_rows=2
+        )
+        items.append(
+            ExtractItem(
+                index=index, content_hash=store_table(metadata, chunks), **metadata
+            )
+        )
+    extract = Extract(source="plan.pdf", items=items, created_at=created_at)
+    db.session.add(extract)
+    db.session.commit()
+    return extract.id, [item.content_hash for item in items]
+
+
+def _ref_counts(db):
+    return dict(
+        db.session.execute(db.select(TableContent.hash, TableContent.ref_count)).all()
+    )
+
+
+def _chunk_hashes(db):
+    return set(
+        db.session.execute(db.select(TableContentChunk.content_hash)).scalars().all()
+    )
+
+
+def test_purge_keeps_tables_shared_with_newer_extracts(db):
+    _, (shared, old_only) = _extract(db, [["a", "b", "c"], ["x"]], EARLIER)
+    _, (shared_again,) = _extract(db, [["a", "b", "c"]])
+    assert shared_again == shared
+    assert _ref_counts(db) == {shared: 2, old_only: 1}
+
+    cutoff = datetime.datetime.today() - datetime.timedelta(days=1)
+    dry_run = purge(cutoff, dry_run=True)
+    report = purge(cutoff)
+
+    for table, rows in [
+        ("extract", 1),
+        ("table_content", 1),
+        ("table_content_chunk", 1),
+    ]:
+        assert dry_run[table]["rows"] == rows
+        assert report[table]["rows"] == rows
+    assert _ref_counts(db) == {shared: 1}
+    assert _chunk_hashes(db) == {shared}
+
+    purge()
+
+    assert _ref_counts(db) == {}
+    assert _chunk_hashes(db) == set()
+
+
+def test_purge_keeps_tables_stored_again_while_it_runs(db):
+    extract_id, (content_hash,) = _extract(db, [["a", "b", "c"]])
+
+    unreferenced = _release_tables([extract_id])
+    assert unreferenced == [content_hash]
+    # another run stores the same table before the content is deleted
+    metadata, chunks = encode_frame(
+        pd.DataFrame({"reference": ["a", "b", "c"]}, dtype=str), chunk_rows=2
+    )
+    assert store_table(metadata, chunks) == content_hash
+    report = {
+        table: {"rows": 0, "bytes": 0, "seconds": 0.0}
+        for table in ("table_content", "table_content_chunk")
+    }
+    _delete_tables(report, unreferenced)
+    db.session.commit()
+
+    assert report["table_content"]["rows"] == 0
+    assert report["table_content_chunk"]["rows"] == 0
+    assert _ref_counts(db) == {content_hash: 1}
+    assert _chunk_hashes(db) == {content_hash}
+
+
+def test_purge_keeps_work_in_progress(db):
+    batch = ExtractBatch(name="batch", file_or_url="url", source_count=1)
+    finished_batch = ExtractBatch(name="done", file_or_url="url", source_count=1)
+    db.session.add_all([batch, finished_batch])
+    db.session.commit()
+    statuses = [PENDING, RUNNING, COMPLETE, FAILED]
+    for status in statuses:
+        db.session.add(Job(kind="extract", status=status, params={}))
+    db.session.add(Job(kind="extract", status=PENDING, params={}, batch_id=batch.id))
+    db.session.add(
+        Job(kind="extract", status=COMPLETE, params={}, batch_id=finished_batch.id)
+    )
+    db.session.commit()
+    uploading = _upload(db, completed=False)
+    _upload(db, completed=True)
+
+    dry_run = purge(LATER, dry_run=True)
+    report = purge(LATER)
+
+    for table, rows in [("job", 3), ("upload", 1), ("extract_batch", 1)]:
+        assert dry_run[table]["rows"] == rows
+        assert report[table]["rows"] == rows
+    remaining = db.session.execute(db.select(Job.status)).scalars().all()
+    assert sorted(remaining) == [PENDING, PENDING, RUNNING]
+    assert db.session.execute(db.select(Upload.id)).scalars().all() == [uploading]
+    assert db.session.execute(db.select(ExtractBatch.id)).scalars().all() == [batch.id]
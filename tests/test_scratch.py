@@ -0,0 +1,53 @@
+import os
+
+import pytest
+from flask import Flask
+
+from application.scratch import ScratchSpace, ScratchSpaceFull
+
+
+@pytest.fixture
+def scratch(tmp_path):
+    app = Flask(__name__)
+    app.config.update(
+        SCRATCH_ROOT=str(tmp_path),
+        SCRATCH_QUOTA_BYTES=1000,
+        SCRATCH_MEASURE_SECONDS=60,
+    )
+    return ScratchSpace(app)
+
+
+def test_reservations_count_before_anything_is_written(scratch):
+    scratch.allocate(reserve=400)
+    scratch.allocate(reserve=400)
+    with pytest.raises(ScratchSpaceFull):
+        scratch.allocate(reserve=400)
+
+
+def test_releasing_a_directory_frees_its_reservation(scratch):
+    path = scratch.allocate(reserve=600)
+    scratch.release(path)
+    scratch.allocate(reserve=600)
+
+
+def test_other_processes_reservations_are_seen_when_measured(tmp_path):
+    app = Flask(__name__)
+    app.config.update(
+        SCRATCH_ROOT=str(tmp_path),
+        SCRATCH_QUOTA_BYTES=1000,
+        SCRATCH_MEASURE_SECONDS=0,
+    )
+    first, second = ScratchSpace(app), ScratchSpace(app)
+    first.allocate(reserve=600)
+    with pytest.raises(ScratchSpaceFull):
+        second.allocate(reserve=600)
+
+
+def test_a_directory_counts_for_its_files_once_they_outgrow_it(scratch):
+    scratch.measure_interval = 0
+    path = scratch.allocate(reserve=100)
+    with open(os.path.join(path, "output.csv"), "wb") as f:
+        f.write(b"x" * 700)
+    with pytest.raises(ScratchSpaceFull):
+        scratch.allocate(reserve=300)
+    assert scratch.usage()["reserved_bytes"] == 100
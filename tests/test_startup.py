@@ -0,0 +1,16 @@
+from application.warmup import import_report
+
+# well over a cold import of the app without the analysis libraries (about
+# a second), well under one with them
+MAX_SECONDS = 5
+
+
+def test_startup_skips_heavy_modules(monkeypatch):
+    monkeypatch.setenv("FLASK_CONFIG", "application.config.TestConfig")
+
+    total, packages, heavy = import_report()
+
+    assert heavy == []
+    for package in ["pandas", "sklearn", "pypdfium2", "matplotlib"]:
+        assert package not in packages
+    assert 0 < total < MAX_SECONDS
@@ -0,0 +1,104 @@
+import hashlib
+
+import pytest
+from sqlalchemy import update
+
+from application.models import Upload
+from application.uploads import UploadConflict, uploads
+
+DATA = b"0123456789" * 10
+
+
+def _create(client, **details):
+    response = client.post(
+        "/uploads", json=dict({"filename": "plan.pdf", "size": len(DATA)}, **details)
+    )
+    assert response.status_code == 201
+    return response.get_json()["url"]
+
+
+def _append(client, url, offset, data):
+    return client.patch(url, data=data, headers={"Upload-Offset": str(offset)})
+
+
+def test_upload_in_chunks(client):
+    url = _create(client, sha256=hashlib.sha256(DATA).hexdigest())
+
+    first = _append(client, url, 0, DATA[:60])
+    assert first.status_code == 200
+    assert first.get_json()["offset"] == 60
+    assert not first.get_json()["complete"]
+    last = _append(client, url, 60, DATA[60:])
+
+    state = last.get_json()
+    assert last.status_code == 200
+    assert state["complete"]
+    assert state["sha256"] == hashlib.sha256(DATA).hexdigest()
+    with open(uploads.get(state["id"]).path, "rb") as f:
+        assert f.read() == DATA
+
+
+def test_chunk_at_the_wrong_offset_conflicts(client):
+    url = _create(client)
+    _append(client, url, 0, DATA[:50])
+
+    # sent again, as if the response to the first was lost
+    replayed = _append(client, url, 0, DATA[:50])
+    skipped = _append(client, url, 70, DATA[70:])
+
+    assert replayed.status_code == 409
+    assert replayed.get_json()["offset"] == 50
+    assert skipped.status_code == 409
+    assert _append(client, url, 50, DATA[50:]).get_json()["complete"]
+    assert _append(client, url, 50, DATA[50:]).status_code == 409
+
+
+def test_append_reads_the_offset_again(app, db):
+    upload = uploads.create("plan.pdf", len(DATA))
+    uploads.append(upload, 0, _Stream(DATA[:50]))
+    # another worker writes the next chunk after upload was loaded here
+    db.session.execute(update(Upload).where(Upload.id == upload.id).values(received=80))
+    db.session.commit()
+
+    with pytest.raises(UploadConflict):
+        uploads.append(upload, 50, _Stream(DATA[50:]))
+    assert upload.received == 80
+
+
+def test_file_that_changed_is_dropped(client):
+    url = _create(client, sha256=hashlib.sha256(b"something else").hexdigest())
+
+    response = _append(client, url, 0, DATA)
+
+    assert response.status_code == 400
+    assert client.get(url).status_code == 404
+
+
+class _Stream:
+    def __init__(self, data):
+        self.data = data
+
+    def read(self, size):
+        block, self.data = self.data[:size], self.data[size:]
+        return block
+
+
+def test_empty_file(client):
+    empty = hashlib.sha256(b"").hexdigest()
+
+    created = client.post(
+        "/uploads", json={"filename": "plan.pdf", "size": 0, "sha256": empty}
+    )
+    mismatched = client.post(
+        "/uploads",
+        json={
+            "filename": "plan.pdf",
+            "size": 0,
+            "sha256": hashlib.sha256(DATA).hexdigest(),
+        },
+    )
+
+    assert created.status_code == 201
+    assert created.get_json()["complete"]
+    assert mismatched.status_code == 400
+    assert mismatched.get_json()["error"]
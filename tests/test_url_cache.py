@@ -0,0 +1,70 @@
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+from application import url_cache
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # path -> ETag, or None for a document served without validators
+    documents = {}
+    requests = []
+
+    def do_HEAD(self):
+        etag = self.documents[self.path]
+        self.requests.append((self.command, self.path))
+        if etag and self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+        else:
+            self.send_response(200)
+            self.send_header("Content-Type", "application/pdf")
+        if etag:
+            self.send_header("ETag", etag)
+        self.end_headers()
+
+    def do_GET(self):
+        self.requests.append((self.command, self.path))
+        self.send_response(200)
+        self.end_headers()
+        self.wfile.write(b"%PDF")
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    _Handler.documents = {"/plan.pdf": '"1"', "/policies.pdf": '"1"', "/map.pdf": None}
+    _Handler.requests = []
+    httpd = HTTPServer(("127.0.0.1", 0), _Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_port}"
+    httpd.shutdown()
+
+
+def test_revalidate_makes_only_head_requests(app, db, server, monkeypatch):
+    monkeypatch.setitem(app.config, "COLLECT_URL_FRESH_FOR", 0)
+    urls = [f"{server}{path}" for path in ["/plan.pdf", "/policies.pdf", "/map.pdf"]]
+
+    first = url_cache.revalidate(urls)
+    _Handler.documents["/policies.pdf"] = '"2"'
+    second = url_cache.revalidate(urls)
+
+    assert list(first.values()) == [url_cache.CHANGED] * 3
+    assert second == {
+        urls[0]: url_cache.REVALIDATED,
+        urls[1]: url_cache.CHANGED,
+        # no validators, so it can't be told apart from a changed document
+        urls[2]: url_cache.CHANGED,
+    }
+    assert {method for method, _ in _Handler.requests} == {"HEAD"}
+
+
+def test_revalidate_skips_urls_checked_recently(app, db, server):
+    url = f"{server}/plan.pdf"
+    url_cache.revalidate([url])
+
+    assert url_cache.revalidate([url]) == {url: url_cache.SKIPPED}
+    assert len(_Handler.requests) == 1